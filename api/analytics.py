@@ -0,0 +1,174 @@
+import re
+from array import array
+from datetime import date
+
+TOP_COUNTERPARTIES = 10
+
+# Transfer/channel words that say how money moved, not to whom
+_CHANNEL_WORDS = re.compile(
+    r"\b(TRSF|E-BANKING|DB|CR|BI-FAST|BIF|TRANSFER|TRANSAKSI|DEBIT|KREDIT|TGL|QRC?|QRIS|"
+    r"PEMBAYARAN|KE|DARI|DR|WIB|TANGGAL|FTFVA|WS)\b"
+)
+
+
+def counterparty_key(description: str) -> str:
+    # "TRSF E-BANKING DB 0710/FTFVA/WS95271 12608/SHOPEE" -> "SHOPEE"
+    text = re.sub(r"\S*\d\S*", " ", description.upper().replace("/", " "))
+    text = re.sub(r"[^A-Z\s-]", " ", text)
+    text = _CHANNEL_WORDS.sub(" ", text)
+    words = [w for w in text.split() if len(w) > 1 and w != "-"]
+    return " ".join(words[:3])
+
+
+class _Interner:
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def get(self, value: str) -> int:
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = len(self.values)
+            self.ids[value] = idx
+            self.values.append(value)
+        return idx
+
+
+def to_columns(transactions: list) -> dict:
+    # Column arrays: signed amounts and balances in integer cents, dates as
+    # ordinals, categories and counterparties as interned ids
+    days = array("l")
+    amounts = array("q")
+    balances = array("q")
+    categories = array("l")
+    parties = array("l")
+    category_names = _Interner()
+    party_names = _Interner()
+    party_ids = {}  # description -> party id; descriptions repeat a lot
+
+    for tx in transactions:
+        try:
+            day = date.fromisoformat(tx.get("transaction_date", "")).toordinal()
+        except ValueError:
+            continue
+        cents = round(abs(tx.get("transaction_amount", 0.0)) * 100)
+        days.append(day)
+        amounts.append(-cents if tx.get("amount_type") == "debit" else cents)
+        balances.append(round(tx.get("transaction_balance", 0.0) * 100))
+        categories.append(category_names.get(tx.get("transaction_category") or "uncategorized"))
+        desc = tx.get("transaction_description", "")
+        party = party_ids.get(desc)
+        if party is None:
+            party = party_ids[desc] = party_names.get(counterparty_key(desc))
+        parties.append(party)
+
+    return {
+        "days": days,
+        "amounts": amounts,
+        "balances": balances,
+        "categories": categories,
+        "parties": parties,
+        "category_names": category_names.values,
+        "party_names": party_names.values,
+    }
+
+
+def _new_bucket() -> list:
+    # [incoming, outgoing, count, balance_min, balance_max, balance_sum, balance_count]
+    return [0, 0, 0, None, None, 0, 0]
+
+
+def _add(bucket: list, amount: int, balance: int):
+    if amount >= 0:
+        bucket[0] += amount
+    else:
+        bucket[1] -= amount
+    bucket[2] += 1
+    # A zero balance means the statement did not print one for this row
+    if balance:
+        bucket[3] = balance if bucket[3] is None else min(bucket[3], balance)
+        bucket[4] = balance if bucket[4] is None else max(bucket[4], balance)
+        bucket[5] += balance
+        bucket[6] += 1
+
+
+def _money(cents) -> float:
+    return None if cents is None else cents / 100
+
+
+def _render(bucket: list) -> dict:
+    incoming, outgoing, count, bal_min, bal_max, bal_sum, bal_count = bucket
+    return {
+        "incoming": _money(incoming),
+        "outgoing": _money(outgoing),
+        "net": _money(incoming - outgoing),
+        "count": count,
+        "balance_min": _money(bal_min),
+        "balance_max": _money(bal_max),
+        "balance_avg": round(bal_sum / bal_count / 100, 2) if bal_count else None,
+    }
+
+
+def compute_analytics(transactions: list, top: int = TOP_COUNTERPARTIES) -> dict:
+    cols = to_columns(transactions)
+    days, amounts, balances = cols["days"], cols["amounts"], cols["balances"]
+    categories, parties = cols["categories"], cols["parties"]
+
+    per_day = {}
+    per_week = {}
+    per_category = [_new_bucket() for _ in cols["category_names"]]
+    party_totals = [[0, 0] for _ in cols["party_names"]]  # [abs cents, count]
+    overall = _new_bucket()
+
+    # Single pass over the columns
+    for i in range(len(days)):
+        day, amount, balance = days[i], amounts[i], balances[i]
+
+        bucket = per_day.get(day)
+        if bucket is None:
+            bucket = per_day[day] = _new_bucket()
+        _add(bucket, amount, balance)
+
+        week = day - (day - 1) % 7  # ordinal of that week's Monday
+        bucket = per_week.get(week)
+        if bucket is None:
+            bucket = per_week[week] = _new_bucket()
+        _add(bucket, amount, balance)
+
+        _add(per_category[categories[i]], amount, balance)
+        _add(overall, amount, balance)
+
+        party = party_totals[parties[i]]
+        party[0] += abs(amount)
+        party[1] += 1
+
+    top_parties = sorted(
+        (
+            (party, name)
+            for party, name in zip(party_totals, cols["party_names"])
+            if name
+        ),
+        key=lambda item: -item[0][0],
+    )[:top]
+
+    totals = _render(overall)
+    return {
+        "per_day": [
+            {"date": date.fromordinal(d).isoformat(), **_render(per_day[d])}
+            for d in sorted(per_day)
+        ],
+        "per_week": [
+            {"week": "{}-W{:02d}".format(*date.fromordinal(w).isocalendar()[:2]), "week_start": date.fromordinal(w).isoformat(), **_render(per_week[w])}
+            for w in sorted(per_week)
+        ],
+        "per_category": [
+            {"category": name, **_render(bucket)}
+            for name, bucket in sorted(zip(cols["category_names"], per_category), key=lambda item: -item[1][2])
+        ],
+        "top_counterparties": [
+            {"counterparty": name, "total": _money(party[0]), "count": party[1]}
+            for party, name in top_parties
+        ],
+        "totals": totals,
+        "average_balance": totals["balance_avg"],
+    }
@@ -0,0 +1,383 @@
+import argparse
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # the archive refuses to start without it
+    AESGCM = None
+
+# Opt-in archive of extracted page text, so parser fixes can be replayed
+# over documents users uploaded before the fix:
+#   python -m api.archive reparse --workers 8 -o reparsed.ndjson --store
+#   python -m api.archive purge
+#   python -m api.archive retention <user_id> <days>
+# Disabled unless TEXT_ARCHIVE_PATH and TEXT_ARCHIVE_KEY (urlsafe base64 of
+# 32 random bytes) are both set. Entries are zlib-compressed, then sealed
+# with AES-256-GCM, and bound to their (user, content hash) row.
+ARCHIVE_PATH = os.environ.get("TEXT_ARCHIVE_PATH")
+ARCHIVE_KEY = os.environ.get("TEXT_ARCHIVE_KEY")
+# Days an entry is kept unless the user has their own retention
+DEFAULT_RETENTION_DAYS = float(os.environ.get("TEXT_ARCHIVE_RETENTION_DAYS", "90"))
+COMPRESS_LEVEL = int(os.environ.get("TEXT_ARCHIVE_COMPRESS_LEVEL", "6"))
+# Documents handed to a re-parse worker at a time
+REPARSE_CHUNK = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    rowid INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    account TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL DEFAULT '',
+    page_count INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    key_id TEXT NOT NULL,
+    nonce BLOB NOT NULL,
+    payload BLOB NOT NULL,
+    archived_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    UNIQUE (user_id, content_hash)
+);
+CREATE INDEX IF NOT EXISTS documents_expiry ON documents (expires_at);
+
+CREATE TABLE IF NOT EXISTS retention (
+    user_id TEXT PRIMARY KEY,
+    days REAL NOT NULL
+);
+"""
+
+UPSERT_DOCUMENT = """
+INSERT INTO documents (user_id, content_hash, account, filename, page_count, raw_bytes, key_id, nonce, payload, archived_at, expires_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, content_hash) DO UPDATE SET
+    account = excluded.account, filename = excluded.filename,
+    page_count = excluded.page_count, raw_bytes = excluded.raw_bytes,
+    key_id = excluded.key_id, nonce = excluded.nonce, payload = excluded.payload,
+    archived_at = excluded.archived_at, expires_at = excluded.expires_at
+"""
+
+
+def content_hash(file_content: bytes) -> str:
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def load_key(value: str) -> bytes:
+    try:
+        key = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+    except ValueError:
+        raise ValueError("TEXT_ARCHIVE_KEY must be urlsafe base64")
+    if len(key) != 32:
+        raise ValueError("TEXT_ARCHIVE_KEY must decode to 32 bytes")
+    return key
+
+
+def key_id(key: bytes) -> str:
+    # Identifies the key an entry was sealed with, without revealing it
+    return hashlib.sha256(b"text-archive:" + key).hexdigest()[:16]
+
+
+def _aad(user_id: str, digest: str) -> bytes:
+    # A sealed payload copied onto another user's row fails to open
+    return f"{user_id}\n{digest}".encode("utf-8")
+
+
+def seal(key: bytes, user_id: str, digest: str, metadata: dict, pages: list) -> tuple:
+    # (nonce, ciphertext, raw size): compress before encrypting, since
+    # ciphertext does not compress
+    raw = json.dumps({"metadata": metadata or {}, "pages": pages}, separators=(",", ":")).encode("utf-8")
+    nonce = os.urandom(12)
+    sealed = AESGCM(key).encrypt(nonce, zlib.compress(raw, COMPRESS_LEVEL), _aad(user_id, digest))
+    return nonce, sealed, len(raw)
+
+
+def unseal(key: bytes, user_id: str, digest: str, nonce: bytes, payload: bytes) -> dict:
+    return json.loads(zlib.decompress(AESGCM(key).decrypt(nonce, payload, _aad(user_id, digest))))
+
+
+class TextArchive:
+    # Same connection model as store.TransactionStore: one sqlite3 connection
+    # per thread, WAL, and a process-wide write lock.
+
+    def __init__(self, path: str, key: bytes):
+        if AESGCM is None:
+            raise RuntimeError("The text archive needs the cryptography package for encryption at rest")
+        self.path = path
+        self.key = key
+        self.key_id = key_id(key)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def retention_days(self, user_id: str) -> float:
+        row = self._connection().execute("SELECT days FROM retention WHERE user_id = ?", (user_id,)).fetchone()
+        return row["days"] if row else DEFAULT_RETENTION_DAYS
+
+    def set_retention(self, user_id: str, days: float) -> int:
+        # Applies to the user's existing entries too; returns how many moved
+        conn = self._connection()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO retention (user_id, days) VALUES (?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET days = excluded.days",
+                    (user_id, days),
+                )
+                updated = conn.execute(
+                    "UPDATE documents SET expires_at = archived_at + ? WHERE user_id = ?",
+                    (days * 86400, user_id),
+                ).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return updated
+
+    def save(self, user_id: str, digest: str, filename: str, metadata: dict, pages: list, account: str = "") -> dict:
+        nonce, sealed, raw_bytes = seal(self.key, user_id, digest, metadata, pages)
+        now = time.time()
+        expires_at = now + self.retention_days(user_id) * 86400
+        conn = self._connection()
+        with self._write_lock:
+            conn.execute(UPSERT_DOCUMENT, (
+                user_id, digest, account or "", filename or "", len(pages), raw_bytes,
+                self.key_id, nonce, sealed, now, expires_at,
+            ))
+        return {
+            "content_hash": digest,
+            "raw_bytes": raw_bytes,
+            "stored_bytes": len(sealed),
+            "expires_at": expires_at,
+        }
+
+    def load(self, user_id: str, digest: str) -> dict:
+        row = self._connection().execute(
+            "SELECT * FROM documents WHERE user_id = ? AND content_hash = ? AND expires_at > ?",
+            (user_id, digest, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return self._open(row)
+
+    def _open(self, row) -> dict:
+        if row["key_id"] != self.key_id:
+            raise ValueError(f"archived with another key ({row['key_id']})")
+        return unseal(self.key, row["user_id"], row["content_hash"], row["nonce"], row["payload"])
+
+    def iter_documents(self, user_id: str = None, batch: int = 200):
+        # Keyset walk by rowid so a long re-parse never holds one big cursor
+        # open against concurrent writes; yields (row info, payload or error)
+        last = 0
+        conn = self._connection()
+        while True:
+            sql = "SELECT * FROM documents WHERE rowid > ? AND expires_at > ?"
+            params = [last, time.time()]
+            if user_id:
+                sql += " AND user_id = ?"
+                params.append(user_id)
+            rows = conn.execute(sql + " ORDER BY rowid LIMIT ?", params + [batch]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                info = {
+                    "user_id": row["user_id"],
+                    "content_hash": row["content_hash"],
+                    "account": row["account"],
+                    "filename": row["filename"],
+                }
+                try:
+                    yield info, self._open(row)
+                except Exception as e:
+                    yield info, e
+            last = rows[-1]["rowid"]
+
+    def purge_expired(self, now: float = None) -> int:
+        conn = self._connection()
+        with self._write_lock:
+            return conn.execute("DELETE FROM documents WHERE expires_at <= ?", (now or time.time(),)).rowcount
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_archive: TextArchive = None
+_archive_lock = threading.Lock()
+
+
+def is_configured() -> bool:
+    return bool(ARCHIVE_PATH and ARCHIVE_KEY)
+
+
+def get_archive() -> TextArchive:
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = TextArchive(ARCHIVE_PATH, load_key(ARCHIVE_KEY))
+    return _archive
+
+
+def reparse_chunk(items: list, strip: bool, categorize: bool, cascade: bool, sections: bool) -> list:
+    # Runs in a worker process: archived pages straight into the parsers
+    from api.pipeline import convert_pages
+
+    records = []
+    for info, payload in items:
+        record = dict(info)
+        started = time.perf_counter()
+        try:
+            # Parsers print debug lines; keep stdout clean for NDJSON output
+            with contextlib.redirect_stdout(sys.stderr):
+                result = convert_pages(
+                    payload["pages"], payload["metadata"], info["filename"],
+                    strip=strip, categorize=categorize, cascade=cascade, sections=sections,
+                )
+            record.update({"status": "ok", "result": result})
+        except Exception as e:
+            record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+        record["seconds"] = round(time.perf_counter() - started, 4)
+        records.append(record)
+    return records
+
+
+def _chunks(archive: TextArchive, user_id: str, size: int):
+    chunk = []
+    for info, payload in archive.iter_documents(user_id):
+        if isinstance(payload, Exception):
+            yield [], [dict(info, status="error", error=f"{type(payload).__name__}: {payload}")]
+            continue
+        chunk.append((info, payload))
+        if len(chunk) >= size:
+            yield chunk, []
+            chunk = []
+    if chunk:
+        yield chunk, []
+
+
+def reparse(
+    archive: TextArchive,
+    user_id: str = None,
+    workers: int = None,
+    strip: bool = True,
+    categorize: bool = True,
+    cascade: bool = False,
+    sections: bool = False,
+):
+    # Yields one record per archived document, in chunks as workers finish.
+    # Decryption and decompression stay in this process; workers only parse.
+    workers = workers or os.cpu_count() or 1
+    if workers < 2:
+        for chunk, failed in _chunks(archive, user_id, REPARSE_CHUNK):
+            yield from failed
+            yield from reparse_chunk(chunk, strip, categorize, cascade, sections)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk, failed in _chunks(archive, user_id, REPARSE_CHUNK):
+            yield from failed
+            if chunk:
+                pending.append(pool.submit(reparse_chunk, chunk, strip, categorize, cascade, sections))
+            # Bound memory: keep at most two chunks per worker in flight
+            while len(pending) >= workers * 2:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m api.archive", description="Maintain the extracted-text archive.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("reparse", help="replay archived text through the current parsers")
+    run.add_argument("--user", help="only this user's documents")
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    run.add_argument("-o", "--output", default="-", help="NDJSON output file ('-' for stdout)")
+    run.add_argument("--store", action="store_true", help="re-save results into the local history (LOCAL_STORE_PATH)")
+    run.add_argument("--no-strip", action="store_true")
+    run.add_argument("--no-categorize", action="store_true")
+    run.add_argument("--cascade", action="store_true")
+    run.add_argument("--sections", action="store_true")
+    commands.add_parser("purge", help="delete entries past their retention")
+    keep = commands.add_parser("retention", help="set a user's retention in days")
+    keep.add_argument("user_id")
+    keep.add_argument("days", type=float)
+    args = parser.parse_args(argv)
+
+    if not is_configured():
+        print("TEXT_ARCHIVE_PATH and TEXT_ARCHIVE_KEY must be set", file=sys.stderr)
+        return 2
+    archive = get_archive()
+
+    if args.command == "purge":
+        print(f"purged {archive.purge_expired()} entries", file=sys.stderr)
+        return 0
+    if args.command == "retention":
+        updated = archive.set_retention(args.user_id, args.days)
+        print(f"retention for {args.user_id}: {args.days} days ({updated} entries updated)", file=sys.stderr)
+        return 0
+
+    history = None
+    if args.store:
+        from api import store
+
+        if not store.is_configured():
+            print("--store needs LOCAL_STORE_PATH", file=sys.stderr)
+            return 2
+        history = store.get_store()
+
+    counts = {"ok": 0, "error": 0}
+    rows = 0
+    started = time.perf_counter()
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for record in reparse(
+            archive, args.user, args.workers, strip=not args.no_strip,
+            categorize=not args.no_categorize, cascade=args.cascade, sections=args.sections,
+        ):
+            counts[record["status"]] += 1
+            if record["status"] == "ok":
+                rows += len(record["result"]["transactions"])
+                if history is not None:
+                    try:
+                        record["stored"] = history.save_statement(record["result"], record["user_id"], record["account"])
+                    except ValueError as e:
+                        # No account on the upload nor in the header
+                        record["store_error"] = str(e)
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{counts['ok']} re-parsed, {counts['error']} failed, {rows} rows in {elapsed:.1f}s",
+        file=sys.stderr,
+    )
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import math
+import os
+import re
+
+# Only the first/last few lines of a page are header/footer candidates
+HEADER_ZONE = int(os.environ.get("BOILERPLATE_HEADER_ZONE", "15"))
+FOOTER_ZONE = int(os.environ.get("BOILERPLATE_FOOTER_ZONE", "10"))
+# A line counts as boilerplate when it sits at the same position on at least
+# this share of pages
+REPEAT_RATIO = float(os.environ.get("BOILERPLATE_REPEAT_RATIO", "0.6"))
+MIN_PAGES = 3
+
+
+def _page_lines(page_text: str) -> list:
+    return [l.strip() for l in page_text.split("\n") if l.strip()]
+
+
+def _normalize(line: str) -> str:
+    # "HALAMAN : 2 / 3" and "HALAMAN : 3 / 3" share one shape
+    return re.sub(r"\d", "#", line)
+
+
+def _zone_positions(lines: list):
+    # (zone, offset, line index) walking inwards from the top and bottom edge.
+    # A line on a short page can be in both zones.
+    n = len(lines)
+    for i in range(min(HEADER_ZONE, n)):
+        yield "top", i, i
+    for i in range(min(FOOTER_ZONE, n)):
+        yield "bottom", i, n - 1 - i
+
+
+def _edge_drops(lines: list, repeated: set, shapes: set) -> set:
+    # Walk each zone from the page edge while lines are boilerplate. A single
+    # line whose digit-normalized shape repeats (page numbers) is stepped
+    # over but kept; anything else ends the header/footer block.
+    drop = set()
+    stopped = set()
+    bridged = {}
+    for zone, offset, idx in _zone_positions(lines):
+        if zone in stopped:
+            continue
+        line = lines[idx]
+        if (zone, offset, hash(line)) in repeated:
+            drop.add(idx)
+            bridged[zone] = False
+        elif not bridged.get(zone) and re.search(r"[A-Za-z]", line) and (zone, offset, hash(_normalize(line))) in shapes:
+            bridged[zone] = True
+        else:
+            stopped.add(zone)
+    return drop
+
+
+def strip_repeated_lines(pages: list) -> tuple:
+    # Drops header/footer lines repeated at the same page position on most
+    # pages. The first page is kept whole: parsers read the period, account
+    # and summary block from it. Returns (pages, removed_line_count).
+    if len(pages) < MIN_PAGES:
+        return pages, 0
+
+    page_lines = [_page_lines(p) for p in pages]
+
+    counts = {}
+    shape_counts = {}
+    totals = {}
+    for lines in page_lines:
+        for zone, offset, idx in _zone_positions(lines):
+            key = (zone, offset, hash(lines[idx]))
+            counts[key] = counts.get(key, 0) + 1
+            shape = (zone, offset, hash(_normalize(lines[idx])))
+            shape_counts[shape] = shape_counts.get(shape, 0) + 1
+        for line in lines:
+            h = hash(line)
+            totals[h] = totals.get(h, 0) + 1
+
+    threshold = max(2, math.ceil(REPEAT_RATIO * len(pages)))
+    candidates = {key: c for key, c in counts.items() if c >= threshold}
+
+    # Boilerplate text only occurs at its fixed positions. Text that is also
+    # frequent elsewhere ("TRANSAKSI DEBIT") is row content that happens to
+    # line up across pages, so it is left alone.
+    positioned = {}
+    for key, c in candidates.items():
+        positioned[key[2]] = positioned.get(key[2], 0) + c
+    slack = max(1, len(pages) // 4)
+    repeated = {key for key in candidates if totals[key[2]] <= positioned[key[2]] + slack}
+    if not repeated:
+        return pages, 0
+    shapes = {key for key, c in shape_counts.items() if c >= threshold}
+
+    stripped = [pages[0]]
+    removed = 0
+    for lines in page_lines[1:]:
+        drop = _edge_drops(lines, repeated, shapes)
+        removed += len(drop)
+        stripped.append("\n".join(line for idx, line in enumerate(lines) if idx not in drop))
+    return stripped, removed
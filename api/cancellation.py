@@ -0,0 +1,96 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Cancelled(Exception):
+    pass
+
+
+class BudgetExceeded(Cancelled):
+    # Raised at the first checkpoint past the deadline; carries how far the
+    # conversion got so the caller can report it
+    def __init__(self, stage: str = None, budget: float = None, progress: dict = None):
+        self.stage = stage
+        self.budget = budget
+        self.progress = dict(progress or {})
+        super().__init__(f"Conversion exceeded its {budget:g}s time budget during {stage or 'processing'}")
+
+
+class CancelToken:
+    # budget: seconds from now until checks start raising BudgetExceeded.
+    # parent: child tokens (e.g. cascade candidates) also stop when the
+    # parent is cancelled or runs out of time, and share its progress and
+    # listener. listener(stage, progress) is called at every checkpoint.
+    def __init__(self, budget: float = None, parent: "CancelToken" = None):
+        self._event = threading.Event()
+        self.budget = budget
+        self.deadline = time.monotonic() + budget if budget else None
+        self.parent = parent
+        self.progress = parent.progress if parent is not None else {}
+        self.listener = parent.listener if parent is not None else None
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        # This token or any ancestor
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self) -> float:
+        # Seconds left before the nearest deadline in the chain, None if unbounded
+        remaining = None if self.deadline is None else self.deadline - time.monotonic()
+        if self.parent is not None:
+            parent_remaining = self.parent.remaining()
+            if parent_remaining is not None:
+                remaining = parent_remaining if remaining is None else min(remaining, parent_remaining)
+        return remaining
+
+    def expired(self, stage: str = None) -> BudgetExceeded:
+        # Returns (does not raise) the error for the token whose deadline passed
+        token = self
+        while token is not None:
+            if token.deadline is not None and time.monotonic() >= token.deadline:
+                return BudgetExceeded(stage, token.budget, token.progress)
+            token = token.parent
+        return None
+
+    def check(self, stage: str = None):
+        if self._event.is_set():
+            raise Cancelled(stage)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise BudgetExceeded(stage, self.budget, self.progress)
+        if self.parent is not None:
+            self.parent.check(stage)
+
+
+_current = contextvars.ContextVar("cancel_token", default=None)
+
+
+def checkpoint(stage: str = None, **progress):
+    # Called from long-running loops (parsers, extraction) so abandoned work
+    # stops at the next safe point. Keyword counts (pages_extracted=...,
+    # rows_parsed=...) are recorded for timeout reports and progress
+    # listeners. A no-op unless a token is active.
+    token = _current.get()
+    if token is not None:
+        if progress:
+            token.progress.update(progress)
+        if token.listener is not None:
+            token.listener(stage, token.progress)
+        token.check(stage)
+
+
+def current_token():
+    return _current.get()
+
+
+@contextmanager
+def use_token(token):
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
@@ -0,0 +1,117 @@
+import contextvars
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from api.cancellation import CancelToken, Cancelled, checkpoint, current_token, use_token
+from api.parsers import BRANCH_CONFIDENCE, PARSERS, detect_bank, parse_bank_statement
+
+# Detections below this confidence run every parser and keep the most
+# consistent result
+LOW_CONFIDENCE = float(os.environ.get("CASCADE_LOW_CONFIDENCE", "0.6"))
+# Row count at which a result gets full credit for size
+FULL_CREDIT_ROWS = 20
+# A fully consistent result with at least this many checked balances wins
+# outright and the remaining parsers are cancelled
+CLEAR_WIN_CHECKS = 3
+
+
+def balance_consistency(result: dict) -> tuple:
+    # Walks the balance chain: each printed balance should equal the previous
+    # one plus the signed amounts since. Rows without a printed balance (BCA
+    # prints it once per day) are carried forward. Returns (consistent, checked).
+    prev = result.get("initial_balance") or None
+    pending = 0.0
+    checked = consistent = 0
+    for tx in result.get("transactions", []):
+        amount = abs(tx.get("transaction_amount", 0.0))
+        pending += -amount if tx.get("amount_type") == "debit" else amount
+        balance = tx.get("transaction_balance", 0.0)
+        if not balance:
+            continue
+        if prev is not None:
+            checked += 1
+            if abs(prev + pending - balance) < 0.01:
+                consistent += 1
+        prev = balance
+        pending = 0.0
+    return consistent, checked
+
+
+def score_statement(result: dict) -> float:
+    rows = len(result.get("transactions", []))
+    if not rows:
+        return 0.0
+    consistent, checked = balance_consistency(result)
+    # No printed balances at all: neither evidence for nor against
+    consistency = consistent / checked if checked else 0.5
+    size = min(1.0, math.log1p(rows) / math.log1p(FULL_CREDIT_ROWS))
+    return round(0.8 * consistency + 0.2 * size, 4)
+
+
+def _run_candidate(bank: str, text: str, token: CancelToken):
+    with use_token(token):
+        return PARSERS[bank](text)
+
+
+def parse_cascade(text: str, metadata: dict, filename: str = "") -> dict:
+    bank, branch = detect_bank(text, metadata)
+    confidence = BRANCH_CONFIDENCE.get(branch, 0.0)
+    if bank is not None and confidence >= LOW_CONFIDENCE:
+        return parse_bank_statement(text, metadata, filename)
+
+    # Candidates inherit the request's token so its deadline still applies
+    parent = current_token()
+    tokens = {name: CancelToken(parent=parent) for name in PARSERS}
+    scores = {}
+    results = {}
+    winner = None
+    with ThreadPoolExecutor(max_workers=len(PARSERS)) as pool:
+        # Each candidate runs in a copy of the request's context, so a profiled
+        # request still counts the rule hits of its candidates
+        futures = {
+            pool.submit(contextvars.copy_context().run, _run_candidate, name, text, tokens[name]): name
+            for name in PARSERS
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Cancelled:
+                continue
+            except Exception:
+                # A parser choking on another bank's layout just loses
+                scores[name] = 0.0
+                continue
+            results[name] = result
+            scores[name] = score_statement(result)
+
+            consistent, checked = balance_consistency(result)
+            if checked >= CLEAR_WIN_CHECKS and consistent == checked:
+                winner = name
+                for other, token in tokens.items():
+                    if other != name:
+                        token.cancel()
+                break
+
+    # A candidate that stopped because the request ran out of time is not a
+    # loss; surface the timeout instead of "Bank Not Supported"
+    checkpoint("parse")
+
+    if winner is None:
+        if not results:
+            raise ValueError("Bank Not Supported")
+        # Highest score; ties go to the detected bank
+        winner = max(results, key=lambda name: (scores[name], name == bank))
+        if scores[winner] == 0.0 and bank is None:
+            raise ValueError("Bank Not Supported")
+
+    result = results[winner]
+    result["detection"] = {
+        "bank": winner,
+        "detected_bank": bank,
+        "branch": branch,
+        "confidence": confidence,
+        "scores": scores,
+    }
+    return result
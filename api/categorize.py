@@ -0,0 +1,180 @@
+import json
+import os
+from collections import deque
+
+# Built-in rules: category -> keywords found in transaction descriptions.
+# Merchant keywords outrank transfer-type codes, so "TRSF E-BANKING DB
+# .../SHOPEE" lands in shopping rather than transfer_out. Keywords match
+# whole words; a trailing "*" makes one a prefix ("QRC0*" hits "QRC0123").
+MERCHANT_RULES = {
+    "shopping": ["SHOPEE", "TOKOPEDIA", "LAZADA", "BLIBLI", "BUKALAPAK", "TIKTOK SHOP", "ZALORA"],
+    "groceries": ["INDOMARET", "IDM INDOMA*", "ALFAMART", "ALFAMIDI", "SUPERINDO", "HYPERMART", "LOTTE MART"],
+    "food": ["GOFOOD", "GRABFOOD", "SHOPEEFOOD", "MCDONALD*", "KFC", "STARBUCKS", "JANJI JIWA", "KOPI KENANGAN"],
+    "transport": ["GOJEK", "GOPAY", "GRAB", "KAI", "TRAVELOKA", "PERTAMINA", "SHELL", "BLUEBIRD"],
+    "bills": ["PLN", "TELKOM", "INDIHOME", "BPJS", "PULSA", "TELKOMSEL", "XL AXIATA", "PDAM"],
+    "entertainment": ["NETFLIX", "SPOTIFY", "YOUTUBE", "DISNEY", "STEAM"],
+}
+TRANSFER_RULES = {
+    "transfer_in": ["BI-FAST CR", "TRSF E-BANKING CR", "TRANSFER DR", "DARI BANK", "SETORAN"],
+    "transfer_out": ["BI-FAST DB", "TRSF E-BANKING DB", "TRANSFER KE", "KE BANK"],
+    "cash_withdrawal": ["TARIKAN ATM", "PENARIKAN TUNAI", "TARIK TUNAI"],
+    "qris_payment": ["QRIS", "QR 0*", "QRC0*", "PEMBAYARAN QR"],
+    "fees": ["BIAYA ADM", "BIAYA TXN", "ADMIN FEE"],
+    "interest": ["BUNGA", "INTEREST"],
+    "tax": ["PAJAK"],
+}
+
+PRIORITY_TRANSFER = 1
+PRIORITY_MERCHANT = 2
+PRIORITY_USER = 3
+
+UNCATEGORIZED = "uncategorized"
+
+
+class Automaton:
+    # Aho-Corasick automaton over upper-cased keywords. A description is
+    # scanned once, so cost depends on its length, not on the rule count.
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        self.rules = []  # (keyword, category, priority, prefix)
+        self._built = False
+
+    def add(self, keyword: str, category: str, priority: int = PRIORITY_USER):
+        keyword = keyword.upper()
+        prefix = keyword.endswith("*")
+        keyword = keyword.rstrip("*")
+        if not keyword:
+            return
+        node = 0
+        for ch in keyword:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = nxt
+        self.out[node] = self.out[node] + (len(self.rules),)
+        self.rules.append((keyword, category, priority, prefix))
+        self._built = False
+
+    def build(self):
+        # BFS to fill failure links; outputs are merged along them so a match
+        # never needs to walk the failure chain at scan time.
+        queue = deque()
+        for nxt in self.goto[0].values():
+            self.fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+        self._built = True
+        return self
+
+    def match(self, text: str) -> list:
+        # Returns [(end_index, rule_index)] for every keyword occurrence in
+        # the upper-cased text
+        return self._scan(text.upper())
+
+    def _scan(self, text: str) -> list:
+        # match() on text that is already upper-cased
+        if not self._built:
+            self.build()
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        hits = []
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for rule_idx in out[node]:
+                    hits.append((i, rule_idx))
+        return hits
+
+    def classify(self, text: str) -> str:
+        text = text.upper()
+        best = None
+        for end, rule_idx in self._scan(text):
+            keyword, category, priority, prefix = self.rules[rule_idx]
+            start = end - len(keyword) + 1
+            # Keywords are whole words ("KAI" inside "PAKAIAN" or "KAIN" is
+            # not a hit); prefix keywords only need the start boundary
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if not prefix and end + 1 < len(text) and text[end + 1].isalnum():
+                continue
+            rank = (priority, len(keyword))
+            if best is None or rank > best[0]:
+                best = (rank, category)
+        return best[1] if best else UNCATEGORIZED
+
+
+def validate_rules(rules) -> dict:
+    # User rules as {"category": ["KEYWORD", ...]}; raises ValueError for any
+    # other shape (a bare string would register each letter as a keyword)
+    if not isinstance(rules, dict):
+        raise ValueError("categories must be a JSON object")
+    for category, keywords in rules.items():
+        if not category.strip():
+            raise ValueError("category names must not be empty")
+        if not isinstance(keywords, list) or not all(isinstance(kw, str) and kw.strip("* ") for kw in keywords):
+            raise ValueError(f"categories.{category} must be a list of non-empty strings")
+    return rules
+
+
+def _load_rules_file(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return validate_rules(json.load(f))
+
+
+def build_automaton(extra_rules: dict = None) -> Automaton:
+    automaton = Automaton()
+    for category, keywords in TRANSFER_RULES.items():
+        for kw in keywords:
+            automaton.add(kw, category, PRIORITY_TRANSFER)
+    for category, keywords in MERCHANT_RULES.items():
+        for kw in keywords:
+            automaton.add(kw, category, PRIORITY_MERCHANT)
+
+    rules_path = os.environ.get("CATEGORY_RULES_PATH")
+    if rules_path:
+        for category, keywords in _load_rules_file(rules_path).items():
+            for kw in keywords:
+                automaton.add(kw, category, PRIORITY_USER)
+
+    for category, keywords in (extra_rules or {}).items():
+        for kw in keywords:
+            automaton.add(kw, category, PRIORITY_USER)
+    return automaton.build()
+
+
+_default_automaton = None
+
+
+def get_automaton(extra_rules: dict = None) -> Automaton:
+    # The built-in rule set is compiled once per process; user rules need
+    # their own automaton.
+    global _default_automaton
+    if extra_rules:
+        return build_automaton(extra_rules)
+    if _default_automaton is None:
+        _default_automaton = build_automaton()
+    return _default_automaton
+
+
+def categorize_transactions(transactions: list, extra_rules: dict = None) -> list:
+    automaton = get_automaton(extra_rules)
+    for tx in transactions:
+        tx["transaction_category"] = automaton.classify(tx.get("transaction_description", ""))
+    return transactions
@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from api.cancellation import BudgetExceeded
+from api.extract import open_pdf
+from api.pipeline import convert_document
+
+# Offline batch converter:
+#   python -m api.cli statements/ -o out.ndjson --passwords passwords.json
+# Writes one NDJSON record per PDF and appends each finished file's hash to
+# a manifest, so re-running the same command resumes where it stopped.
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_passwords(path: str) -> dict:
+    # JSON object {"file.pdf": "secret"} or one "file.pdf=secret" per line.
+    # The key "*" is tried for files without their own entry.
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if path.endswith(".json"):
+        return json.loads(content)
+    passwords = {}
+    for line in content.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        name, _, secret = line.partition("=")
+        passwords[name.strip()] = secret.strip()
+    return passwords
+
+
+def load_manifest(path: str) -> set:
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    done.add(json.loads(line)["sha256"])
+    return done
+
+
+def find_pdfs(root: str) -> list:
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(".pdf"):
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+
+def convert_file(path: str, rel_path: str, digest: str, password: str, strip: bool, categorize: bool, cascade: bool = False, budget: float = None) -> dict:
+    # Runs in a worker process
+    started = time.perf_counter()
+    record = {"file": rel_path, "sha256": digest}
+    try:
+        with open(path, "rb") as f:
+            file_content = f.read()
+        # Parsers print debug lines; keep stdout clean for NDJSON output
+        with contextlib.redirect_stdout(sys.stderr):
+            doc = open_pdf(file_content, password)
+            result = convert_document(
+                doc, file_content, password, os.path.basename(path),
+                strip=strip, categorize=categorize, max_workers=1, cascade=cascade,
+                budget=budget,
+            )
+        record.update({"status": "ok", "pages": doc.page_count, "result": result})
+    except BudgetExceeded as e:
+        record.update({"status": "error", "error": f"{type(e).__name__}: {e}", "progress": e.progress})
+    except Exception as e:
+        record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def run(args) -> int:
+    passwords = load_passwords(args.passwords)
+    manifest_path = args.manifest or os.path.join(args.input, ".convert-manifest.ndjson")
+    done = load_manifest(manifest_path)
+
+    jobs = []
+    skipped = 0
+    for path in find_pdfs(args.input):
+        digest = file_sha256(path)
+        if digest in done:
+            skipped += 1
+            continue
+        rel_path = os.path.relpath(path, args.input)
+        password = passwords.get(rel_path, passwords.get(os.path.basename(path), passwords.get("*")))
+        jobs.append((path, rel_path, digest, password))
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    manifest = open(manifest_path, "a", encoding="utf-8")
+
+    started = time.perf_counter()
+    ok = failed = pages = rows = 0
+    failures = {}
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [
+                pool.submit(convert_file, path, rel_path, digest, password, not args.no_strip, not args.no_categorize, args.cascade, args.budget)
+                for path, rel_path, digest, password in jobs
+            ]
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if record["status"] == "ok":
+                    ok += 1
+                    pages += record["pages"]
+                    rows += len(record["result"]["transactions"])
+                else:
+                    failed += 1
+                    reason = record["error"].split(":")[0]
+                    failures[reason] = failures.get(reason, 0) + 1
+                    continue
+                # Only completed files go into the manifest; failures (e.g. a
+                # missing password) are retried on the next run.
+                manifest.write(json.dumps({"sha256": record["sha256"], "file": record["file"]}) + "\n")
+                manifest.flush()
+    finally:
+        manifest.close()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"converted {ok} file(s), {failed} failed, {skipped} skipped (already in manifest) "
+        f"in {elapsed:.2f}s",
+        file=sys.stderr,
+    )
+    if elapsed > 0 and (ok or failed):
+        print(
+            f"throughput: {(ok + failed) / elapsed:.2f} files/s, {pages / elapsed:.1f} pages/s, "
+            f"{rows / elapsed:.0f} rows/s",
+            file=sys.stderr,
+        )
+    for reason, count in sorted(failures.items(), key=lambda kv: -kv[1]):
+        print(f"  {count:5d} x {reason}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m api.cli", description="Convert a directory of bank statement PDFs to NDJSON")
+    parser.add_argument("input", help="directory to scan for PDFs (recursively)")
+    parser.add_argument("-o", "--output", help="NDJSON output file, appended to (default: stdout)")
+    parser.add_argument("--passwords", help="password side file: JSON object or name=password lines")
+    parser.add_argument("--manifest", help="manifest of completed file hashes (default: <input>/.convert-manifest.ndjson)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--no-strip", action="store_true", help="keep repeated page headers/footers")
+    parser.add_argument("--no-categorize", action="store_true", help="skip transaction categorization")
+    parser.add_argument("--budget", type=float, help="seconds allowed per file, 0 for no limit (default: CONVERT_BUDGET_SECONDS)")
+    parser.add_argument("--cascade", action="store_true", help="run all parsers on ambiguous statements and keep the most consistent")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Required, with no fallback: the filters are persisted, and processes
+# hashing with different functions would set and test different bits of the
+# same stored filter
+import mmh3
+
+# Expected rows per account before the first filter fills up, and the target
+# false-positive rate (~9.6 bits per row at 1%).
+DEFAULT_CAPACITY = 100_000
+DEFAULT_ERROR_RATE = 0.01
+# SQLite file holding the filters (created on first use); without it they
+# are kept in process memory
+DEDUPE_INDEX_PATH = os.environ.get("DEDUPE_INDEX_PATH")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bloom_filters (
+    user_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    error_rate REAL NOT NULL,
+    count INTEGER NOT NULL,
+    bits BLOB NOT NULL,
+    PRIMARY KEY (user_id, account, position)
+);
+CREATE TABLE IF NOT EXISTS seen_fingerprints (
+    user_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    fingerprint BLOB NOT NULL,
+    PRIMARY KEY (user_id, account, fingerprint)
+) WITHOUT ROWID;
+"""
+
+
+def fingerprint(tx: dict) -> bytes:
+    # Canonical form: date, type, amount/balance in cents, normalized description
+    desc = re.sub(r"\s+", " ", tx.get("transaction_description", "")).strip().lower()
+    raw = "|".join([
+        tx.get("transaction_date", ""),
+        tx.get("amount_type", ""),
+        str(round(abs(tx.get("transaction_amount", 0.0)) * 100)),
+        str(round(tx.get("transaction_balance", 0.0) * 100)),
+        desc,
+    ])
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+
+def _base_hashes(key: bytes) -> tuple:
+    return mmh3.hash64(key, signed=False)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def restore(cls, capacity: int, error_rate: float, count: int, bits: bytes) -> "BloomFilter":
+        f = cls(capacity, error_rate)
+        f.bits = bytearray(bits)
+        f.count = count
+        return f
+
+    def _positions(self, key: bytes):
+        # Kirsch-Mitzenmacher: k positions from two base hashes
+        h1, h2 = _base_hashes(key)
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: bytes):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        for pos in self._positions(key):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class ScalableBloomFilter:
+    # Chain of filters that doubles capacity (and tightens the error rate)
+    # each time the newest one is full, so the overall false-positive rate
+    # stays bounded as history grows.
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.filters = [BloomFilter(capacity, error_rate / 2)]
+
+    def add(self, key: bytes):
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(current.capacity * 2, current.error_rate / 2)
+            self.filters.append(current)
+        current.add(key)
+
+    def __contains__(self, key: bytes) -> bool:
+        return any(key in f for f in self.filters)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(f.bits) for f in self.filters)
+
+
+class FilterStore:
+    # Filters persisted per (user, account) in SQLite so every worker and a
+    # restarted process see earlier uploads, next to the exact fingerprints
+    # that confirm a filter hit. A check runs under BEGIN IMMEDIATE:
+    # concurrent uploads for one account take turns instead of overwriting
+    # each other's bits.
+
+    def __init__(self, path: str):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def open(self, user_id: str, account: str):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT capacity, error_rate, count, bits FROM bloom_filters "
+                "WHERE user_id = ? AND account = ? ORDER BY position",
+                (user_id, account),
+            ).fetchall()
+            bloom = ScalableBloomFilter()
+            if rows:
+                bloom.filters = [BloomFilter.restore(*row) for row in rows]
+            loaded = len(rows)
+            index = SQLiteIndex(bloom, conn, user_id, account)
+            try:
+                yield index
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.executemany(
+                "INSERT OR IGNORE INTO seen_fingerprints VALUES (?, ?, ?)",
+                [(user_id, account, key) for key in index.added],
+            )
+            # Rows only ever go into the newest filter, so older ones are
+            # unchanged and not written back
+            for position in range(max(0, loaded - 1), len(bloom.filters)):
+                f = bloom.filters[position]
+                conn.execute(
+                    "INSERT OR REPLACE INTO bloom_filters VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, account, position, f.capacity, f.error_rate, f.count, bytes(f.bits)),
+                )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+
+class SQLiteIndex:
+    # One account's filter plus its exact fingerprints. The filter answers
+    # "new" on its own; a filter hit is only "seen" once the fingerprint is
+    # found in the table, so a false positive costs one primary-key lookup
+    # instead of a wrong answer.
+
+    def __init__(self, bloom: ScalableBloomFilter, conn: sqlite3.Connection, user_id: str, account: str):
+        self.bloom = bloom
+        self.conn = conn
+        self.user_id = user_id
+        self.account = account
+        self.added = []
+
+    def seen(self, key: bytes) -> bool:
+        if key not in self.bloom:
+            return False
+        return self.conn.execute(
+            "SELECT 1 FROM seen_fingerprints WHERE user_id = ? AND account = ? AND fingerprint = ?",
+            (self.user_id, self.account, key),
+        ).fetchone() is not None
+
+    def add(self, key: bytes):
+        self.bloom.add(key)
+        self.added.append(key)
+
+
+class MemoryIndex:
+    def __init__(self):
+        self.bloom = ScalableBloomFilter()
+        self.exact = set()
+
+    def seen(self, key: bytes) -> bool:
+        return key in self.bloom and key in self.exact
+
+    def add(self, key: bytes):
+        self.bloom.add(key)
+        self.exact.add(key)
+
+
+class MemoryFilters:
+    # Fallback without DEDUPE_INDEX_PATH: filters and fingerprints live in
+    # this process only, so "seen" covers uploads this process has handled
+    # since it started
+
+    def __init__(self):
+        self.filters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def open(self, user_id: str, account: str):
+        with self.lock:
+            yield self.filters.setdefault((user_id, account), MemoryIndex())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_filter_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FilterStore(DEDUPE_INDEX_PATH) if DEDUPE_INDEX_PATH else MemoryFilters()
+    return _store
+
+
+def mark_duplicates(transactions: list, user_id: str, account: str, store=None) -> dict:
+    # "seen" means the row's fingerprint is in the account's exact store; the
+    # Bloom filter only decides which rows need that lookup
+    occurrences = {}
+    counts = {"new": 0, "seen": 0}
+    with (store or get_filter_store()).open(user_id, account) as index:
+        for tx in transactions:
+            key = fingerprint(tx)
+            # Equal rows inside one upload are distinct transactions; number them
+            # so only a re-upload of the same row is reported as seen.
+            n = occurrences.get(key, 0)
+            occurrences[key] = n + 1
+            if n:
+                key = hashlib.blake2b(key + n.to_bytes(4, "little"), digest_size=16).digest()
+
+            if index.seen(key):
+                status = "seen"
+            else:
+                status = "new"
+                index.add(key)
+            tx["transaction_status"] = status
+            counts[status] += 1
+    return counts
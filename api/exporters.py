@@ -0,0 +1,190 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import zlib
+from urllib.parse import quote
+
+# Rows are serialized one at a time and flushed in chunks of roughly this size,
+# so the response never holds the whole export in memory.
+CHUNK_SIZE = 64 * 1024
+
+CSV_COLUMNS = [
+    "transaction_date",
+    "transaction_description",
+    "transaction_amount",
+    "amount_type",
+    "transaction_bank",
+    "transaction_balance",
+    "transaction_category",
+]
+
+
+def signed_amount(tx: dict) -> float:
+    amount = abs(tx.get("transaction_amount", 0.0))
+    return -amount if tx.get("amount_type") == "debit" else amount
+
+
+def _buffered(pieces):
+    # Group small row strings into CHUNK_SIZE byte chunks
+    buf = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        buf.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield b"".join(buf)
+
+
+def _iter_csv_rows(result: dict):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    writer.writerow(CSV_COLUMNS)
+    yield out.getvalue()
+
+    for tx in result.get("transactions", []):
+        out.seek(0)
+        out.truncate()
+        writer.writerow([tx.get(col, "") for col in CSV_COLUMNS])
+        yield out.getvalue()
+
+
+def _ofx_escape(value) -> str:
+    return str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _ofx_date(date_str: str) -> str:
+    # "2025-10-07" -> "20251007"
+    return date_str.replace("-", "")
+
+
+def _fit_id(index: int, tx: dict) -> str:
+    raw = f"{index}|{tx.get('transaction_date')}|{tx.get('transaction_amount')}|{tx.get('transaction_description')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _ofx_statements(result: dict) -> list:
+    # [(account, closing balance, rows)]. A combined export of several
+    # accounts has no top-level closing balance, so each of its sections
+    # becomes its own statement.
+    transactions = result.get("transactions", [])
+    sections = result.get("sections") or []
+    if result.get("closing_balance") is None and sections:
+        return [
+            (s["account"] or "", s["closing_balance"], transactions[s["first_row"]:s["first_row"] + s["row_count"]])
+            for s in sections
+        ]
+    return [(result.get("account", ""), result.get("closing_balance") or 0.0, transactions)]
+
+
+def _iter_ofx_rows(result: dict):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>\n'
+        "<OFX>\n<BANKMSGSRSV1>\n"
+    )
+
+    index = 0
+    for uid, (account, closing, transactions) in enumerate(_ofx_statements(result)):
+        bank = transactions[0]["transaction_bank"] if transactions else ""
+        first_date = _ofx_date(transactions[0]["transaction_date"]) if transactions else ""
+        last_date = _ofx_date(transactions[-1]["transaction_date"]) if transactions else ""
+        yield (
+            f"<STMTTRNRS>\n<TRNUID>{uid}</TRNUID>\n"
+            "<STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>\n"
+            "<STMTRS>\n<CURDEF>IDR</CURDEF>\n"
+            f"<BANKACCTFROM><BANKID>{_ofx_escape(bank)}</BANKID><ACCTID>{_ofx_escape(account)}</ACCTID>"
+            "<ACCTTYPE>CHECKING</ACCTTYPE></BANKACCTFROM>\n"
+            f"<BANKTRANLIST>\n<DTSTART>{first_date}</DTSTART>\n<DTEND>{last_date}</DTEND>\n"
+        )
+
+        for tx in transactions:
+            yield (
+                "<STMTTRN>"
+                f"<TRNTYPE>{'DEBIT' if tx.get('amount_type') == 'debit' else 'CREDIT'}</TRNTYPE>"
+                f"<DTPOSTED>{_ofx_date(tx.get('transaction_date', ''))}</DTPOSTED>"
+                f"<TRNAMT>{signed_amount(tx):.2f}</TRNAMT>"
+                f"<FITID>{_fit_id(index, tx)}</FITID>"
+                f"<NAME>{_ofx_escape(tx.get('transaction_description', '')[:32])}</NAME>"
+                f"<MEMO>{_ofx_escape(tx.get('transaction_description', ''))}</MEMO>"
+                "</STMTTRN>\n"
+            )
+            index += 1
+
+        yield (
+            "</BANKTRANLIST>\n"
+            f"<LEDGERBAL><BALAMT>{closing:.2f}</BALAMT><DTASOF>{last_date}</DTASOF></LEDGERBAL>\n"
+            "</STMTRS>\n</STMTTRNRS>\n"
+        )
+
+    yield "</BANKMSGSRSV1>\n</OFX>\n"
+
+
+def _qif_date(date_str: str) -> str:
+    # "2025-10-07" -> "10/07/2025"
+    parts = date_str.split("-")
+    if len(parts) != 3:
+        return date_str
+    return f"{parts[1]}/{parts[2]}/{parts[0]}"
+
+
+def _iter_qif_rows(result: dict):
+    yield "!Type:Bank\n"
+    for tx in result.get("transactions", []):
+        desc = tx.get("transaction_description", "").replace("\n", " ")
+        category = f"L{tx['transaction_category']}\n" if tx.get("transaction_category") else ""
+        yield (
+            f"D{_qif_date(tx.get('transaction_date', ''))}\n"
+            f"T{signed_amount(tx):.2f}\n"
+            f"P{desc}\n"
+            f"{category}"
+            "^\n"
+        )
+
+
+# format -> (row generator, media type, file extension)
+EXPORT_FORMATS = {
+    "csv": (_iter_csv_rows, "text/csv", "csv"),
+    "ofx": (_iter_ofx_rows, "application/x-ofx", "ofx"),
+    "qif": (_iter_qif_rows, "application/qif", "qif"),
+}
+
+
+def gzip_chunks(chunks):
+    # wbits=31 -> gzip container, compressed incrementally per chunk
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def content_disposition(filename: str, ext: str) -> str:
+    # Attachment header for an export named after the upload. The plain
+    # filename is ASCII-only (header values are latin-1, and a quote or CRLF
+    # would break out of the header); the full name goes in the RFC 5987
+    # filename* parameter.
+    base = os.path.splitext(os.path.basename((filename or "").replace("\\", "/")))[0]
+    base = re.sub(r"[\x00-\x1f\x7f]", "", base).strip() or "statement"
+    fallback = re.sub(r"[^A-Za-z0-9._ -]", "_", base)
+    name = f"{base}.{ext}"
+    return f'attachment; filename="{fallback}.{ext}"; filename*=UTF-8\'\'{quote(name, safe="")}'
+
+
+def export_statement(result: dict, fmt: str, compress: bool = False):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    row_iter, _, _ = EXPORT_FORMATS[fmt]
+    chunks = _buffered(row_iter(result))
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return chunks
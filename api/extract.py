@@ -0,0 +1,290 @@
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import itertools
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+
+from api.cancellation import Cancelled, checkpoint, current_token
+
+# Documents with at least this many pages are split into page ranges and
+# extracted by several worker processes instead of one serial loop.
+PARALLEL_PAGE_THRESHOLD = int(os.environ.get("PARALLEL_PAGE_THRESHOLD", "150"))
+# Upper bound on worker processes for a single request
+MAX_EXTRACT_WORKERS = int(os.environ.get("MAX_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Below this a worker costs more to start than it saves
+MIN_PAGES_PER_WORKER = int(os.environ.get("MIN_PAGES_PER_WORKER", "40"))
+# How often a wait on worker processes looks for a cancel (seconds)
+WAIT_SLICE = 0.1
+KILL_SIGNAL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+
+class PasswordRequired(ValueError):
+    pass
+
+
+class IncorrectPassword(ValueError):
+    pass
+
+
+def open_pdf(file_content: bytes, password: str = None):
+    doc = fitz.open(stream=file_content, filetype="pdf")
+
+    # Check if PDF needs a password
+    if doc.needs_pass:
+        if not password:
+            # Case: PDF is locked, but NO password was sent
+            raise PasswordRequired("This PDF is password protected. Please provide a password.")
+
+        # authenticate returns True if success, False if fail
+        if not doc.authenticate(password):
+            # Case: PDF is locked, but WRONG password was sent
+            raise IncorrectPassword("incorrect password, please retry again")
+    return doc
+
+
+def extract_page_text(page) -> str:
+    # sort=True attempts to order text by physical position (reading order)
+    return page.get_text("text", sort=True)
+
+
+def join_pages(pages: list) -> str:
+    return "".join(page_text + "\n" for page_text in pages)
+
+
+def page_ranges(page_count: int, workers: int) -> list:
+    # Contiguous [start, stop) ranges of near-equal size, in page order
+    size, extra = divmod(page_count, workers)
+    ranges = []
+    start = 0
+    for w in range(workers):
+        stop = start + size + (1 if w < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _extract_range(path: str, password: str, numbers: list) -> list:
+    # Runs in a worker process: open and unlock the spooled file independently
+    doc = fitz.open(path)
+    try:
+        if doc.needs_pass and not doc.authenticate(password or ""):
+            raise IncorrectPassword("incorrect password, please retry again")
+        return [extract_page_text(doc[i]) for i in numbers]
+    finally:
+        doc.close()
+
+
+_started = None  # in a worker: queue to the parent, set by _report_pid
+
+
+def _report_pid(started):
+    # Worker initializer: tells the parent which process it is
+    global _started
+    _started = started
+    started.put((None, os.getpid()))
+
+
+def _run_task(task_id: int, fn, *args):
+    # Runs in a worker: reports which process took this task before running it
+    _started.put((task_id, os.getpid()))
+    return fn(*args)
+
+
+class WorkerPool:
+    # Spawned worker processes shared by all requests. Each worker reports
+    # its PID on start and again with the id of every task it picks up, so
+    # a request past its deadline can kill the process running its own task
+    # and nobody else's.
+    # spawn: the server process has threads (event loop, threadpool), so
+    # forking it is not safe.
+
+    def __init__(self, workers: int):
+        ctx = multiprocessing.get_context("spawn")
+        self._reported = ctx.SimpleQueue()
+        self._pids = set()
+        self._tasks = {}  # task id -> PID of the worker running it
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx, initializer=_report_pid, initargs=(self._reported,),
+        )
+
+    def submit(self, fn, *args):
+        task_id = next(self._ids)
+        future = self.executor.submit(_run_task, task_id, fn, *args)
+        future.task_id = task_id
+        future.add_done_callback(self._forget)
+        return future
+
+    def _drain(self):
+        while not self._reported.empty():
+            task_id, pid = self._reported.get()
+            self._pids.add(pid)
+            if task_id is not None:
+                self._tasks[task_id] = pid
+
+    def _forget(self, future):
+        with self._lock:
+            self._drain()
+            self._tasks.pop(future.task_id, None)
+
+    def pids(self) -> set:
+        with self._lock:
+            self._drain()
+            return set(self._pids)
+
+    def pid_of(self, future) -> int:
+        # PID of the worker running this future, None when not running
+        with self._lock:
+            self._drain()
+            return self._tasks.get(future.task_id) if future.running() else None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # The shared pool, started on first use; None when this runtime cannot
+    # run one (no /dev/shm or no process spawning, as on some serverless
+    # hosts), in which case callers extract serially
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = WorkerPool(MAX_EXTRACT_WORKERS)
+            except (OSError, NotImplementedError, ImportError) as e:
+                print(f"WARNING: worker pool unavailable, extracting serially: {e!r}")
+                return None
+        return _pool
+
+
+def discard_pool(pool: WorkerPool):
+    # A broken pool is replaced on the next get_pool()
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown()
+
+
+def kill_tasks(pool: WorkerPool, futures: list):
+    # Native code inside page.get_text never reaches a checkpoint, so a
+    # request past its deadline kills the workers running its own tasks.
+    # That breaks the executor: other requests' waiting ranges fail with
+    # BrokenProcessPool and are extracted serially, and the next request
+    # starts a new pool.
+    killed = False
+    for future in futures:
+        pid = pool.pid_of(future)
+        if pid is None:
+            continue
+        try:
+            os.kill(pid, KILL_SIGNAL)
+            killed = True
+        except ProcessLookupError:
+            pass
+    if killed:
+        discard_pool(pool)
+
+
+def wait_result(pool: WorkerPool, future, stage: str, siblings: list = ()):
+    # future.result() that still honours the request's token. siblings are
+    # the request's other futures in the same pool. On a cancel the request's
+    # queued tasks are dropped and the ones already running finish their
+    # chunk unobserved; past the budget its running tasks' workers are
+    # killed. Other requests' tasks are never touched. Waits in short slices
+    # so a cancel is noticed within WAIT_SLICE.
+    token = current_token()
+    mine = list(siblings) or [future]
+    while True:
+        remaining = token.remaining() if token is not None else None
+        timeout = WAIT_SLICE if remaining is None else max(0.0, min(remaining, WAIT_SLICE))
+        try:
+            return future.result(timeout=timeout if token is not None else None)
+        except FuturesTimeout:
+            if token.cancelled:
+                for f in mine:
+                    f.cancel()
+                raise Cancelled(stage)
+            expired = token.expired(stage)
+            if expired is not None:
+                for f in mine:
+                    f.cancel()
+                kill_tasks(pool, mine)
+                raise expired
+
+
+def _worker_count(page_count: int, max_workers: int) -> int:
+    if page_count < PARALLEL_PAGE_THRESHOLD:
+        return 1
+    return max(1, min(max_workers, page_count // MIN_PAGES_PER_WORKER))
+
+
+def extract_pages(
+    doc,
+    file_content: bytes,
+    password: str = None,
+    max_workers: int = None,
+    page_numbers: list = None,
+    stop=None,
+) -> list:
+    # max_workers=1 forces the serial loop (e.g. when already inside a worker).
+    # page_numbers: 0-based pages to extract, in order (default: all).
+    # stop: called with each page's text; returning True ends extraction
+    # after that page, which needs the serial loop.
+    numbers = list(range(doc.page_count)) if page_numbers is None else list(page_numbers)
+    workers = 1 if stop is not None else _worker_count(len(numbers), max_workers or MAX_EXTRACT_WORKERS)
+    checkpoint("extract", page_count=len(numbers), pages_extracted=0)
+    pool = get_pool() if workers >= 2 else None
+    if pool is None:
+        return _extract_serial(doc, numbers, [], stop)
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            spool.write(file_content)
+
+        ranges = page_ranges(len(numbers), workers)
+        try:
+            futures = [pool.submit(_extract_range, path, password, numbers[start:end]) for start, end in ranges]
+        except (OSError, RuntimeError) as e:
+            # Workers failed to start (BrokenProcessPool is a RuntimeError)
+            print(f"WARNING: worker pool failed, extracting serially: {e!r}")
+            discard_pool(pool)
+            return _extract_serial(doc, numbers, [], stop)
+
+        # Reassemble in page order regardless of completion order, waiting
+        # no longer than the conversion budget allows
+        pages = []
+        for (start, end), future in zip(ranges, futures):
+            try:
+                pages.extend(wait_result(pool, future, "extract", futures))
+            except (BrokenProcessPool, CancelledError):
+                # A worker died (or was killed for another request's
+                # deadline) and the pool was shut down: this range is done
+                # here instead
+                discard_pool(pool)
+                _extract_serial(doc, numbers[start:end], pages, None)
+            checkpoint("extract", pages_extracted=len(pages))
+        return pages
+    finally:
+        os.unlink(path)
+
+
+def _extract_serial(doc, numbers: list, pages: list, stop) -> list:
+    for i in numbers:
+        pages.append(extract_page_text(doc[i]))
+        checkpoint("extract", pages_extracted=len(pages))
+        if stop is not None and stop(pages[-1]):
+            break
+    return pages
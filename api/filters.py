@@ -0,0 +1,144 @@
+import re
+from datetime import date, datetime
+
+from api.parsers import detect_bank
+
+# Row dates as they appear on a page, per layout. Used only to decide when
+# extraction can stop; the parsers still produce the actual rows. Only dates
+# that start a line count, and a period range ("01 Nov 2025 - 30 Nov 2025")
+# repeated in page headers is not a row date.
+_DAY_MONTH_YEAR = re.compile(
+    r"^\s*(\d{1,2})\s(Jan|Feb|Mar|Apr|Mei|May|Jun|Jul|Aug|Agu|Sep|Oct|Okt|Nov|Dec|Des)\s(\d{4})\b(?!\s*-\s*\d)",
+    re.IGNORECASE | re.MULTILINE,
+)
+_BCA_ROW_DATE = re.compile(r"^\s*(\d{2})/(\d{2})\b", re.MULTILINE)
+_BCA_PERIOD_YEAR = re.compile(r"PERIODE\s*[:]?\s*\D*(\d{4})", re.IGNORECASE)
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "mei": 5, "may": 5, "jun": 6, "jul": 7,
+    "aug": 8, "agu": 8, "sep": 9, "oct": 10, "okt": 10, "nov": 11, "dec": 12, "des": 12,
+}
+
+
+def parse_date(value: str, name: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def parse_page_spec(spec: str, page_count: int) -> list:
+    # "1-3,7,10-" -> [0, 1, 2, 6, 9, ..., page_count - 1] (1-based, inclusive)
+    selected = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        m = re.fullmatch(r"(\d*)\s*-\s*(\d*)|(\d+)", part)
+        if not m or part == "-":
+            raise ValueError(f"Invalid page range: {part}")
+        if m.group(3):
+            start = stop = int(m.group(3))
+        else:
+            start = int(m.group(1) or 1)
+            stop = int(m.group(2) or page_count)
+        if start < 1 or stop < start:
+            raise ValueError(f"Invalid page range: {part}")
+        selected.update(range(start - 1, min(stop, page_count)))
+    if not selected:
+        raise ValueError("pages selects no pages of this document")
+    return sorted(selected)
+
+
+def page_dates(bank: str, text: str, year: int) -> list:
+    if bank == "BCA":
+        out = []
+        for day, month in _BCA_ROW_DATE.findall(text):
+            try:
+                out.append(date(year, int(month), int(day)))
+            except ValueError:
+                continue
+        return out
+    out = []
+    for day, month, yr in _DAY_MONTH_YEAR.findall(text):
+        try:
+            out.append(date(int(yr), MONTHS[month.lower()], int(day)))
+        except ValueError:
+            continue
+    return out
+
+
+class PastDate:
+    # Stop condition for extract_pages: statement rows are chronological, so
+    # once every row date on a page is after to_date the remaining pages can
+    # be skipped. Bank and year are taken from the first page seen (page 1,
+    # which the pipeline always reads). The page that triggers the stop has
+    # been extracted already, so one page past the window is always read;
+    # its rows are filtered out by apply_date_window.
+    def __init__(self, to_date: date, metadata: dict):
+        self.to_date = to_date
+        self.metadata = metadata
+        self.bank = None
+        self.year = datetime.now().year
+        self.seen_first = False
+
+    def __call__(self, page_text: str) -> bool:
+        if not self.seen_first:
+            self.seen_first = True
+            self.bank, _ = detect_bank(page_text, self.metadata)
+            m = _BCA_PERIOD_YEAR.search(page_text)
+            if m:
+                self.year = int(m.group(1))
+        dates = page_dates(self.bank, page_text, self.year)
+        return bool(dates) and min(dates) > self.to_date
+
+
+def _signed(tx: dict) -> float:
+    amount = abs(tx.get("transaction_amount", 0.0))
+    return -amount if tx.get("amount_type") == "debit" else amount
+
+
+def apply_date_window(result: dict, from_date: date = None, to_date: date = None) -> dict:
+    # Keeps rows inside [from_date, to_date] and recomputes the summary for
+    # that window. The opening balance comes from the first kept row's printed
+    # balance when it has one, otherwise from walking the rows before it.
+    transactions = result.get("transactions", [])
+    lo = from_date.isoformat() if from_date else ""
+    hi = to_date.isoformat() if to_date else "9999-12-31"
+
+    balance = result.get("initial_balance", 0.0)  # running balance before the window
+    opening = None
+    kept = []
+    for tx in transactions:
+        day = tx.get("transaction_date", "")
+        if day < lo:
+            if tx.get("transaction_balance"):
+                balance = tx["transaction_balance"]
+            else:
+                balance += _signed(tx)
+            continue
+        if day > hi:
+            continue
+        if opening is None:
+            if tx.get("transaction_balance"):
+                opening = tx["transaction_balance"] - _signed(tx)
+            else:
+                opening = balance
+        kept.append(tx)
+    if opening is None:
+        opening = balance
+
+    incoming = sum(abs(tx.get("transaction_amount", 0.0)) for tx in kept if tx.get("amount_type") != "debit")
+    outgoing = sum(abs(tx.get("transaction_amount", 0.0)) for tx in kept if tx.get("amount_type") == "debit")
+    first = kept[0]["transaction_date"] if kept else ""
+    last = kept[-1]["transaction_date"] if kept else ""
+
+    result.update({
+        "period": f"{from_date.isoformat() if from_date else first} - {to_date.isoformat() if to_date else last}",
+        "initial_balance": round(opening, 2),
+        "closing_balance": round(opening + incoming - outgoing, 2),
+        "incoming_transactions": round(incoming, 2),
+        "outgoing_transactions": round(outgoing, 2),
+        "transactions": kept,
+    })
+    return result
@@ -1,15 +1,48 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header, Depends, Query, Request, WebSocket, WebSocketDisconnect, WebSocketException, status
 from fastapi.middleware.cors import CORSMiddleware
-import fitz  # PyMuPDF
-from api.parsers import parse_bank_statement
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from api.extract import open_pdf, PasswordRequired, IncorrectPassword
+from api.cancellation import BudgetExceeded, Cancelled
+from api.pipeline import CONVERT_BUDGET_SECONDS, convert_document
+from api.summary import summarize_document
+from api.filters import parse_date, parse_page_spec
+from api.preflight import inspect_document
+from api.profiling import start_profile
+from api.dedupe import mark_duplicates
+from api.categorize import validate_rules
+from api.exporters import EXPORT_FORMATS, content_disposition, export_statement
+from api.models import Statement, StatementSummary, statement_response, summary_response
+from api.persistence import persist_statement, resolve_account
+from api import supabase_client
+from api.rules import reset_rule_stats, rule_stats
+from api import store as local_store
+from api import archive as text_archive
+from api import progress
 import os
-from supabase import create_client, Client
+import json
+import asyncio
+import functools
+import anyio
+from typing import Union
+import traceback
+from contextlib import asynccontextmanager
+from supabase import AsyncClient
 from dotenv import load_dotenv
 
 # Load env vars from .env file if present
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the shared Supabase client up front when configured; it is also
+    # created lazily on first use in case the runtime skips startup.
+    if supabase_client.is_configured():
+        await supabase_client.get_client()
+    yield
+    await supabase_client.close_client()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,25 +57,21 @@ app.add_middleware(
 
 
 # Supabase Client
-# url: str = os.environ.get("SUPABASE_URL")
-# key: str = os.environ.get("SUPABASE_KEY")
-# supabase: Client = create_client(url, key) if url and key else None
-
-def get_supabase() -> Client:
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
+# One process-wide async client (see api/supabase_client.py) so auth and
+# PostgREST calls reuse pooled connections instead of reconnecting per request.
 
-    if not url or not key:
+async def get_supabase() -> AsyncClient:
+    if not supabase_client.is_configured():
         raise HTTPException(
             status_code=500,
             detail="Supabase environment variables not configured"
         )
 
-    return create_client(url, key)
+    return await supabase_client.get_client()
 
 async def verify_token(
     authorization: str = Header(...),
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncClient = Depends(get_supabase)
 ):
     if not supabase:
         # If supabase is not configured, strictly speaking we should probably fail safe
@@ -57,7 +86,7 @@ async def verify_token(
     token = authorization.split(" ")[1]
     
     try:
-        user = supabase.auth.get_user(token)
+        user = await supabase.auth.get_user(token)
         if not user:
              raise HTTPException(status_code=401, detail="user unauthorized")
         return user
@@ -65,64 +94,444 @@ async def verify_token(
         # Supabase raises exception on invalid token
         raise HTTPException(status_code=401, detail="user unauthorized")
 
+async def verify_ws_token(websocket: WebSocket, token: str = Query(None)):
+    # Browsers cannot set headers on a WebSocket, so the access token may
+    # also come as ?token=
+    raw = token or (websocket.headers.get("authorization") or "").removeprefix("Bearer ").strip()
+    if not raw or not supabase_client.is_configured():
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="user unauthorized")
+    supabase = await supabase_client.get_client()
+    try:
+        user = await supabase.auth.get_user(raw)
+    except Exception:
+        user = None
+    if not user:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="user unauthorized")
+    return user
+
+async def verify_internal(x_internal_token: str = Header(None)):
+    # Internal endpoints are hidden unless INTERNAL_API_TOKEN is configured
+    expected = os.environ.get("INTERNAL_API_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_internal_token != expected:
+        raise HTTPException(status_code=401, detail="unauthorized")
+
+def get_local_store() -> local_store.TransactionStore:
+    if not local_store.is_configured():
+        raise HTTPException(status_code=500, detail="Local store not configured")
+    return local_store.get_store()
+
+def get_user_id(user) -> str:
+    # supabase.auth.get_user returns a UserResponse wrapping the user record
+    return getattr(getattr(user, "user", None), "id", "")
+
 @app.get("/")
 def home():
     return {"message": "PDF Converter API is Running!"}
 
-@app.post("/api/v1/convert")
+@app.get("/internal/supabase-pool")
+def supabase_pool_stats(_: None = Depends(verify_internal)):
+    return supabase_client.pool_stats()
+
+@app.get("/internal/rule-stats")
+def parser_rule_stats(reset: bool = False, _: None = Depends(verify_internal)):
+    # Per-bank hit counts and cumulative time for each named parser rule;
+    # reset=true zeroes the counters after reading them
+    stats = rule_stats()
+    if reset:
+        reset_rule_stats()
+    return stats
+
+@app.get("/api/v1/statements")
+async def list_statements(
+    account: str = None,
+    limit: int = Query(None, ge=1),
+    cursor: str = None,
+    user: dict = Depends(verify_token),
+    history: local_store.TransactionStore = Depends(get_local_store),
+):
+    try:
+        return await run_in_threadpool(history.list_statements, get_user_id(user), account, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/v1/transactions")
+async def search_transactions(
+    q: str = None, # full-text search over transaction_description
+    account: str = None,
+    from_date: str = None, # YYYY-MM-DD, inclusive
+    to_date: str = None,
+    min_amount: float = None,
+    max_amount: float = None,
+    amount_type: str = None, # debit | credit
+    category: str = None,
+    order: str = "date", # date | amount, newest/largest first
+    limit: int = Query(None, ge=1),
+    cursor: str = None, # next_cursor from the previous page
+    user: dict = Depends(verify_token),
+    history: local_store.TransactionStore = Depends(get_local_store),
+):
+    try:
+        return await run_in_threadpool(
+            history.query_transactions, get_user_id(user),
+            account=account, search=q, from_date=from_date, to_date=to_date,
+            min_amount=min_amount, max_amount=max_amount, amount_type=amount_type,
+            category=category, order=order, limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/v1/inspect")
+async def inspect_pdf(
+    file: UploadFile = File(...),
+    password: str = Form(None), # checked when the PDF is encrypted
+    user: dict = Depends(verify_token),
+):
+    # Preflight before /api/v1/convert: encryption, page count, creator,
+    # detected bank and a conversion cost estimate, from the metadata and
+    # first page only
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    file_content = await file.read()
+    try:
+        # AES-256 password checks take tens of milliseconds; keep them off the loop
+        return await run_in_threadpool(inspect_document, file_content, password)
+    except RuntimeError as e:
+        # fitz.FileDataError and friends: not a readable PDF
+        raise HTTPException(status_code=400, detail=f"Cannot open PDF: {e}")
+
+CONVERT_MODES = ("full", "summary")
+# Seconds between checks for a client that hung up mid-conversion
+DISCONNECT_POLL_SECONDS = 0.5
+# Progress events after which the socket is closed
+FINAL_EVENTS = ("done", "error", "cancelled", "timeout")
+
+async def cancel_on_disconnect(request: Request, job: progress.ConversionJob):
+    # Nobody will read the response once the client has gone; stop the work.
+    # This only cancels the job's own token: its queued extraction tasks are
+    # dropped and running ones finish their chunk, while other requests
+    # sharing the worker pool carry on.
+    if request is None:
+        return
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    job.cancel()
+
+@app.websocket("/api/v1/convert/progress/{job_id}")
+async def convert_progress(websocket: WebSocket, job_id: str, user=Depends(verify_ws_token)):
+    # Pushes {"type": "started" | "progress" | "done" | "error" | "cancelled"
+    # | "timeout", ...} events for the conversion posted with this job_id;
+    # progress events carry the stage and counts such as pages_extracted and
+    # rows_parsed. Sending {"type": "cancel"} stops it at the next page or
+    # row batch; it drops only this job's tasks from the shared worker pool,
+    # so other users' conversions are not affected. A frame that is not a JSON command gets a {"type":
+    # "command_error"} reply and the job carries on. May connect before the
+    # upload starts. Closing the socket while the conversion runs abandons
+    # it, unless another socket watches.
+    try:
+        job = progress.watch_job(job_id, get_user_id(user))
+    except PermissionError:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="job_id belongs to another user")
+    except progress.TooManyJobs as e:
+        raise WebSocketException(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e))
+    await websocket.accept()
+    queue = job.subscribe()
+    send_lock = asyncio.Lock()
+
+    async def send(event: dict):
+        # Events and command errors go out from two tasks
+        async with send_lock:
+            await websocket.send_json(event)
+
+    async def receive_commands():
+        # Returns only when the client hangs up
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                return
+            if frame.get("text") is None:
+                await send({"type": "command_error", "detail": "commands are JSON text frames"})
+                continue
+            try:
+                message = json.loads(frame["text"])
+            except ValueError:
+                await send({"type": "command_error", "detail": "malformed JSON"})
+                continue
+            if isinstance(message, dict) and message.get("type") == "cancel":
+                job.cancel()
+            else:
+                await send({"type": "command_error", "detail": 'unknown command, expected {"type": "cancel"}'})
+
+    receiver = asyncio.create_task(receive_commands())
+    hung_up = False
+    try:
+        while True:
+            next_event = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({next_event, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                next_event.cancel()
+                hung_up = True
+                break
+            event = next_event.result()
+            await send(event)
+            if event["type"] in FINAL_EVENTS:
+                break
+    except WebSocketDisconnect:
+        hung_up = True
+    finally:
+        receiver.cancel()
+        if receiver.done() and not receiver.cancelled():
+            receiver.exception()  # the disconnect; retrieved so it is not logged
+        watchers = job.unsubscribe(queue)
+        if hung_up and not watchers and not job.finished:
+            job.cancel()
+    if not hung_up:
+        await websocket.close()
+
+# How long past the conversion budget the handler waits for its worker
+# thread before answering 504 itself. The worker normally stops at its next
+# checkpoint and reports progress; this covers one stuck in native code (a
+# page that never returns from get_text), which no checkpoint can interrupt.
+BUDGET_GRACE_SECONDS = float(os.environ.get("CONVERT_BUDGET_GRACE_SECONDS", "2"))
+
+
+async def run_with_deadline(job, deadline, fn, *args, **kwargs):
+    # run_in_threadpool that gives up on the thread after `deadline` seconds
+    # (None waits forever): the job is cancelled so the thread exits at its
+    # next checkpoint, and asyncio.TimeoutError is raised right away
+    call = functools.partial(fn, *args, **kwargs)
+    try:
+        return await asyncio.wait_for(anyio.to_thread.run_sync(call, abandon_on_cancel=True), deadline)
+    except asyncio.TimeoutError:
+        job.cancel()
+        raise
+
+
+@app.post("/api/v1/convert", responses={200: {"model": Union[Statement, StatementSummary]}})
 async def convert_pdf_to_text(
     file: UploadFile = File(...), 
     password: str = Form(None), # 1. Accept optional password field
-    user: dict = Depends(verify_token) # 2. Validate token
+    export_format: str = Form(None, alias="format"), # csv | ofx | qif, JSON when omitted
+    compress: bool = Form(False), # gzip the exported file
+    persist: bool = Form(False), # upsert the parsed statement into Supabase
+    account: str = Form(None), # account identifier used for idempotency keys; defaults to the header's account number
+    categorize: bool = Form(True), # label transactions with transaction_category
+    categories: str = Form(None), # extra rules as JSON: {"category": ["KEYWORD", ...]}
+    dedupe: bool = Form(False), # mark rows already seen in earlier uploads for this account
+    strip_boilerplate: bool = Form(True), # drop header/footer lines repeated on most pages
+    cascade: bool = Form(False), # on ambiguous detection, run all parsers and keep the most consistent
+    analytics: bool = Form(False), # per-day/week/category totals, top counterparties, balances
+    store: bool = Form(False), # keep the statement in the local SQLite history (LOCAL_STORE_PATH)
+    mode: str = Form("full"), # full | summary (period and balances only, no rows)
+    from_date: str = Form(None), # YYYY-MM-DD; keep rows on or after this date
+    to_date: str = Form(None), # YYYY-MM-DD; keep rows up to this date, later pages are not read
+    pages: str = Form(None), # 1-based page ranges to read, e.g. "1-3,7,10-"
+    sections: bool = Form(False), # parse each account/period of a combined export separately
+    archive: bool = Form(False), # keep the extracted text (encrypted) for re-parsing after parser fixes
+    job_id: str = Form(None), # client-chosen id; watch or cancel via /api/v1/convert/progress/{job_id}
+    request: Request = None,
+    user: dict = Depends(verify_token), # 2. Validate token
+    supabase: AsyncClient = Depends(get_supabase)
 ):
     # Validate file type
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF")
 
+    if export_format and export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {export_format}")
+
+    if mode not in CONVERT_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported mode: {mode}")
+    if mode == "summary" and (export_format or persist or store or dedupe or analytics or sections or archive):
+        raise HTTPException(status_code=400, detail="mode=summary returns no rows; it cannot be combined with format, persist, store, dedupe, analytics, sections or archive")
+    if mode == "summary" and (from_date or to_date or pages):
+        raise HTTPException(status_code=400, detail="mode=summary cannot be combined with from_date, to_date or pages")
+    if archive and (from_date or to_date or pages):
+        # Filters extract only part of the document; the archive needs all of it
+        raise HTTPException(status_code=400, detail="archive cannot be combined with from_date, to_date or pages")
+    if archive and not text_archive.is_configured():
+        raise HTTPException(status_code=500, detail="Text archive not configured")
+
+    try:
+        window_from = parse_date(from_date, "from_date") if from_date else None
+        window_to = parse_date(to_date, "to_date") if to_date else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if window_from and window_to and window_from > window_to:
+        raise HTTPException(status_code=400, detail="from_date must not be after to_date")
+
+    extra_rules = None
+    if categories:
+        try:
+            extra_rules = json.loads(categories)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="categories must be a JSON object")
+        try:
+            validate_rules(extra_rules)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    profile = None
     try:
         # Read file content into memory
         file_content = await file.read()
         
-        # Open PDF using PyMuPDF
-        doc = fitz.open(stream=file_content, filetype="pdf")
-
-        # 2. Check if PDF needs a password
-        if doc.needs_pass:
-            if not password:
-                # Case: PDF is locked, but NO password was sent
-                raise HTTPException(
-                    status_code=400, 
-                    detail="This PDF is password protected. Please provide a password."
-                )
-            
-            # 3. Try to unlock with the provided password
-            # authenticate returns True if success, False if fail
-            if not doc.authenticate(password):
-                 # Case: PDF is locked, but WRONG password was sent
-                raise HTTPException(
-                    status_code=400, 
-                    detail="incorrect password, please retry again"
-                )
+        # Open PDF using PyMuPDF, unlocking it with the optional password
+        try:
+            doc = open_pdf(file_content, password)
+        except (PasswordRequired, IncorrectPassword) as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        text_output = ""
-        
-        # Extract text
-        for page in doc:
-            # sort=True attempts to order text by physical position (reading order)
-            text_output += page.get_text("text", sort=True) + "\n"
-            
-        # Parse Bank Statement
+        page_numbers = None
+        if pages:
+            try:
+                page_numbers = parse_page_spec(pages, doc.page_count)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        # Every conversion runs under a job token, registered for progress
+        # subscribers when the client sent a job_id
+        if job_id:
+            try:
+                job = progress.start_job(job_id, get_user_id(user))
+            except PermissionError as e:
+                raise HTTPException(status_code=403, detail=str(e))
+            except progress.TooManyJobs as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            except ValueError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+        else:
+            job = progress.ConversionJob(None, get_user_id(user))
+
+        # Extract, strip boilerplate, parse and categorize off the event loop.
+        # Large documents are split across worker processes during extraction.
+        profile = start_profile()
+        archived_pages = []
+        watcher = asyncio.create_task(cancel_on_disconnect(request, job))
+        deadline = CONVERT_BUDGET_SECONDS + BUDGET_GRACE_SECONDS if CONVERT_BUDGET_SECONDS else None
         try:
-            # We pass text_output, metadata, and filename to the parser
-            result = parse_bank_statement(text_output, doc.metadata, file.filename)
-            return result
+            if mode == "summary":
+                # Only the pages holding the summary block are extracted
+                result = await run_with_deadline(
+                    job, deadline, profile.run, job.run, summarize_document,
+                    doc, file_content, password, file.filename, profile=profile,
+                )
+            else:
+                result = await run_with_deadline(
+                    job, deadline, profile.run, job.run, convert_document,
+                    doc, file_content, password, file.filename,
+                    strip=strip_boilerplate, categorize=categorize,
+                    extra_rules=extra_rules, profile=profile, cascade=cascade,
+                    analytics=analytics, from_date=window_from, to_date=window_to,
+                    pages=page_numbers, sections=sections,
+                    on_extract=archived_pages.extend if archive else None,
+                )
+        except BudgetExceeded as e:
+            # The worker has already stopped; report how far it got
+            profile.info["timed_out"] = e.stage
+            job.finish({"type": "timeout", "stage": e.stage, **e.progress})
+            raise HTTPException(status_code=504, detail={
+                "error": str(e),
+                "stage": e.stage,
+                "budget_seconds": e.budget,
+                **e.progress,
+            })
+        except asyncio.TimeoutError:
+            # The worker is stuck where it cannot check its token; it is left
+            # to finish on its own and its result is discarded
+            profile.info["timed_out"] = job.stage
+            job.finish({"type": "timeout", "stage": job.stage, **job.token.progress})
+            raise HTTPException(status_code=504, detail={
+                "error": f"Conversion exceeded its {CONVERT_BUDGET_SECONDS:g}s time budget during {job.stage or 'processing'}",
+                "stage": job.stage,
+                "budget_seconds": CONVERT_BUDGET_SECONDS,
+                **job.token.progress,
+            })
+        except Cancelled as e:
+            # Cancelled over the progress socket, or the client went away
+            stage = str(e) or None
+            profile.info["cancelled"] = stage
+            job.finish({"type": "cancelled", "stage": stage, **job.token.progress})
+            raise HTTPException(status_code=499, detail={
+                "error": "Conversion cancelled",
+                "stage": stage,
+                **job.token.progress,
+            })
         except ValueError as e:
             # "Bank Not Supported" error
+            job.finish({"type": "error", "detail": str(e)})
             raise HTTPException(status_code=400, detail=str(e))
+        else:
+            job.finish({"type": "done", "transactions": len(result.get("transactions", []))})
+        finally:
+            watcher.cancel()
+            if not job.finished:
+                job.finish({"type": "error", "detail": "Error processing PDF"})
+
+        if mode == "summary":
+            return summary_response(result)
+
+        if persist or store or dedupe:
+            # Keys and duplicate filters are per user and account; without an
+            # account nothing is written or checked
+            try:
+                account = resolve_account(result, account)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        if dedupe:
+            with profile.stage("dedupe"):
+                result["duplicates"] = await run_in_threadpool(
+                    mark_duplicates, result["transactions"], get_user_id(user), account
+                )
+
+        if persist:
+            try:
+                with profile.stage("persist"):
+                    result["persisted"] = await persist_statement(
+                        supabase, result, get_user_id(user), account
+                    )
+            except Exception as e:
+                traceback.print_exc()
+                raise HTTPException(status_code=502, detail=f"Failed to persist transactions: {repr(e)}")
+
+        if archive:
+            with profile.stage("archive"):
+                result["archived"] = await run_in_threadpool(
+                    text_archive.get_archive().save, get_user_id(user),
+                    text_archive.content_hash(file_content), file.filename or "",
+                    doc.metadata, archived_pages, account or "",
+                )
+
+        if store:
+            history = get_local_store()
+            with profile.stage("store"):
+                result["stored"] = await run_in_threadpool(
+                    history.save_statement, result, get_user_id(user), account
+                )
+
+        if not export_format:
+            return statement_response(result)
+
+        # Stream the export row by row instead of building it in memory
+        _, media_type, ext = EXPORT_FORMATS[export_format]
+        headers = {"Content-Disposition": content_disposition(file.filename, ext)}
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(
+            export_statement(result, export_format, compress),
+            media_type=media_type,
+            headers=headers,
+        )
 
     except HTTPException as http_exc:
         # Re-raise custom HTTP exceptions (like 400 or 401)
         raise http_exc
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {repr(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing PDF: {repr(e)}")
+    finally:
+        # Every outcome (done, 4xx, timeout, cancelled, 5xx) keeps its sample
+        if profile is not None:
+            profile.finish()
\ No newline at end of file
@@ -0,0 +1,60 @@
+from typing import List, Optional
+
+from fastapi import Response
+from pydantic import BaseModel
+
+
+class Transaction(BaseModel):
+    transaction_date: str
+    transaction_description: str
+    transaction_amount: float
+    amount_type: str
+    transaction_bank: str
+    transaction_balance: float
+    transaction_category: Optional[str] = None
+    transaction_status: Optional[str] = None
+
+
+class Statement(BaseModel):
+    account: Optional[str] = None
+    # Null for a combined export of several accounts; see "sections"
+    period: Optional[str] = None
+    initial_balance: Optional[float] = None
+    closing_balance: Optional[float] = None
+    incoming_transactions: Optional[float] = None
+    outgoing_transactions: Optional[float] = None
+    transactions: List[Transaction]
+    persisted: Optional[dict] = None
+    stored: Optional[dict] = None
+    archived: Optional[dict] = None
+    duplicates: Optional[dict] = None
+    detection: Optional[dict] = None
+    analytics: Optional[dict] = None
+    filter: Optional[dict] = None
+    sections: Optional[List[dict]] = None
+
+
+class StatementSummary(BaseModel):
+    bank: Optional[str] = None
+    period: str
+    initial_balance: float
+    closing_balance: float
+    incoming_transactions: float
+    outgoing_transactions: float
+    summary_source: str  # "header" | "rows"
+    derived_fields: Optional[List[str]] = None
+    missing: Optional[List[str]] = None
+    pages_read: int
+    page_count: int
+
+
+def statement_response(result: dict) -> Response:
+    # Validate and serialize in pydantic_core in one go. Returning a Response
+    # directly skips FastAPI's jsonable_encoder walk over every transaction.
+    body = Statement.model_validate(result).model_dump_json(exclude_none=True)
+    return Response(content=body, media_type="application/json")
+
+
+def summary_response(result: dict) -> Response:
+    body = StatementSummary.model_validate(result).model_dump_json(exclude_none=True)
+    return Response(content=body, media_type="application/json")
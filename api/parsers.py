@@ -1,46 +1,78 @@
 import re
 from datetime import datetime
-
-def parse_bank_statement(text: str, metadata: dict, filename: str = "") -> dict:
+from api.cancellation import checkpoint
+from api.rules import hit, rule
+
+# How much a detect_bank branch can be trusted. Metadata is authoritative;
+# the text fallbacks (and "BCA Digital", which BCA statements can mention
+# too) are guesses.
+BRANCH_CONFIDENCE = {
+    "creator:mandiri": 1.0,
+    "creator:bca": 1.0,
+    "creator:bni": 1.0,
+    "text:blu": 0.9,
+    "text:bca-digital": 0.5,
+    "text:mandiri": 0.8,
+    "text:bca": 0.8,
+    "text:bni": 0.8,
+    "fallback:mandiri": 0.4,
+    "fallback:bca": 0.3,
+}
+
+def detect_bank(text: str, metadata: dict) -> tuple:
+    # Returns (bank, branch) where branch names the signature that matched
     creator = metadata.get("creator", "")
-    print(f"DEBUG: parse_bank_statement called. Creator: '{creator}'")
-    
-    result = {}
-    
+
     # Priority 1: Metadata Signature
     if "Bank Mandiri" in creator:
-        return parse_mandiri(text)
+        return "MANDIRI", "creator:mandiri"
     if "E-statement Batch Generator" in creator or "BCA" in creator.upper():
-        return parse_bca(text)
+        return "BCA", "creator:bca"
     if "BNI" in creator.upper() or "Bank Negara Indonesia" in creator:
-        return parse_bni(text)
-    if "bluAccount" in text or "BCA Digital" in text or "bluSaving" in text:
-        return parse_blu(text)
+        return "BNI", "creator:bni"
+    if "bluAccount" in text or "bluSaving" in text:
+        return "BLU", "text:blu"
+    if "BCA Digital" in text:
+        return "BLU", "text:bca-digital"
         
     # Priority 2: Specific Content Signature
     if "Tabungan NOW" in text or "Bank Mandiri" in text or "Mandiri Call" in text:
-        return parse_mandiri(text)
+        return "MANDIRI", "text:mandiri"
         
     if "MUTASI REKENING" in text and "BCA" in text:
-        return parse_bca(text)
+        return "BCA", "text:bca"
 
     if "TAPLUS" in text and "BNI" in text:
-        return parse_bni(text)
+        return "BNI", "text:bni"
         
     # Fallback
     if "mandiri" in text.lower():
-        return parse_mandiri(text)
+        return "MANDIRI", "fallback:mandiri"
     if "BCA" in text: # Weak fallback
-        return parse_bca(text)
+        return "BCA", "fallback:bca"
+    
+    return None, None
+
+def parse_bank_statement(text: str, metadata: dict, filename: str = "") -> dict:
+    creator = metadata.get("creator", "")
+    print(f"DEBUG: parse_bank_statement called. Creator: '{creator}'")
     
-    raise ValueError("Bank Not Supported")
+    bank, _ = detect_bank(text, metadata)
+    if bank is None:
+        raise ValueError("Bank Not Supported")
+    return PARSERS[bank](text)
+
+# Shared helpers
+AMOUNT_NON_NUMERIC = rule("common", "amount:strip-non-numeric", r"[^\d.,-]")
+AMOUNT_DECIMAL_COMMA = rule("common", "amount:decimal-comma", r",\d{2}$")
+WHITESPACE = rule("common", "desc:collapse-whitespace", r"\s+")
 
 def clean_amount(amount_str: str) -> float:
     if not amount_str: 
         return 0.0
     
     # Keep digits, dots, commas, minus
-    clean_str = re.sub(r"[^\d.,-]", "", str(amount_str))
+    clean_str = AMOUNT_NON_NUMERIC.sub("", str(amount_str))
     
     if not clean_str: 
         return 0.0
@@ -65,7 +97,7 @@ def clean_amount(amount_str: str) -> float:
             return float(val) * (-1 if is_negative else 1)
     elif "," in clean_str:
         # Check if comma is decimal (e.g. ,00 at end)
-        if re.search(r",\d{2}$", clean_str):
+        if AMOUNT_DECIMAL_COMMA.search(clean_str):
              val = clean_str.replace(",", ".")
              return float(val) * (-1 if is_negative else 1)
         else:
@@ -76,17 +108,34 @@ def clean_amount(amount_str: str) -> float:
     # Simple number
     return float(clean_str) * (-1 if is_negative else 1)
 
+# BCA rules
+BCA_PERIOD = rule("BCA", "header:period", r"PERIODE\s*[:]\s*(.+)", re.IGNORECASE)
+BCA_YEAR = rule("BCA", "header:year", r"\d{4}")
+BCA_SKIP_BRANCH = rule("BCA", "skip:branch-office", r"KCU\s+[A-Z]+")
+BCA_SKIP_MUTASI = rule("BCA", "skip:mutasi-summary", r"MUTASI\s+(CR|DB)")
+BCA_SKIP_DISCLAIMER = rule("BCA", "skip:disclaimer", r"(APABILA|BERHAK|SEGALA DATA|UANG ANDA)", re.IGNORECASE)
+# Amount patterns only start where a number starts (or right after a previous
+# amount's decimals). Without the lookbehinds a long digit/separator run that
+# never reaches "\.dd" is rescanned from every position in it: quadratic time.
+# Matches are unchanged; see complexity.py.
+BCA_TRAILING_BALANCE = rule("BCA", "amount:trailing-balance", r"(?<![\d,])([\d,]+\.\d{2})$")
+BCA_DATE = rule("BCA", "date:dd/mm", r"^(\d{2})/(\d{2})")
+BCA_AMOUNTS = rule("BCA", "amount:all", r"((?:(?<=\.\d\d)|(?<![\d,]))[\d,]+\.\d{2})")
+BCA_CONT_REFERENCE = rule("BCA", "continuation:reference", r"^\d{4}/")
+BCA_CONT_UPPER = rule("BCA", "continuation:upper-alnum", r"^[A-Z0-9\s-]+$")
+BCA_CONT_LOWER = rule("BCA", "continuation:has-lowercase", r"[a-z]")
+
 def parse_bca(text: str) -> dict:
     lines = [l.strip() for l in text.split("\n") if l.strip()]
     
     period_val = ""
-    period_match = re.search(r"PERIODE\s*[:]\s*(.+)", text, re.IGNORECASE)
+    period_match = BCA_PERIOD.search(text)
     if period_match:
         period_val = period_match.group(1).strip()
     
     # Try to find Year from Period (e.g. "OKTOBER 2025")
     current_year = str(datetime.now().year)
-    year_match = re.search(r"\d{4}", period_val)
+    year_match = BCA_YEAR.search(period_val)
     if year_match:
         current_year = year_match.group(0)
 
@@ -104,20 +153,27 @@ def parse_bca(text: str) -> dict:
     # We look for the Date at start, and Amount structure near end.
     
     for i, line in enumerate(lines):
-        # Skip page headers/footers/summaries
-        if "REKENING TAHAPAN" in line or "NO. REKENING" in line or "HALAMAN" in line: continue
-        if "CATATAN" in line or "Bersambung" in line: continue
-        if "TANGGAL" in line and "KETERANGAN" in line: continue # Table header
+        if i % 256 == 0: checkpoint("parse", rows_parsed=len(transactions))
+        # Skip page headers/footers/summaries. Repeated-line stripping only
+        # thins these out on pages 2+: page 1 is never stripped, so the header,
+        # branch, period and table-header skips fire on every statement, and
+        # a single-page statement also ends in its CATATAN/disclaimer footer.
+        # A page-number line like "HALAMAN : 2 / 5" only repeats in shape, so
+        # stripping keeps it. Uploads with strip_boilerplate=false need all.
+        if "REKENING TAHAPAN" in line or "NO. REKENING" in line or "HALAMAN" in line: hit("BCA", "skip:page-header"); continue
+        if "CATATAN" in line or "Bersambung" in line: hit("BCA", "skip:page-footer"); continue
+        if "TANGGAL" in line and "KETERANGAN" in line: hit("BCA", "skip:table-header"); continue # Table header
         
         # New Exclusions for Metadata/Footers/Summaries
-        if re.search(r"KCU\s+[A-Z]+", line): 
+        if BCA_SKIP_BRANCH.search(line): 
              current_trans = None; continue
         if "PERIODE" in line or "MATA UANG" in line: 
-             current_trans = None; continue
+             hit("BCA", "skip:account-info"); current_trans = None; continue
              
         # Handle Summaries (Extraction + Skip)
         if "SALDO AWAL" in line.upper():
-             bal_match = re.search(r"([\d,]+\.\d{2})$", line)
+             hit("BCA", "summary:saldo-awal")
+             bal_match = BCA_TRAILING_BALANCE.search(line)
              if bal_match:
                  initial_balance = clean_amount(bal_match.group(1))
              current_trans = None
@@ -125,17 +181,18 @@ def parse_bca(text: str) -> dict:
              
         if "SALDO AKHIR" in line.upper():
              # Can extract closing balance if needed, though usually calculated
+             hit("BCA", "summary:saldo-akhir")
              current_trans = None
              continue
              
-        if re.search(r"MUTASI\s+(CR|DB)", line): 
+        if BCA_SKIP_MUTASI.search(line): 
              current_trans = None; continue
              
-        if re.search(r"(APABILA|BERHAK|SEGALA DATA|UANG ANDA)", line, re.IGNORECASE): 
+        if BCA_SKIP_DISCLAIMER.search(line): 
              current_trans = None; continue
 
         # 1. Check for Date at start: DD/MM
-        date_match = re.search(r"^(\d{2})/(\d{2})", line)
+        date_match = BCA_DATE.search(line)
         if date_match:
             # New Entry
             day = date_match.group(1)
@@ -145,7 +202,7 @@ def parse_bca(text: str) -> dict:
             if "SALDO AWAL" in line.upper():
                  # Extract balance at end
                  # "01/10 SALDO AWAL ... 1,045,271.93"
-                 bal_match = re.search(r"([\d,]+\.\d{2})$", line)
+                 bal_match = BCA_TRAILING_BALANCE.search(line)
                  if bal_match:
                      initial_balance = clean_amount(bal_match.group(1))
                  current_trans = None
@@ -155,7 +212,7 @@ def parse_bca(text: str) -> dict:
             # Extract Amount and Balance
             # Pattern: (Amount) (DB)? (Balance)?
             # Regex: Find all numbers resembling currency
-            nums = re.findall(r"([\d,]+\.\d{2})", line)
+            nums = BCA_AMOUNTS.findall(line)
             
             amount = 0.0
             balance = 0.0
@@ -183,14 +240,7 @@ def parse_bca(text: str) -> dict:
                 # If "DB" is present, the number near it is Amount.
             
             # Extract Description: Everything between Date and Amount
-            # Logic: Remove Date. Remove Amount/Balance/DB from end. 
-            # Remaining is desc.
-            desc_part = line[5:] # Skip DD/MM
-            desc_part = re.sub(r"([\d,]+\.\d{2}).*", "", desc_part).strip() # Remove amount onwards
-            # Note: this is aggressive if Description has numbers.
-            # Better: `line.split(amount_str)[0]`
-            
-            # Let's use the found amount string to split
+            # Use the found amount string to split
             if len(nums) > 0:
                 amount_str = nums[0]
                 parts = line.split(amount_str)
@@ -214,12 +264,13 @@ def parse_bca(text: str) -> dict:
             if current_trans is not None:
                 # Append to description
                 # Skip if it looks like noise
-                if re.match(r"^\d{4}/", line): # Reference numbers often look like this
+                if BCA_CONT_REFERENCE.match(line): # Reference numbers often look like this
                      current_trans["description"] += " " + line
-                elif re.match(r"^[A-Z0-9\s-]+$", line) or re.search(r"[a-z]", line): # Alphanumeric text
+                elif BCA_CONT_UPPER.match(line) or BCA_CONT_LOWER.search(line): # Alphanumeric text
                      current_trans["description"] += " " + line
                 else:
                      # Maybe metadata
+                     hit("BCA", "continuation:other")
                      current_trans["description"] += " " + line
 
     # Finalize transactions list
@@ -227,7 +278,7 @@ def parse_bca(text: str) -> dict:
     for t in transactions:
         final_transactions.append({
             "transaction_date": f"{t['year']}-{t['month']}-{t['day']}",
-            "transaction_description": re.sub(r"\s+", " ", t['description']).strip(),
+            "transaction_description": WHITESPACE.sub(" ", t['description']).strip(),
             "transaction_amount": t['amount'],
             "amount_type": t['type'],
             "transaction_bank": "BCA",
@@ -254,15 +305,44 @@ def parse_bca(text: str) -> dict:
         "transactions": final_transactions
     }
 
-def parse_mandiri(text: str) -> dict:
-    lines = [l.strip() for l in text.split("\n") if l.strip()]
-    
+# Mandiri rules
+MANDIRI_PERIOD_LABEL = rule("MANDIRI", "header:period-label", r"Periode|Period", re.IGNORECASE)
+MANDIRI_PERIOD = rule("MANDIRI", "header:period-range", r"(\d{2}\s[A-Za-z]{3}\s\d{4}\s*-\s*\d{2}\s[A-Za-z]{3}\s\d{4})")
+MANDIRI_SALDO_AWAL = rule("MANDIRI", "summary:saldo-awal", r"Saldo\s*Awal", re.IGNORECASE)
+MANDIRI_SALDO_AKHIR = rule("MANDIRI", "summary:saldo-akhir", r"Saldo\s*Akhir", re.IGNORECASE)
+MANDIRI_DANA_MASUK = rule("MANDIRI", "summary:dana-masuk", r"Dana\s*Masuk", re.IGNORECASE)
+MANDIRI_DANA_KELUAR = rule("MANDIRI", "summary:dana-keluar", r"Dana\s*Keluar", re.IGNORECASE)
+MANDIRI_SUMMARY_INLINE = rule("MANDIRI", "summary:inline-number", r"[\d.,]+")
+MANDIRI_SUMMARY_METADATA = rule("MANDIRI", "summary:skip-metadata", r"Nomor Rekening|Account Number|Cabang|Branch|Mata Uang|Currency", re.IGNORECASE)
+MANDIRI_SUMMARY_WORD = rule("MANDIRI", "summary:skip-date-word", r"[A-Za-z]{3}")
+MANDIRI_SUMMARY_YEAR = rule("MANDIRI", "summary:skip-date-year", r"\d{4}")
+MANDIRI_SUMMARY_DIGIT = rule("MANDIRI", "summary:has-digit", r"\d")
+MANDIRI_SUMMARY_SEPARATOR = rule("MANDIRI", "summary:has-separator", r"[.,]")
+MANDIRI_SUMMARY_NUMBER = rule("MANDIRI", "summary:has-number", r"[\d]+")
+MANDIRI_SKIP_SUMMARY = rule("MANDIRI", "skip:summary-row", r"Saldo\s*Awal|Saldo\s*Akhir|Dana\s*Masuk|Dana\s*Keluar|Initial\s*Balance|Closing\s*Balance|Incoming\s*Transactions|Outgoing\s*Transactions", re.IGNORECASE)
+MANDIRI_AMOUNT = rule("MANDIRI", "amount:signed", r"([+-]\s*[\d.]+,[\d]{2})")
+MANDIRI_AMOUNTS = rule("MANDIRI", "amount:all", r"((?:(?<=,\d\d)|(?<![\d.]))[\d.]+,[\d]{2})")
+MANDIRI_BALANCE_LINE = rule("MANDIRI", "amount:balance-only-line", r"^[\d.]+,[\d]{2}$")
+MANDIRI_STRIP_AMOUNTS = rule("MANDIRI", "desc:strip-amounts", r"[+-]?\s*\d{1,3}(?:[.,]\d{3})*[.,]\d{2}")
+MANDIRI_STRIP_INDEX = rule("MANDIRI", "desc:strip-row-index", r"^\s*\d+\s+")
+MANDIRI_STRIP_TIME = rule("MANDIRI", "desc:strip-time", r"\d{2}:\d{2}:\d{2}\s*WIB")
+MANDIRI_PREV_AMOUNT = rule("MANDIRI", "backscan:stop-amount", r"(?<![\d.])[\d.]+,[\d]{2}")
+MANDIRI_PREV_SIGN = rule("MANDIRI", "backscan:stop-sign", r"[+-]")
+MANDIRI_INDEX_LINE = rule("MANDIRI", "backscan:row-index", r"^\d+$")
+MANDIRI_SKIP_LABEL = rule("MANDIRI", "backscan:skip-label", r"Saldo|Balance|Nominal|Amount|Keterangan|Remarks|Date|Tanggal", re.IGNORECASE)
+MANDIRI_DATE = rule("MANDIRI", "date:dd-mon-yyyy", r"(\d{2})\s(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s(\d{4})", re.IGNORECASE)
+MANDIRI_STRIP_DATE = rule("MANDIRI", "desc:strip-date", r"\d{2}\s[A-Za-z]{3}\s\d{4}")
+MANDIRI_TIME = rule("MANDIRI", "backscan:time", r"\d{2}:\d{2}:\d{2}")
+MANDIRI_LEADING_INDEX = rule("MANDIRI", "desc:leading-index", r"^\d+\s+")
+
+def parse_mandiri_summary(lines: list) -> dict:
+    # Period and the "Saldo Awal/Dana Masuk" block; None for labels not found
     period_val = ""
     for idx, line in enumerate(lines):
          # Try to find period in header lines
-         if re.search(r"Periode|Period", line, re.IGNORECASE):
+         if MANDIRI_PERIOD_LABEL.search(line):
             # Check current line first
-            p_match = re.search(r"(\d{2}\s[A-Za-z]{3}\s\d{4}\s*-\s*\d{2}\s[A-Za-z]{3}\s\d{4})", line)
+            p_match = MANDIRI_PERIOD.search(line)
             if p_match:
                 period_val = p_match.group(1)
                 break
@@ -271,22 +351,23 @@ def parse_mandiri(text: str) -> dict:
             for off in range(1, 20):
                 if idx+off >= len(lines): break
                 cand = lines[idx+off]
-                p_match = re.search(r"(\d{2}\s[A-Za-z]{3}\s\d{4}\s*-\s*\d{2}\s[A-Za-z]{3}\s\d{4})", cand)
+                p_match = MANDIRI_PERIOD.search(cand)
                 if p_match:
                     period_val = p_match.group(1)
                     break
             if period_val: break
 
-    def find_mandiri_val(label_pattern):
+    def find_mandiri_val(label_rule):
         for idx, line in enumerate(lines):
-            if re.search(label_pattern, line, re.IGNORECASE):
+            if idx % 256 == 0: checkpoint("parse")
+            if label_rule.search(line):
                # 1. Check same line if colon exists
                if ":" in line:
                    parts = line.split(":")
                    for p in reversed(parts):
                        try:
                            # Must allow dots/commas
-                           if re.search(r"[\d.,]+", p):
+                           if MANDIRI_SUMMARY_INLINE.search(p):
                                val = clean_amount(p)
                                return val
                        except ValueError:
@@ -298,26 +379,41 @@ def parse_mandiri(text: str) -> dict:
                     cand = lines[idx+off]
                     
                     # Skip metadata lines
-                    if re.search(r"Nomor Rekening|Account Number|Cabang|Branch|Mata Uang|Currency", cand, re.IGNORECASE): continue
+                    if MANDIRI_SUMMARY_METADATA.search(cand): continue
                     
                     # Skip date ranges
-                    if re.search(r"[A-Za-z]{3}", cand) and re.search(r"\d{4}", cand): continue
-                    if "-" in cand and not cand.strip().startswith("-") and not re.search(r"\d", cand): continue 
+                    if MANDIRI_SUMMARY_WORD.search(cand) and MANDIRI_SUMMARY_YEAR.search(cand): continue
+                    if "-" in cand and not cand.strip().startswith("-") and not MANDIRI_SUMMARY_DIGIT.search(cand): continue 
                     
-                    if not re.search(r"[.,]", cand) and cand.strip() != "0": continue
+                    if not MANDIRI_SUMMARY_SEPARATOR.search(cand) and cand.strip() != "0": continue
                     
-                    if re.search(r"[\d]+", cand):
+                    if MANDIRI_SUMMARY_NUMBER.search(cand):
                          try:
                              return clean_amount(cand)
                          except ValueError:
                              continue
-        return 0.0
+        return None
 
     # Summary fields - FORCE POSITIVE for incoming/outgoing as requested
-    initial_balance = find_mandiri_val(r"Saldo\s*Awal")
-    closing_balance = find_mandiri_val(r"Saldo\s*Akhir")
-    incoming_trans = abs(find_mandiri_val(r"Dana\s*Masuk"))
-    outgoing_trans = abs(find_mandiri_val(r"Dana\s*Keluar"))
+    incoming_trans = find_mandiri_val(MANDIRI_DANA_MASUK)
+    outgoing_trans = find_mandiri_val(MANDIRI_DANA_KELUAR)
+    return {
+        "period": period_val,
+        "initial_balance": find_mandiri_val(MANDIRI_SALDO_AWAL),
+        "closing_balance": find_mandiri_val(MANDIRI_SALDO_AKHIR),
+        "incoming_transactions": None if incoming_trans is None else abs(incoming_trans),
+        "outgoing_transactions": None if outgoing_trans is None else abs(outgoing_trans),
+    }
+
+def parse_mandiri(text: str) -> dict:
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    
+    summary = parse_mandiri_summary(lines)
+    period_val = summary["period"]
+    initial_balance = summary["initial_balance"] or 0.0
+    closing_balance = summary["closing_balance"] or 0.0
+    incoming_trans = summary["incoming_transactions"] or 0.0
+    outgoing_trans = summary["outgoing_transactions"] or 0.0
 
     transactions = []
     month_map = {
@@ -326,11 +422,14 @@ def parse_mandiri(text: str) -> dict:
     }
     
     for i, line in enumerate(lines):
-        # Exclude Header/Summary lines
-        if re.search(r"Saldo\s*Awal|Saldo\s*Akhir|Dana\s*Masuk|Dana\s*Keluar|Initial\s*Balance|Closing\s*Balance|Incoming\s*Transactions|Outgoing\s*Transactions", line, re.IGNORECASE):
+        if i % 256 == 0: checkpoint("parse", rows_parsed=len(transactions))
+        # Exclude Header/Summary lines. The summary block is printed once, on
+        # page 1, which stripping leaves alone, so this skip is not covered by
+        # it on any statement.
+        if MANDIRI_SKIP_SUMMARY.search(line):
             continue
 
-        amount_match = re.search(r"([+-]\s*[\d.]+,[\d]{2})", line)
+        amount_match = MANDIRI_AMOUNT.search(line)
         if amount_match:
             raw_val = amount_match.group(1).replace(" ", "")
             
@@ -345,12 +444,12 @@ def parse_mandiri(text: str) -> dict:
             transaction_balance = 0.0
             
             # Balance extraction (Forward/Same line)
-            nums = re.findall(r"([\d.]+,[\d]{2})", line)
+            nums = MANDIRI_AMOUNTS.findall(line)
             found_bal = False
             for fwd in range(1, 5):
                 if i + fwd >= len(lines): break
                 next_l = lines[i+fwd]
-                if re.match(r"^[\d.]+,[\d]{2}$", next_l):
+                if MANDIRI_BALANCE_LINE.match(next_l):
                      transaction_balance = clean_amount(next_l)
                      found_bal = True
                      break
@@ -362,9 +461,9 @@ def parse_mandiri(text: str) -> dict:
 
             # Capture text from the CURRENT line (Amount line)
             curr_line_clean = line
-            curr_line_clean = re.sub(r"[+-]?\s*\d{1,3}(?:[.,]\d{3})*[.,]\d{2}", "", curr_line_clean)
-            curr_line_clean = re.sub(r"^\s*\d+\s+", " ", curr_line_clean)
-            curr_line_clean = re.sub(r"\d{2}:\d{2}:\d{2}\s*WIB", "", curr_line_clean)
+            curr_line_clean = MANDIRI_STRIP_AMOUNTS.sub("", curr_line_clean)
+            curr_line_clean = MANDIRI_STRIP_INDEX.sub(" ", curr_line_clean)
+            curr_line_clean = MANDIRI_STRIP_TIME.sub("", curr_line_clean)
             curr_line_clean = curr_line_clean.strip()
 
             # Look Backward for Description
@@ -378,19 +477,19 @@ def parse_mandiri(text: str) -> dict:
                 # STOP if we hit the previous transaction's Amount line (contains digits, commas, dots)
                 # But be careful not to trigger on the CURRENT line (since we start back=1)
                 # Previous amount line example: "1 ... -50.000,00 ... 166.000,00"
-                if re.search(r"[\d.]+,[\d]{2}", p_line) and re.search(r"[+-]", p_line): 
+                if MANDIRI_PREV_AMOUNT.search(p_line) and MANDIRI_PREV_SIGN.search(p_line): 
                     break 
 
                 # Skip numeric lines that are just numbers (like independent balances)
-                if re.match(r"^[\d.]+,[\d]{2}$", p_line): continue 
-                if re.match(r"^\d+$", p_line): continue # Index numbers ("1", "2")
+                if MANDIRI_BALANCE_LINE.match(p_line): continue 
+                if MANDIRI_INDEX_LINE.match(p_line): continue # Index numbers ("1", "2")
                 
                 # Keywords to ignore
-                if re.search(r"Saldo|Balance|Nominal|Amount|Keterangan|Remarks|Date|Tanggal", p_line, re.IGNORECASE): continue
-                if "No" == p_line: continue
+                if MANDIRI_SKIP_LABEL.search(p_line): continue
+                if "No" == p_line: hit("MANDIRI", "backscan:skip-no"); continue
                 
                 # Date check
-                d_match = re.search(r"(\d{2})\s(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s(\d{4})", p_line, re.IGNORECASE)
+                d_match = MANDIRI_DATE.search(p_line)
                 if d_match:
                     if tx_date: # We already found a date, this is a SECOND date (prev transaction?)
                         break
@@ -401,20 +500,20 @@ def parse_mandiri(text: str) -> dict:
                     month = month_map.get(month_str, "01")
                     tx_date = f"{year}-{month}-{day}"
                     
-                    clean_p = re.sub(r"\d{2}\s[A-Za-z]{3}\s\d{4}", "", p_line).strip()
-                    if clean_p and not re.search(r"\d{2}:\d{2}:\d{2}", clean_p):
+                    clean_p = MANDIRI_STRIP_DATE.sub("", p_line).strip()
+                    if clean_p and not MANDIRI_TIME.search(clean_p):
                         desc_lines.insert(0, clean_p)
                     
                     # Continue scanning to capture lines above the date
                     continue
                 
-                if re.search(r"\d{2}:\d{2}:\d{2}", p_line): continue
+                if MANDIRI_TIME.search(p_line): continue
 
                 desc_lines.insert(0, p_line)
             
             if tx_date:
                  full_desc = " ".join(desc_lines).strip()
-                 full_desc = re.sub(r"^\d+\s+", "", full_desc) # leading index
+                 full_desc = MANDIRI_LEADING_INDEX.sub("", full_desc) # leading index
                  
                  if curr_line_clean:
                      full_desc += " " + curr_line_clean
@@ -436,46 +535,53 @@ def parse_mandiri(text: str) -> dict:
         "outgoing_transactions": outgoing_trans,
         "transactions": transactions
     }
-def parse_bni(text: str) -> dict:
-    lines = [l.strip() for l in text.split("\n") if l.strip()]
-    
+# BNI rules
+BNI_YEAR = rule("BNI", "header:year", r"\d{4}")
+BNI_SUMMARY_NUMBERS = rule("BNI", "summary:numbers", r"[+-]?[\d,]+")
+BNI_TRAILING_NUMBER = rule("BNI", "amount:trailing-balance", r"(?<![\d,])([\d,]+)$")
+BNI_DATE = rule("BNI", "date:d-mon-yyyy", r"^(\d{1,2})\s([A-Za-z]{3})\s(\d{4})")
+BNI_AMOUNT = rule("BNI", "amount:signed", r"([+-])([\d,]+)")
+BNI_TIME = rule("BNI", "continuation:time", r"\d{2}:\d{2}:\d{2}")
+
+# helper for BNI currency: "118,090" -> 118090.0
+# "38,595" -> 38595.0
+# It seems BNI PDF uses comma as thousands separator for IDR? 
+# Or maybe it's just whole numbers?
+# Let's handle both: if result < 1.0 (meaning it parsed 118,090 as 118.09), multiply?
+# No, safer to remove commas if they appear to be thousands.
+# But clean_amount assumes Indonesian locale (dot=thousands, comma=decimal).
+# If BNI swaps this, we need custom logic.
+# Given "+10,000" (10k), standard 'clean_amount' ("10.000") w/ replacement would fail if passed "10,000" (it would think 10.0).
+# Let's inspect the `clean_amount` first.
+
+def parse_bni_amount(s):
+    # Remove signs
+    clean_s = s.replace("+", "").replace("-", "")
+    # If it matches "123,456", it's likely 123456.
+    # If "123.456", it might be 123456 (if dot is thousands).
+    # In the sample: "118,090". 
+    # Most likely: Comma is thousands separator.
+    clean_s = clean_s.replace(",", "")
+    return float(clean_s)
+
+def parse_bni_summary(lines: list) -> dict:
+    # Period and the "Saldo Awal Total Pemasukan ..." row; None when absent
     period_val = ""
-    initial_balance = 0.0
-    closing_balance = 0.0
-    incoming_trans = 0.0
-    outgoing_trans = 0.0
-    transactions = []
-    
-    # helper for BNI currency: "118,090" -> 118090.0
-    # "38,595" -> 38595.0
-    # It seems BNI PDF uses comma as thousands separator for IDR? 
-    # Or maybe it's just whole numbers?
-    # Let's handle both: if result < 1.0 (meaning it parsed 118,090 as 118.09), multiply?
-    # No, safer to remove commas if they appear to be thousands.
-    # But clean_amount assumes Indonesian locale (dot=thousands, comma=decimal).
-    # If BNI swaps this, we need custom logic.
-    # Given "+10,000" (10k), standard 'clean_amount' ("10.000") w/ replacement would fail if passed "10,000" (it would think 10.0).
-    # Let's inspect the `clean_amount` first.
-    
-    def parse_bni_amount(s):
-        # Remove signs
-        clean_s = s.replace("+", "").replace("-", "")
-        # If it matches "123,456", it's likely 123456.
-        # If "123.456", it might be 123456 (if dot is thousands).
-        # In the sample: "118,090". 
-        # Most likely: Comma is thousands separator.
-        clean_s = clean_s.replace(",", "")
-        return float(clean_s)
+    initial_balance = None
+    closing_balance = None
+    incoming_trans = None
+    outgoing_trans = None
 
     current_year = str(datetime.now().year)
 
     for i, line in enumerate(lines):
+        if i % 256 == 0: checkpoint("parse")
         # Header Metadata
         if "Periode:" in line:
             # "Periode: 1 - 30 November 2025"
             period_val = line.split("Periode:")[-1].strip()
             # Try extract year
-            y_match = re.search(r"\d{4}", period_val)
+            y_match = BNI_YEAR.search(period_val)
             if y_match: current_year = y_match.group(0)
 
         # Summaries
@@ -492,7 +598,7 @@ def parse_bni(text: str) -> dict:
                 # Expected: [SaldoAwal, In, Out, SaldoAkhir]
                 # "118,090 +38,595 -5,000 151,685"
                 # Need to be robust. Regex find all signed/unsigned numbers.
-                nums = re.findall(r"[+-]?[\d,]+", val_line)
+                nums = BNI_SUMMARY_NUMBERS.findall(val_line)
                 if len(nums) >= 4:
                     initial_balance = parse_bni_amount(nums[0])
                     incoming_trans = abs(parse_bni_amount(nums[1]))
@@ -502,9 +608,28 @@ def parse_bni(text: str) -> dict:
         # Also catch explicit lines if they appear separately (just in case)
         if line.startswith("Saldo Awal") and not "Total" in line:
              # Look for number at end
-             m = re.search(r"([\d,]+)$", line)
+             m = BNI_TRAILING_NUMBER.search(line)
              if m: initial_balance = parse_bni_amount(m.group(1))
 
+    return {
+        "period": period_val,
+        "initial_balance": initial_balance,
+        "closing_balance": closing_balance,
+        "incoming_transactions": incoming_trans,
+        "outgoing_transactions": outgoing_trans,
+    }
+
+def parse_bni(text: str) -> dict:
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    
+    summary = parse_bni_summary(lines)
+    period_val = summary["period"]
+    initial_balance = summary["initial_balance"] or 0.0
+    closing_balance = summary["closing_balance"] or 0.0
+    incoming_trans = summary["incoming_transactions"] or 0.0
+    outgoing_trans = summary["outgoing_transactions"] or 0.0
+    transactions = []
+
     # Transactions
     # Pattern:
     # Date line: "10 Nov 2025 Transfer"
@@ -523,26 +648,32 @@ def parse_bni(text: str) -> dict:
     }
 
     for i, line in enumerate(lines):
-        # Skip headers/footers
-        if "Laporan Mutasi" in line or "Periode:" in line or "Rincian Transaksi" in line: continue
-        if "Saldo Awal" in line: continue 
-        if "Total Pemasukan" in line or "Total Pengeluaran" in line: continue
+        if i % 256 == 0: checkpoint("parse", rows_parsed=len(transactions))
+        # Skip headers/footers. Still needed after repeated-line stripping: the
+        # header, Saldo Awal and totals lines sit on page 1 (never stripped),
+        # the closing block (Saldo Akhir, Informasi Lainnya, disclaimer,
+        # document note) is printed once on the last page, and a single-page
+        # statement has nothing to compare its legal/LPS footer against. A
+        # "1 dari N" page counter only repeats in shape, so stripping keeps it.
+        if "Laporan Mutasi" in line or "Periode:" in line or "Rincian Transaksi" in line: hit("BNI", "skip:page-header"); continue
+        if "Saldo Awal" in line: hit("BNI", "skip:saldo-awal"); continue 
+        if "Total Pemasukan" in line or "Total Pengeluaran" in line: hit("BNI", "skip:totals"); continue
         
         if "Saldo Akhir" in line: 
-             curr_trans = None; continue
+             hit("BNI", "skip:saldo-akhir"); curr_trans = None; continue
         if "Informasi Lainnya" in line: 
-             curr_trans = None; continue
+             hit("BNI", "skip:informasi-lainnya"); curr_trans = None; continue
         if "Apabila terdapat" in line: 
-             curr_trans = None; continue
+             hit("BNI", "skip:disclaimer"); curr_trans = None; continue
         if "Dokumen ini" in line: 
-             curr_trans = None; continue
+             hit("BNI", "skip:document-note"); curr_trans = None; continue
         if "PT Bank Negara Indonesia" in line or "berizin dan diawasi" in line: 
-             curr_trans = None; continue
+             hit("BNI", "skip:legal-footer"); curr_trans = None; continue
         if "Lembaga Penjamin Simpanan" in line or "1 dari" in line:
-             curr_trans = None; continue
+             hit("BNI", "skip:lps-footer"); curr_trans = None; continue
         
         # Date Match: "10 Nov 2025" or "10-Nov-2025"
-        date_match = re.match(r"^(\d{1,2})\s([A-Za-z]{3})\s(\d{4})", line)
+        date_match = BNI_DATE.match(line)
         if date_match:
             day = date_match.group(1).zfill(2)
             month_str = date_match.group(2)
@@ -555,7 +686,7 @@ def parse_bni(text: str) -> dict:
             # Regex for Amount: [+-][\d,]+
             # Regex for Balance: [\d,]+ (at end)
             
-            amt_match = re.search(r"([+-])([\d,]+)", line)
+            amt_match = BNI_AMOUNT.search(line)
             
             amount = 0.0
             type_str = "credit"
@@ -570,7 +701,7 @@ def parse_bni(text: str) -> dict:
                 
                 # Assume Balance is after amount
                 # Find number at end of line
-                bal_match = re.search(r"([\d,]+)$", line)
+                bal_match = BNI_TRAILING_NUMBER.search(line)
                 if bal_match:
                     balance = parse_bni_amount(bal_match.group(1))
                     
@@ -594,23 +725,25 @@ def parse_bni(text: str) -> dict:
         if curr_trans:
             # If line has amount and we didn't find it yet?
             if curr_trans['amount'] == 0.0:
-                 amt_match = re.search(r"([+-])([\d,]+)", line)
+                 amt_match = BNI_AMOUNT.search(line)
                  if amt_match:
                     sign = amt_match.group(1)
                     val_s = amt_match.group(2)
                     curr_trans['amount'] = parse_bni_amount(val_s)
                     curr_trans['type'] = "credit" if sign == "+" else "debit"
                      # Balance
-                    bal_match = re.search(r"([\d,]+)$", line)
+                    bal_match = BNI_TRAILING_NUMBER.search(line)
                     if bal_match:
                         curr_trans['balance'] = parse_bni_amount(bal_match.group(1))
                     continue # Extracted amount, rest acts as desc?
             
-            if re.search(r"\d{2}:\d{2}:\d{2}", line):
+            if BNI_TIME.search(line):
                curr_trans['desc'] += " " + line
             elif "Transfer" in line or "MANDIRI" in line or "BNI" in line:
+               hit("BNI", "continuation:channel")
                curr_trans['desc'] += " " + line
             elif line.strip() and not "Saldo" in line: # Generic text
+               hit("BNI", "continuation:other")
                curr_trans['desc'] += " " + line
                
     # Final cleanup
@@ -618,7 +751,7 @@ def parse_bni(text: str) -> dict:
     for t in transactions:
         final_transactions.append({
             "transaction_date": t['date'],
-            "transaction_description": re.sub(r"\s+", " ", t['desc']).strip(),
+            "transaction_description": WHITESPACE.sub(" ", t['desc']).strip(),
             "transaction_amount": t['amount'],
             "amount_type": t['type'],
             "transaction_bank": "BNI",
@@ -633,26 +766,34 @@ def parse_bni(text: str) -> dict:
         "outgoing_transactions": outgoing_trans,
         "transactions": final_transactions
     }
-def parse_blu(text: str) -> dict:
-    lines = [l.strip() for l in text.split("\n") if l.strip()]
-    
+# blu rules
+BLU_PERIOD = rule("BLU", "header:period", r"Periode / Period\s+([A-Za-z]+\s\d{4})")
+BLU_PERIOD_FALLBACK = rule("BLU", "header:period-fallback", r"\n\s*([A-Za-z]+\s\d{4})\s+Rp")
+BLU_RP_AMOUNTS = rule("BLU", "summary:rp-amounts", r"Rp\s*([\d.]+,[\d]{2})")
+BLU_STRIP_RP = rule("BLU", "summary:strip-rp", r"Rp\s*[\d.]+,[\d]{2}")
+BLU_MONTH_YEAR = rule("BLU", "summary:month-year", r"([A-Za-z]+\s\d{4})$")
+BLU_DATE = rule("BLU", "date:dd-mon-yyyy", r"^(\d{2})\s([A-Za-z]{3})\s(\d{4})")
+BLU_TIME = rule("BLU", "amount:trailing-time", r"(\d{2}:\d{2})$")
+BLU_AMOUNTS = rule("BLU", "amount:all", r"(-[\d.]+,[\d]{2}|(?:(?<=,\d\d)|(?<![\d.-]))[\d.]+,[\d]{2})")
+
+def parse_blu_summary(text: str, lines: list) -> dict:
+    # "Periode / Period" and "Saldo Akhir / Ending Balance" rows; None when absent
     period_val = ""
-    initial_balance = 0.0
-    closing_balance = 0.0
-    incoming_trans = 0.0
-    outgoing_trans = 0.0
-    transactions = []
-    
+    initial_balance = None
+    closing_balance = None
+    incoming_trans = None
+    outgoing_trans = None
+
     # 1. Period & Summaries
     # Text flow: "November 2025 ... Rp 136.953.701,81 Rp 213.144,38" (Income | Initial)
     # Text flow: "IDR (Rp) ... Rp 135.841.094,42 Rp 1.325.751,77" (Expense | Closing)
     
     # Find period - usually strictly "Month YYYY" under Header
     # Regex for "November 2025" or "Nov 2025"
-    p_match = re.search(r"Periode / Period\s+([A-Za-z]+\s\d{4})", text.replace("\n", " "))
+    p_match = BLU_PERIOD.search(text.replace("\n", " "))
     if not p_match:
          # Try matching just the date line if header missing
-         p_match = re.search(r"\n\s*([A-Za-z]+\s\d{4})\s+Rp", text)
+         p_match = BLU_PERIOD_FALLBACK.search(text)
          
     if p_match:
         period_val = p_match.group(1).strip()
@@ -669,7 +810,7 @@ def parse_blu(text: str) -> dict:
     # Acc Curr EXP END
     
     # Let's clean all "Rp" values first
-    rp_values = re.findall(r"Rp\s*([\d.]+,[\d]{2})", text)
+    rp_values = BLU_RP_AMOUNTS.findall(text)
     if len(rp_values) >= 4:
         # Heuristic based on position in list:
         # Order in text: Income, Initial, Expense, Ending?
@@ -682,6 +823,7 @@ def parse_blu(text: str) -> dict:
         
     # Better approach: Iterate lines for key phrases
     for i, line in enumerate(lines):
+        if i % 256 == 0: checkpoint("parse")
         if "Periode / Period" in line:
              # Next line might have it? Or same line?
              # Sample:
@@ -692,42 +834,65 @@ def parse_blu(text: str) -> dict:
                   # Regex to pull parts: Name | Date | Rp... | Rp...
                   # It's tricky.
                   # Let's grab just the Rp values from that line.
-                  vals = re.findall(r"Rp\s*([\d.]+,[\d]{2})", next_l)
+                  vals = BLU_RP_AMOUNTS.findall(next_l)
                   if len(vals) >= 2:
                       incoming_trans = clean_amount(vals[0])
                       initial_balance = clean_amount(vals[1])
                   # Grab period from that line
                   # remove Rps, trim digits
-                  temp = re.sub(r"Rp\s*[\d.]+,[\d]{2}", "", next_l)
+                  temp = BLU_STRIP_RP.sub("", next_l)
                   # temp = "Made Rezananda Putra November 2025"
                   # Assuming name doesn't have digits
-                  d_match = re.search(r"([A-Za-z]+\s\d{4})$", temp.strip())
+                  d_match = BLU_MONTH_YEAR.search(temp.strip())
                   if d_match: period_val = d_match.group(1)
 
         if "Saldo Akhir / Ending Balance" in line:
              if i+1 < len(lines):
                   next_l = lines[i+1]
-                  vals = re.findall(r"Rp\s*([\d.]+,[\d]{2})", next_l)
+                  vals = BLU_RP_AMOUNTS.findall(next_l)
                   if len(vals) >= 2:
                       outgoing_trans = clean_amount(vals[0]) # Expense
                       closing_balance = clean_amount(vals[1]) # Ending
 
+    return {
+        "period": period_val,
+        "initial_balance": initial_balance,
+        "closing_balance": closing_balance,
+        "incoming_transactions": incoming_trans,
+        "outgoing_transactions": outgoing_trans,
+    }
+
+def parse_blu(text: str) -> dict:
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    
+    summary = parse_blu_summary(text, lines)
+    period_val = summary["period"]
+    initial_balance = summary["initial_balance"] or 0.0
+    closing_balance = summary["closing_balance"] or 0.0
+    incoming_trans = summary["incoming_transactions"] or 0.0
+    outgoing_trans = summary["outgoing_transactions"] or 0.0
+    transactions = []
+
     # Transactions
     curr_trans = None
     
     for i, line in enumerate(lines):
-        # Skip headers
-        if "bluAccount" in line or "Halaman" in line: continue
-        if "Periode / Period" in line or "Mata Uang" in line: continue
-        if "Detail Transaksi" in line: continue
-        if "Total Pemasukan" in line or "Saldo Awal" in line: continue
-        if "Total Pengeluaran" in line or "Saldo Akhir" in line: continue
+        if i % 256 == 0: checkpoint("parse", rows_parsed=len(transactions))
+        # Skip headers. Page 1 keeps its header and summary lines through
+        # repeated-line stripping, and a "Halaman n" line only repeats in
+        # shape, so stripping keeps it; the footer skip below matters for
+        # single-page statements.
+        if "bluAccount" in line or "Halaman" in line: hit("BLU", "skip:page-header"); continue
+        if "Periode / Period" in line or "Mata Uang" in line: hit("BLU", "skip:account-info"); continue
+        if "Detail Transaksi" in line: hit("BLU", "skip:table-header"); continue
+        if "Total Pemasukan" in line or "Saldo Awal" in line: hit("BLU", "skip:summary-income"); continue
+        if "Total Pengeluaran" in line or "Saldo Akhir" in line: hit("BLU", "skip:summary-expense"); continue
         
         # Skip rows we already processed for summaries (containing Rp val AND summary keywords nearby?)
         # Just check if line starts with Date.
         
         # Date Match: "01 Nov 2025"
-        date_match = re.match(r"^(\d{2})\s([A-Za-z]{3})\s(\d{4})", line)
+        date_match = BLU_DATE.match(line)
         
         if date_match:
             # Start New
@@ -764,7 +929,7 @@ def parse_blu(text: str) -> dict:
             
             # Find all numbers
             # Check if line ends with time "HH:MM"?
-            time_match = re.search(r"(\d{2}:\d{2})$", line_clean)
+            time_match = BLU_TIME.search(line_clean)
             has_time = False
             if time_match: has_time = True
             
@@ -775,7 +940,7 @@ def parse_blu(text: str) -> dict:
             
             # Regex to find Amount at start or middle
             # Look for 2 currency numbers
-            nums = re.findall(r"([-]?[\d.]+,[\d]{2})", line_clean)
+            nums = BLU_AMOUNTS.findall(line_clean)
             
             if len(nums) >= 2:
                 # Likely Amount and Balance
@@ -819,10 +984,12 @@ def parse_blu(text: str) -> dict:
             # If not numbers, append to description
             # Exclude footer text
             if "BCA Digital" in line or "haloblu" in line: 
+                hit("BLU", "skip:page-footer")
                 curr_trans = None # End of page
                 continue
                 
             if curr_trans and line.strip():
+                hit("BLU", "continuation:description")
                 curr_trans['desc'] += " " + line.strip()
 
     if curr_trans: transactions.append(curr_trans)
@@ -832,7 +999,7 @@ def parse_blu(text: str) -> dict:
     for t in transactions:
         final_transactions.append({
             "transaction_date": t['date'],
-            "transaction_description": re.sub(r"\s+", " ", t['desc']).strip(),
+            "transaction_description": WHITESPACE.sub(" ", t['desc']).strip(),
             "transaction_amount": t['amount'],
             "amount_type": t['type'],
             "transaction_bank": "BLU",
@@ -847,3 +1014,10 @@ def parse_blu(text: str) -> dict:
         "outgoing_transactions": outgoing_trans,
         "transactions": final_transactions
     }
+
+PARSERS = {
+    "BCA": parse_bca,
+    "MANDIRI": parse_mandiri,
+    "BNI": parse_bni,
+    "BLU": parse_blu,
+}
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import os
+import re
+
+import httpx
+from postgrest.exceptions import APIError
+
+STATEMENTS_TABLE = os.environ.get("SUPABASE_STATEMENTS_TABLE", "statements")
+TRANSACTIONS_TABLE = os.environ.get("SUPABASE_TRANSACTIONS_TABLE", "transactions")
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("PERSIST_BATCH_SIZE", "500"))
+MAX_RETRIES = int(os.environ.get("PERSIST_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.environ.get("PERSIST_RETRY_BACKOFF", "0.5"))  # seconds, doubled per attempt
+# PostgREST reports database errors by SQLSTATE, not HTTP status. These are the
+# classes it answers with a 5xx (connection, resource, lock and internal
+# errors) plus its own pool/connection codes; everything else is a 4xx such as
+# an auth failure or a constraint violation, which a retry cannot fix.
+RETRYABLE_SQLSTATE_CLASSES = ("08", "09", "25", "2D", "38", "39", "3B", "40", "53", "54", "55", "57", "58", "F0", "HV", "XX")
+RETRYABLE_POSTGREST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "PGRSTX00"}
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def statement_key(user_id: str, account: str, result: dict) -> str:
+    return _sha256(f"{user_id}|{account}|{result.get('period') or ''}")
+
+
+def transaction_key(user_id: str, account: str, tx: dict) -> str:
+    # user + account + date + amount + balance + description hash. The user is
+    # part of the key so two tenants with the same row never share one.
+    desc = re.sub(r"\s+", " ", tx.get("transaction_description", "")).strip().lower()
+    raw = "|".join([
+        user_id,
+        account,
+        tx.get("transaction_date", ""),
+        f"{tx.get('amount_type', '')}:{tx.get('transaction_amount', 0.0):.2f}",
+        f"{tx.get('transaction_balance', 0.0):.2f}",
+        _sha256(desc),
+    ])
+    return _sha256(raw)
+
+
+def resolve_account(result: dict, account: str = None) -> str:
+    # The caller's account identifier, else the one read from the statement
+    # header by the pipeline. The bank name is not an account: two accounts at
+    # one bank would share statement and row keys.
+    account = (account or result.get("account") or "").strip()
+    if not account:
+        raise ValueError("account is required: the statement header has no account number")
+    return account
+
+
+def build_transaction_rows(result: dict, user_id: str, account: str, statement_id: str) -> list:
+    rows = []
+    seen = {}
+    for tx in result.get("transactions", []):
+        key = transaction_key(user_id, account, tx)
+        # Identical rows inside one statement (e.g. two equal QR payments on a
+        # day without a printed balance) are told apart by their occurrence
+        # number, which is stable across re-uploads of the same statement.
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        if occurrence:
+            key = _sha256(f"{key}#{occurrence}")
+
+        rows.append({
+            "idempotency_key": key,
+            "statement_id": statement_id,
+            "user_id": user_id,
+            "account": account,
+            "transaction_date": tx.get("transaction_date"),
+            "transaction_description": tx.get("transaction_description"),
+            "transaction_amount": tx.get("transaction_amount"),
+            "amount_type": tx.get("amount_type"),
+            "transaction_bank": tx.get("transaction_bank"),
+            "transaction_balance": tx.get("transaction_balance"),
+        })
+    return rows
+
+
+def _retryable(exc: Exception) -> bool:
+    # Transport errors, timeouts and 5xx responses only
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    if isinstance(exc, APIError):
+        code = str(exc.code or "")
+        if code.isdigit() and len(code) == 3:
+            # No JSON body: postgrest puts the bare HTTP status in the code
+            return int(code) >= 500
+        if code.startswith("PGRST"):
+            return code in RETRYABLE_POSTGREST_CODES
+        return code[:2] in RETRYABLE_SQLSTATE_CLASSES
+    return False
+
+
+async def _upsert_with_retry(client, table: str, rows: list, on_conflict: str, retries: int, backoff: float):
+    attempt = 0
+    while True:
+        try:
+            return await client.table(table).upsert(rows, on_conflict=on_conflict).execute()
+        except Exception as e:
+            if attempt >= retries or not _retryable(e):
+                raise
+            await asyncio.sleep(backoff * (2 ** attempt))
+            attempt += 1
+
+
+async def persist_statement(
+    client,
+    result: dict,
+    user_id: str,
+    account: str = None,
+    batch_size: int = None,
+    retries: int = None,
+    backoff: float = None,
+) -> dict:
+    # client is anything exposing the async postgrest `table(...).upsert(...).execute()`
+    # chain: the async Supabase client, a bare postgrest client pointed at a local
+    # stand-in, or a fake in tests. Raises ValueError when no account is known.
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    retries = MAX_RETRIES if retries is None else retries
+    backoff = RETRY_BACKOFF if backoff is None else backoff
+
+    transactions = result.get("transactions", [])
+    bank = transactions[0]["transaction_bank"] if transactions else ""
+    account = resolve_account(result, account)
+
+    statement_id = statement_key(user_id, account, result)
+    statement_row = {
+        "id": statement_id,
+        "user_id": user_id,
+        "account": account,
+        "bank": bank,
+        "period": result.get("period") or "",
+        "initial_balance": result.get("initial_balance", 0.0),
+        "closing_balance": result.get("closing_balance", 0.0),
+        "incoming_transactions": result.get("incoming_transactions", 0.0),
+        "outgoing_transactions": result.get("outgoing_transactions", 0.0),
+        "transaction_count": len(transactions),
+    }
+    await _upsert_with_retry(client, STATEMENTS_TABLE, [statement_row], "id", retries, backoff)
+
+    rows = build_transaction_rows(result, user_id, account, statement_id)
+    batches = 0
+    for start in range(0, len(rows), batch_size):
+        await _upsert_with_retry(client, TRANSACTIONS_TABLE, rows[start:start + batch_size], "idempotency_key", retries, backoff)
+        batches += 1
+
+    return {
+        "statement_id": statement_id,
+        "transactions_written": len(rows),
+        "batches": batches,
+    }
@@ -0,0 +1,191 @@
+import os
+
+from api.analytics import compute_analytics
+from api.boilerplate import strip_repeated_lines
+from api.cancellation import CancelToken, checkpoint, current_token, use_token
+from api.cascade import parse_cascade
+from api.categorize import categorize_transactions
+from api.extract import extract_pages, join_pages
+from api.filters import PastDate, apply_date_window
+from api.parsers import detect_bank, parse_bank_statement
+from api.profiling import ConversionProfile
+from api.sections import merge_sections, parse_sections, split_sections, statement_account
+
+# Wall-clock budget per conversion in seconds; 0 disables it
+CONVERT_BUDGET_SECONDS = float(os.environ.get("CONVERT_BUDGET_SECONDS", "60"))
+
+
+def convert_document(
+    doc,
+    file_content: bytes,
+    password: str = None,
+    filename: str = "",
+    strip: bool = True,
+    categorize: bool = True,
+    extra_rules: dict = None,
+    profile: ConversionProfile = None,
+    max_workers: int = None,
+    cascade: bool = False,
+    analytics: bool = False,
+    budget: float = None,
+    from_date=None,
+    to_date=None,
+    pages: list = None,
+    sections: bool = False,
+    on_extract=None,
+) -> dict:
+    # Synchronous extract -> strip -> parse -> categorize pipeline shared by
+    # the API and the offline CLI. Raises ValueError for unsupported banks and
+    # BudgetExceeded (with progress so far) once the budget runs out.
+    # from_date/to_date (datetime.date) and pages (0-based page numbers, see
+    # filters.parse_page_spec) narrow the statement to a window.
+    # sections=True parses each account/period section of a combined export
+    # separately and lists them under "sections". on_extract is called with
+    # the extracted page texts before any stripping (the text archive).
+    budget = CONVERT_BUDGET_SECONDS if budget is None else budget
+    token = CancelToken(budget=budget or None, parent=current_token())
+    with use_token(token):
+        return _convert(
+            doc, file_content, password, filename, strip, categorize,
+            extra_rules, profile or ConversionProfile(), max_workers, cascade, analytics,
+            from_date, to_date, pages, sections, on_extract,
+        )
+
+
+def _convert(
+    doc, file_content, password, filename, strip, categorize, extra_rules, profile,
+    max_workers, cascade, analytics, from_date, to_date, page_numbers, split, on_extract,
+) -> dict:
+    # Rows are chronological, so with to_date extraction ends at the first
+    # page whose rows are all later; unselected pages are never opened. A
+    # combined export restarts its dates in every section, so no early stop.
+    # Page 1 is always read: bank markers, period and year are only printed
+    # there. When it was not selected its rows are dropped after parsing.
+    stop = PastDate(to_date, doc.metadata) if to_date and not split else None
+    header_only = page_numbers is not None and 0 not in page_numbers
+    numbers = [0] + list(page_numbers) if header_only else page_numbers
+    with profile.stage("extract"):
+        pages = extract_pages(doc, file_content, password, max_workers, page_numbers=numbers, stop=stop)
+    if on_extract is not None:
+        on_extract(pages)
+    return _process(
+        pages, doc.metadata, doc.page_count, filename, strip, categorize, extra_rules, profile,
+        cascade, analytics, from_date, to_date, page_numbers, split, header_only,
+    )
+
+
+def convert_pages(
+    pages: list,
+    metadata: dict,
+    filename: str = "",
+    strip: bool = True,
+    categorize: bool = True,
+    extra_rules: dict = None,
+    profile: ConversionProfile = None,
+    cascade: bool = False,
+    analytics: bool = False,
+    budget: float = None,
+    sections: bool = False,
+) -> dict:
+    # The same pipeline from already extracted page texts (the text archive's
+    # re-parse), without touching PyMuPDF
+    budget = CONVERT_BUDGET_SECONDS if budget is None else budget
+    token = CancelToken(budget=budget or None, parent=current_token())
+    with use_token(token):
+        return _process(
+            pages, metadata, len(pages), filename, strip, categorize, extra_rules,
+            profile or ConversionProfile(), cascade, analytics, None, None, None, sections,
+        )
+
+
+def _parse(text: str, metadata: dict, filename: str, cascade: bool) -> dict:
+    if cascade:
+        # Low-confidence detections try every parser and keep the most
+        # balance-consistent result
+        return parse_cascade(text, metadata, filename)
+    return parse_bank_statement(text, metadata, filename)
+
+
+def _process(
+    pages, metadata, page_count, filename, strip, categorize, extra_rules, profile,
+    cascade, analytics, from_date, to_date, page_numbers, split, header_only=False,
+) -> dict:
+    # header_only: pages[0] is page 1, read for its header but not selected
+    extracted = len(pages)
+    # Read before stripping: the account line repeats on every page
+    account = statement_account(detect_bank(pages[0], metadata)[0], pages[0]) if pages else None
+    sections = None
+    if split:
+        detected, _ = detect_bank(join_pages(pages), metadata)
+        sections = split_sections(detected, pages)
+        if len(sections) < 2:
+            sections = None
+
+    checkpoint("strip")
+    removed = 0
+    if strip and not sections:
+        with profile.stage("strip"):
+            pages, removed = strip_repeated_lines(pages)
+    text = join_pages(pages)
+
+    bank, branch = detect_bank(text, metadata)
+    profile.info.update({
+        "bank": bank,
+        "detection_branch": branch,
+        "page_count": page_count,
+        "pages_extracted": extracted,
+        "line_count": sum(1 for line in text.split("\n") if line.strip()),
+    })
+
+    filtered = from_date or to_date or page_numbers is not None
+    checkpoint("parse")
+    # Rows parsed from page 1 alone; they open the document's rows, so that
+    # many are dropped from the front when page 1 was read only for its header
+    header_rows = len(_parse(pages[0], metadata, filename, cascade)["transactions"]) if header_only else 0
+    if sections:
+        # Each section is stripped and parsed on its own
+        with profile.stage("parse"):
+            results, removed = parse_sections(sections, metadata, filename, strip, cascade)
+        results[0]["transactions"] = results[0]["transactions"][header_rows:]
+        rows_before = sum(len(r["transactions"]) for r in results)
+        if filtered:
+            for section_result in results:
+                apply_date_window(section_result, from_date, to_date)
+        result = merge_sections(sections, results)
+        profile.info["sections"] = len(sections)
+    else:
+        with profile.stage("parse"):
+            result = _parse(text, metadata, filename, cascade)
+        result["transactions"] = result["transactions"][header_rows:]
+        rows_before = len(result["transactions"])
+        if filtered:
+            # Summary fields describe the window, not the whole statement
+            apply_date_window(result, from_date, to_date)
+    profile.info["stripped_lines"] = removed
+    if sections:
+        accounts = {section["account"] for section in sections}
+        account = accounts.pop() if len(accounts) == 1 else None
+    if account:
+        result["account"] = account
+    if filtered:
+        result["filter"] = {
+            "from_date": from_date.isoformat() if from_date else None,
+            "to_date": to_date.isoformat() if to_date else None,
+            "pages": [n + 1 for n in page_numbers] if page_numbers is not None else None,
+            "pages_extracted": extracted,
+            "page_count": page_count,
+            "rows_before_filter": rows_before,
+        }
+    profile.info["transaction_count"] = len(result["transactions"])
+    checkpoint("categorize", rows_parsed=len(result["transactions"]))
+
+    if categorize:
+        with profile.stage("categorize"):
+            categorize_transactions(result["transactions"], extra_rules)
+
+    if analytics:
+        checkpoint("analytics")
+        with profile.stage("analytics"):
+            result["analytics"] = compute_analytics(result["transactions"])
+
+    return result
@@ -0,0 +1,69 @@
+import os
+
+import fitz  # PyMuPDF
+
+from api.extract import MAX_EXTRACT_WORKERS, MIN_PAGES_PER_WORKER, PARALLEL_PAGE_THRESHOLD
+from api.filters import page_dates
+from api.parsers import BRANCH_CONFIDENCE, detect_bank
+from api.pipeline import CONVERT_BUDGET_SECONDS
+
+# Rough cost of a full conversion per page (extract + parse + categorize on
+# one core), measured on generated statements; used only for the estimate
+SECONDS_PER_PAGE = float(os.environ.get("INSPECT_SECONDS_PER_PAGE", "0.03"))
+
+
+def _estimate_seconds(page_count: int) -> float:
+    workers = 1
+    if page_count >= PARALLEL_PAGE_THRESHOLD:
+        workers = max(1, min(MAX_EXTRACT_WORKERS, page_count // MIN_PAGES_PER_WORKER))
+    return round(page_count * SECONDS_PER_PAGE / workers, 2)
+
+
+def inspect_document(file_content: bytes, password: str = None) -> dict:
+    # Preflight for /api/v1/convert: only the document trailer, metadata and
+    # the first page are read. An encrypted document without a (correct)
+    # password still reports its page count, but no creator or bank.
+    doc = fitz.open(stream=file_content, filetype="pdf")
+    try:
+        info = {
+            "needs_pass": bool(doc.needs_pass),
+            "page_count": doc.page_count,
+            "size_bytes": len(file_content),
+        }
+        readable = True
+        if doc.needs_pass:
+            readable = bool(password) and bool(doc.authenticate(password))
+            info["password_ok"] = readable if password else None
+
+        metadata = (doc.metadata or {}) if readable else {}
+        info["creator"] = metadata.get("creator") or None
+        info["producer"] = metadata.get("producer") or None
+
+        bank = branch = None
+        first_page = ""
+        if readable and doc.page_count:
+            # Plain (unsorted) text is enough for the signature checks and
+            # several times cheaper than the reading-order extraction
+            first_page = doc[0].get_text("text")
+            bank, branch = detect_bank(first_page, metadata)
+        info.update({
+            "bank": bank,
+            "detection_branch": branch,
+            "confidence": BRANCH_CONFIDENCE.get(branch, 0.0),
+            "supported": bank is not None if readable else None,
+        })
+
+        # Rows per page taken from the first page; the year only matters for
+        # date validity, not for counting
+        rows = len(page_dates(bank, first_page, 2000)) * doc.page_count if bank else None
+        estimate = _estimate_seconds(doc.page_count)
+        info["estimate"] = {
+            "rows": rows,
+            "seconds": estimate,
+            "parallel": doc.page_count >= PARALLEL_PAGE_THRESHOLD,
+            "budget_seconds": CONVERT_BUDGET_SECONDS or None,
+            "within_budget": not CONVERT_BUDGET_SECONDS or estimate <= CONVERT_BUDGET_SECONDS,
+        }
+        return info
+    finally:
+        doc.close()
@@ -0,0 +1,138 @@
+import cProfile
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from api.rules import collect_rule_hits
+
+# Opt-in: conversions slower than PROFILE_SLOW_MS keep a cProfile dump plus a
+# content-free fingerprint. 0 disables profiling entirely.
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+# Share of requests that run under the profiler at all
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0.05"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "pdf-converter-profiles"))
+# Oldest dumps are deleted beyond this many
+PROFILE_MAX_DUMPS = int(os.environ.get("PROFILE_MAX_DUMPS", "50"))
+
+# Only one cProfile profiler can be active per process on Python 3.12+; a
+# sampled request that overlaps another runs unprofiled
+_profiler_lock = threading.Lock()
+
+
+class ConversionProfile:
+    # Stage timings are always collected (they are cheap); the cProfile
+    # profiler only runs for sampled requests.
+
+    def __init__(self, sampled: bool = False):
+        self.sampled = sampled
+        self.profiler = cProfile.Profile() if sampled else None
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.info = {}
+        self.rule_hits = None
+        self.finished = False
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+    def run(self, fn, *args, **kwargs):
+        # cProfile follows one thread, so the synchronous pipeline is run
+        # through here on whichever thread executes it
+        if self.profiler is None:
+            return fn(*args, **kwargs)
+        with collect_rule_hits() as hits:
+            self.rule_hits = hits
+            if not self._enable():
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.profiler.disable()
+                _profiler_lock.release()
+
+    def _enable(self) -> bool:
+        # False when another sampled request or profiling tool already holds
+        # the profiler: this request then runs without cProfile and keeps no dump
+        if not _profiler_lock.acquire(blocking=False):
+            self.profiler = None
+            return False
+        try:
+            self.profiler.enable()
+        except ValueError:
+            _profiler_lock.release()
+            self.profiler = None
+            return False
+        return True
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def fingerprint(self) -> dict:
+        # Only shapes and timings, never document text or amounts
+        out = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "total_ms": round(self.elapsed_ms(), 2),
+            "stages_ms": {k: round(v, 2) for k, v in self.stages.items()},
+            **self.info,
+        }
+        if self.rule_hits is not None:
+            # Which branch of each parser fired how often for this request
+            branches = {}
+            for (bank, name), count in sorted(self.rule_hits.items()):
+                branches.setdefault(bank, {})[name] = count
+            out["rule_hits"] = branches
+        return out
+
+    def finish(self) -> str:
+        # Returns the dump path when this conversion was slow enough to keep;
+        # only the first call of a request writes anything
+        if self.finished:
+            return None
+        self.finished = True
+        if self.profiler is None or self.elapsed_ms() < PROFILE_SLOW_MS:
+            return None
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stem = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+            self.profiler.dump_stats(stem + ".prof")
+            with open(stem + ".json", "w", encoding="utf-8") as f:
+                json.dump(self.fingerprint(), f, indent=2)
+            rotate_dumps()
+            return stem + ".prof"
+        except OSError:
+            # Profiling must never fail a conversion
+            return None
+
+
+def start_profile() -> ConversionProfile:
+    sampled = PROFILE_SLOW_MS > 0 and random.random() < PROFILE_SAMPLE_RATE
+    return ConversionProfile(sampled)
+
+
+def rotate_dumps(directory: str = None, keep: int = None):
+    directory = directory or PROFILE_DIR
+    keep = PROFILE_MAX_DUMPS if keep is None else keep
+
+    stems = {}
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        if ext in (".prof", ".json"):
+            path = os.path.join(directory, name)
+            stems[stem] = max(stems.get(stem, 0.0), os.path.getmtime(path))
+
+    for stem, _ in sorted(stems.items(), key=lambda kv: kv[1])[:max(0, len(stems) - keep)]:
+        for ext in (".prof", ".json"):
+            try:
+                os.remove(os.path.join(directory, stem + ext))
+            except FileNotFoundError:
+                pass
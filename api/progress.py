@@ -0,0 +1,150 @@
+import asyncio
+import os
+import threading
+import time
+
+from api.cancellation import CancelToken, use_token
+
+# Live progress for conversions started with a job_id, relayed to WebSocket
+# subscribers; a subscriber can also cancel the job.
+# At most one progress event per interval; stage changes always go out
+PROGRESS_INTERVAL = float(os.environ.get("PROGRESS_INTERVAL_MS", "100")) / 1000
+# Registrations nobody converted or watched for this long are dropped
+JOB_TTL_SECONDS = float(os.environ.get("PROGRESS_JOB_TTL_SECONDS", "300"))
+# Jobs one user may have registered at a time; at the cap their oldest
+# finished job makes room, and a user whose jobs are all pending or running
+# cannot register another
+MAX_JOBS_PER_USER = int(os.environ.get("PROGRESS_MAX_JOBS_PER_USER", "20"))
+
+
+class TooManyJobs(Exception):
+    pass
+
+
+class ConversionJob:
+    # Either side may arrive first: the WebSocket can subscribe before the
+    # upload finishes, and a cancel sent before the conversion starts still
+    # applies. Events are published from the worker thread and delivered on
+    # each subscriber's event loop.
+
+    def __init__(self, job_id: str, user_id: str):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.token = CancelToken()
+        self.token.listener = self._on_checkpoint
+        self.subscribers = []  # (loop, asyncio.Queue)
+        self.last_event = None
+        self.running = False
+        self.finished = False
+        self.touched = time.monotonic()
+        self.stage = None  # stage of the latest checkpoint
+        self._last_stage = None
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        with self._lock:
+            self.subscribers.append((asyncio.get_running_loop(), queue))
+            if self.last_event is not None:
+                # Late subscribers start from the latest state
+                queue.put_nowait(self.last_event)
+        self.touched = time.monotonic()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> int:
+        with self._lock:
+            self.subscribers = [(loop, q) for loop, q in self.subscribers if q is not queue]
+            return len(self.subscribers)
+
+    def publish(self, event: dict):
+        with self._lock:
+            self.last_event = event
+            subscribers = list(self.subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Subscriber's loop already closed
+                pass
+
+    def _on_checkpoint(self, stage: str, progress: dict):
+        # Called on every checkpoint (often every few hundred lines); only
+        # stage changes and one update per interval are published
+        self.stage = stage
+        now = time.monotonic()
+        if stage == self._last_stage and now - self._last_emit < PROGRESS_INTERVAL:
+            return
+        self._last_stage = stage
+        self._last_emit = now
+        self.publish({"type": "progress", "stage": stage, **progress})
+
+    def cancel(self):
+        self.token.cancel()
+
+    def run(self, fn, *args, **kwargs):
+        # Runs the synchronous pipeline under this job's token, on whichever
+        # worker thread executes it
+        self.publish({"type": "started"})
+        with use_token(self.token):
+            return fn(*args, **kwargs)
+
+    def finish(self, event: dict):
+        self.running = False
+        self.finished = True
+        self.touched = time.monotonic()
+        self.publish(event)
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _prune(now: float):
+    for job_id, job in list(_jobs.items()):
+        if not job.running and now - job.touched > JOB_TTL_SECONDS:
+            del _jobs[job_id]
+
+
+def _make_room(user_id: str):
+    mine = [job for job in _jobs.values() if job.user_id == user_id]
+    if len(mine) < MAX_JOBS_PER_USER:
+        return
+    finished = [job for job in mine if job.finished]
+    if not finished:
+        raise TooManyJobs(f"at most {MAX_JOBS_PER_USER} jobs per user")
+    del _jobs[min(finished, key=lambda job: job.touched).job_id]
+
+
+def _get(job_id: str, user_id: str) -> ConversionJob:
+    now = time.monotonic()
+    with _jobs_lock:
+        _prune(now)
+        job = _jobs.get(job_id)
+        if job is None:
+            _make_room(user_id)
+            job = _jobs[job_id] = ConversionJob(job_id, user_id)
+    if job.user_id != user_id:
+        raise PermissionError("job_id belongs to another user")
+    job.touched = now
+    return job
+
+
+def watch_job(job_id: str, user_id: str) -> ConversionJob:
+    # WebSocket side: registers the job if the upload has not arrived yet.
+    # Finished jobs stay until JOB_TTL_SECONDS so a late subscriber still
+    # gets the final event. Raises PermissionError when the id belongs to
+    # another user and TooManyJobs at the per-user cap.
+    return _get(job_id, user_id)
+
+
+def start_job(job_id: str, user_id: str) -> ConversionJob:
+    # Upload side; the caller must finish() the job whatever happens. Raises
+    # PermissionError when the id belongs to another user, TooManyJobs at the
+    # per-user cap and ValueError when it was already used for a conversion.
+    job = _get(job_id, user_id)
+    with _jobs_lock:
+        if job.running or job.finished:
+            raise ValueError("job_id was already used")
+        job.running = True
+    return job
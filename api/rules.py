@@ -0,0 +1,179 @@
+import contextvars
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+# Per-rule hit/timing counters for the parser heuristics. Read once at import:
+# with PARSER_RULE_STATS=0, rule() hands back the plain compiled pattern and
+# hit() does nothing, so the parsers run uninstrumented.
+ENABLED = os.environ.get("PARSER_RULE_STATS", "1") != "0"
+# Only every 2**PARSER_RULE_TIMING_SHIFT-th call of a rule is timed (hits are
+# always counted); reported times are scaled back up
+TIMING_SHIFT = int(os.environ.get("PARSER_RULE_TIMING_SHIFT", "4"))
+TIMING_MASK = (1 << TIMING_SHIFT) - 1
+
+_rules = []
+_hits = {}  # (bank, name) -> count, for branches that are not regexes
+# Hits of the request being profiled, see collect_rule_hits()
+_request_hits = contextvars.ContextVar("request_rule_hits", default=None)
+
+
+def _count_request(bank: str, name: str):
+    counts = _request_hits.get()
+    if counts is not None:
+        key = (bank, name)
+        counts[key] = counts.get(key, 0) + 1
+
+
+class Rule:
+    # Wraps a compiled pattern with the subset of the re.Pattern API the
+    # parsers use. A "hit" is a match, a non-empty findall, or a sub that
+    # replaced something; ns only sums the sampled calls. Counters are plain
+    # attributes: increments from concurrent cascade threads may rarely be
+    # lost, which is fine for stats.
+    __slots__ = ("bank", "name", "regex", "pattern", "calls", "hits", "ns")
+
+    def __init__(self, bank: str, name: str, pattern: str, flags: int = 0):
+        self.bank = bank
+        self.name = name
+        self.regex = re.compile(pattern, flags)
+        self.pattern = self.regex.pattern
+        self.calls = 0
+        self.hits = 0
+        self.ns = 0
+
+    def search(self, string):
+        self.calls += 1
+        if self.calls & TIMING_MASK:
+            m = self.regex.search(string)
+        else:
+            t0 = time.perf_counter_ns()
+            m = self.regex.search(string)
+            self.ns += time.perf_counter_ns() - t0
+        if m is not None:
+            self.hits += 1
+            _count_request(self.bank, self.name)
+        return m
+
+    def match(self, string):
+        self.calls += 1
+        if self.calls & TIMING_MASK:
+            m = self.regex.match(string)
+        else:
+            t0 = time.perf_counter_ns()
+            m = self.regex.match(string)
+            self.ns += time.perf_counter_ns() - t0
+        if m is not None:
+            self.hits += 1
+            _count_request(self.bank, self.name)
+        return m
+
+    def findall(self, string):
+        self.calls += 1
+        if self.calls & TIMING_MASK:
+            found = self.regex.findall(string)
+        else:
+            t0 = time.perf_counter_ns()
+            found = self.regex.findall(string)
+            self.ns += time.perf_counter_ns() - t0
+        if found:
+            self.hits += 1
+            _count_request(self.bank, self.name)
+        return found
+
+    def sub(self, repl, string):
+        self.calls += 1
+        if self.calls & TIMING_MASK:
+            result, replaced = self.regex.subn(repl, string)
+        else:
+            t0 = time.perf_counter_ns()
+            result, replaced = self.regex.subn(repl, string)
+            self.ns += time.perf_counter_ns() - t0
+        if replaced:
+            self.hits += 1
+            _count_request(self.bank, self.name)
+        return result
+
+    def reset(self):
+        self.calls = self.hits = self.ns = 0
+
+
+def rule(bank: str, name: str, pattern: str, flags: int = 0):
+    # bank: parser the rule belongs to ("BCA", ..., or "common" for shared
+    # helpers); name: "<kind>:<what>", e.g. "skip:disclaimer", "date:dd/mm"
+    if not ENABLED:
+        return re.compile(pattern, flags)
+    r = Rule(bank, name, pattern, flags)
+    _rules.append(r)
+    return r
+
+
+def _hit(bank: str, name: str):
+    key = (bank, name)
+    _hits[key] = _hits.get(key, 0) + 1
+    _count_request(bank, name)
+
+
+def _noop(bank: str, name: str):
+    pass
+
+
+# Count a non-regex branch (substring skips, continuation fallbacks)
+hit = _hit if ENABLED else _noop
+
+
+def rule_stats() -> dict:
+    # {bank: {rule name: {...}}}; rules that never fired show up with hits=0
+    stats = {}
+    for r in _rules:
+        stats.setdefault(r.bank, {})[r.name] = {
+            "pattern": r.pattern,
+            "calls": r.calls,
+            "hits": r.hits,
+            "total_ms": round((r.ns << TIMING_SHIFT) / 1e6, 3),
+            "avg_us": round((r.ns << TIMING_SHIFT) / r.calls / 1e3, 3) if r.calls else 0.0,
+        }
+    for (bank, name), count in _hits.items():
+        stats.setdefault(bank, {})[name] = {"calls": count, "hits": count}
+    return {"enabled": ENABLED, "banks": stats}
+
+
+@contextmanager
+def collect_rule_hits():
+    # Counts the hits made in this context (and in threads started with a
+    # copy of it) into a fresh {(bank, name): count}, apart from the
+    # process-wide totals that every concurrent request adds to
+    counts = {}
+    reset = _request_hits.set(counts)
+    try:
+        yield counts
+    finally:
+        _request_hits.reset(reset)
+
+
+def reset_rule_stats():
+    for r in _rules:
+        r.reset()
+    _hits.clear()
+
+
+def dump_rule_stats(file=None, as_json: bool = False):
+    # Table sorted by cumulative time (then hits) per bank; dead rules last
+    file = file or sys.stderr
+    stats = rule_stats()
+    if as_json:
+        json.dump(stats, file, indent=2)
+        file.write("\n")
+        return
+    if not stats["enabled"]:
+        print("rule stats disabled (PARSER_RULE_STATS=0)", file=file)
+        return
+    for bank, rules in sorted(stats["banks"].items()):
+        print(bank, file=file)
+        ordered = sorted(rules.items(), key=lambda kv: (-kv[1].get("total_ms", 0.0), -kv[1]["hits"]))
+        for name, s in ordered:
+            timing = f"{s['total_ms']:10.3f} ms {s['avg_us']:8.3f} us/call" if "total_ms" in s else " " * 28
+            print(f"  {name:32s} {s['calls']:9d} calls {s['hits']:9d} hits {timing}", file=file)
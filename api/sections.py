@@ -0,0 +1,135 @@
+import re
+
+from api.boilerplate import strip_repeated_lines
+from api.cancellation import checkpoint
+from api.cascade import parse_cascade
+from api.extract import join_pages
+from api.parsers import parse_bank_statement
+
+# Statement headers that open a section: (account, period). Either may be
+# missing from a page; a page starts a new section when a value it does
+# carry differs from the current section's.
+SECTION_HEADERS = {
+    "BCA": (
+        re.compile(r"NO\.\s*REKENING\s*:\s*(\d[\d-]*)", re.IGNORECASE),
+        re.compile(r"PERIODE\s*:\s*([A-Z]+\s+\d{4})", re.IGNORECASE),
+    ),
+    "BNI": (
+        re.compile(r"(?:No\.?|Nomor)\s*Rekening\s*:\s*(\d[\d-]*)", re.IGNORECASE),
+        re.compile(r"Laporan Mutasi.*?Periode:\s*([^\n]+)", re.IGNORECASE | re.DOTALL),
+    ),
+}
+
+# Account number in the statement header, per layout; used as the default
+# account for persistence. blu prints the number under its label in a table
+# row, so blu uploads have to pass one.
+ACCOUNT_HEADERS = {
+    "BCA": SECTION_HEADERS["BCA"][0],
+    "BNI": SECTION_HEADERS["BNI"][0],
+    "MANDIRI": re.compile(r"(?:Nomor Rekening|Account Number)(?:\s*/\s*Account Number)?\s*:\s*(\d[\d-]*)", re.IGNORECASE),
+}
+
+
+def statement_account(bank: str, page_text: str) -> str:
+    pattern = ACCOUNT_HEADERS.get(bank)
+    m = pattern.search(page_text) if pattern else None
+    return m.group(1) if m else None
+
+
+def page_header(bank: str, page_text: str) -> tuple:
+    account_re, period_re = SECTION_HEADERS[bank]
+    account = account_re.search(page_text)
+    period = period_re.search(page_text)
+    return (
+        account.group(1) if account else None,
+        " ".join(period.group(1).split()) if period else None,
+    )
+
+
+def split_sections(bank: str, pages: list) -> list:
+    # [{"account", "period", "first_page", "pages"}] in document order, split
+    # at page boundaries. Banks without known section headers, and documents
+    # whose headers never change, come back as one section.
+    sections = []
+    for number, page_text in enumerate(pages):
+        account, period = page_header(bank, page_text) if bank in SECTION_HEADERS else (None, None)
+        current = sections[-1] if sections else None
+        if current is not None and (
+            (account is None or account == current["account"] or current["account"] is None)
+            and (period is None or period == current["period"] or current["period"] is None)
+        ):
+            current["account"] = current["account"] or account
+            current["period"] = current["period"] or period
+            current["pages"].append(page_text)
+            continue
+        sections.append({"account": account, "period": period, "first_page": number, "pages": [page_text]})
+    return sections
+
+
+def _parse_section(text: str, metadata: dict, filename: str, cascade: bool) -> dict:
+    if cascade:
+        return parse_cascade(text, metadata, filename)
+    return parse_bank_statement(text, metadata, filename)
+
+
+def parse_sections(sections: list, metadata: dict, filename: str = "", strip: bool = True, cascade: bool = False) -> tuple:
+    # Parses each section on its own, so balances and period never mix across
+    # accounts or months. Returns ([result per section], lines stripped).
+    # Sections are parsed in-process one after another: handing them to the
+    # shared worker pool measured no faster, from 1.5k to 240k lines, since
+    # shipping the text to a worker and the result back costs about as much
+    # as parsing it.
+    results = []
+    removed = 0
+    for section in sections:
+        pages = section["pages"]
+        if strip:
+            pages, n = strip_repeated_lines(pages)
+            removed += n
+        results.append(_parse_section(join_pages(pages), metadata, filename, cascade))
+        checkpoint("parse", sections_parsed=len(results))
+    return results, removed
+
+
+def merge_sections(sections: list, results: list) -> dict:
+    # One statement for callers that read the flat shape (exports, persist,
+    # dedupe): all rows in document order. Each entry in "sections" points at
+    # its rows with first_row/row_count and carries that section's balances.
+    # Sections of one account chain into a top-level summary (opening from
+    # the first, closing from the last, totals summed); across accounts there
+    # is no such summary, so the top-level fields are left null.
+    transactions = []
+    summaries = []
+    for section, result in zip(sections, results):
+        rows = result["transactions"]
+        summaries.append({
+            "account": section["account"],
+            "period": result.get("period") or section["period"] or "",
+            "bank": rows[0]["transaction_bank"] if rows else None,
+            "pages": [section["first_page"] + 1, section["first_page"] + len(section["pages"])],
+            "initial_balance": result.get("initial_balance", 0.0),
+            "closing_balance": result.get("closing_balance", 0.0),
+            "incoming_transactions": result.get("incoming_transactions", 0.0),
+            "outgoing_transactions": result.get("outgoing_transactions", 0.0),
+            "first_row": len(transactions),
+            "row_count": len(rows),
+        })
+        transactions.extend(rows)
+    merged = {
+        "period": None,
+        "initial_balance": None,
+        "closing_balance": None,
+        "incoming_transactions": None,
+        "outgoing_transactions": None,
+        "transactions": transactions,
+        "sections": summaries,
+    }
+    if len({s["account"] for s in summaries}) == 1:
+        merged.update({
+            "period": "; ".join(s["period"] for s in summaries if s["period"]),
+            "initial_balance": summaries[0]["initial_balance"],
+            "closing_balance": summaries[-1]["closing_balance"],
+            "incoming_transactions": round(sum(s["incoming_transactions"] for s in summaries), 2),
+            "outgoing_transactions": round(sum(s["outgoing_transactions"] for s in summaries), 2),
+        })
+    return merged
@@ -0,0 +1,328 @@
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from api.persistence import build_transaction_rows, resolve_account, statement_key
+
+# Optional embedded history. Disabled unless LOCAL_STORE_PATH points at a
+# database file (created on first use).
+STORE_PATH = os.environ.get("LOCAL_STORE_PATH")
+STORE_BATCH_SIZE = int(os.environ.get("LOCAL_STORE_BATCH_SIZE", "1000"))
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statements (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    bank TEXT,
+    period TEXT,
+    initial_balance REAL,
+    closing_balance REAL,
+    incoming_transactions REAL,
+    outgoing_transactions REAL,
+    transaction_count INTEGER,
+    stored_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))
+);
+CREATE INDEX IF NOT EXISTS statements_user ON statements (user_id, rowid);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    statement_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    transaction_date TEXT NOT NULL,
+    transaction_description TEXT NOT NULL,
+    transaction_amount REAL NOT NULL,
+    amount_type TEXT NOT NULL,
+    transaction_bank TEXT,
+    transaction_balance REAL,
+    transaction_category TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_user_account_date
+    ON transactions (user_id, account, transaction_date, id);
+CREATE INDEX IF NOT EXISTS transactions_user_date
+    ON transactions (user_id, transaction_date, id);
+CREATE INDEX IF NOT EXISTS transactions_user_amount
+    ON transactions (user_id, transaction_amount, id);
+CREATE INDEX IF NOT EXISTS transactions_statement ON transactions (statement_id);
+
+-- External-content FTS index over descriptions, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5 (
+    transaction_description,
+    content='transactions',
+    content_rowid='id',
+    tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS transactions_ai AFTER INSERT ON transactions BEGIN
+    INSERT INTO transactions_fts (rowid, transaction_description)
+    VALUES (new.id, new.transaction_description);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_ad AFTER DELETE ON transactions BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, transaction_description)
+    VALUES ('delete', old.id, old.transaction_description);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_au AFTER UPDATE OF transaction_description ON transactions BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, transaction_description)
+    VALUES ('delete', old.id, old.transaction_description);
+    INSERT INTO transactions_fts (rowid, transaction_description)
+    VALUES (new.id, new.transaction_description);
+END;
+"""
+
+TRANSACTION_COLUMNS = (
+    "idempotency_key", "statement_id", "user_id", "account", "transaction_date",
+    "transaction_description", "transaction_amount", "amount_type",
+    "transaction_bank", "transaction_balance", "transaction_category",
+)
+
+INSERT_TRANSACTION = (
+    f"INSERT INTO transactions ({', '.join(TRANSACTION_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in TRANSACTION_COLUMNS)}) "
+    "ON CONFLICT (idempotency_key) DO UPDATE SET "
+    + ", ".join(f"{col} = excluded.{col}" for col in TRANSACTION_COLUMNS[1:])
+)
+
+DELETE_STATEMENT_TRANSACTIONS = "DELETE FROM transactions WHERE statement_id = ?"
+
+STATEMENT_COLUMNS = (
+    "id", "user_id", "account", "bank", "period", "initial_balance", "closing_balance",
+    "incoming_transactions", "outgoing_transactions", "transaction_count",
+)
+
+UPSERT_STATEMENT = (
+    f"INSERT INTO statements ({', '.join(STATEMENT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in STATEMENT_COLUMNS)}) "
+    "ON CONFLICT (id) DO UPDATE SET "
+    + ", ".join(f"{col} = excluded.{col}" for col in STATEMENT_COLUMNS[3:])
+)
+
+
+class TransactionStore:
+    # One connection per thread (sqlite3 connections are not shareable) and a
+    # process-wide write lock: WAL lets readers run alongside the single writer.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def save_statement(self, result: dict, user_id: str, account: str = None, batch_size: int = None) -> dict:
+        # Same keys as the Supabase persistence; a re-save replaces the
+        # statement's rows. ValueError when no account is known.
+        batch_size = batch_size or STORE_BATCH_SIZE
+        transactions = result.get("transactions", [])
+        bank = transactions[0]["transaction_bank"] if transactions else ""
+        account = resolve_account(result, account)
+
+        statement_id = statement_key(user_id, account, result)
+        statement_row = (
+            statement_id, user_id, account, bank, result.get("period") or "",
+            result.get("initial_balance", 0.0), result.get("closing_balance", 0.0),
+            result.get("incoming_transactions", 0.0), result.get("outgoing_transactions", 0.0),
+            len(transactions),
+        )
+        rows = build_transaction_rows(result, user_id, account, statement_id)
+        for row, tx in zip(rows, transactions):
+            row["transaction_category"] = tx.get("transaction_category")
+
+        conn = self._connection()
+        batches = 0
+        with self._write_lock:
+            # One transaction for the whole statement; executemany per batch.
+            # The statement's previous rows go first: after a parser fix a
+            # corrected row has a new key and would sit next to the stale one.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(UPSERT_STATEMENT, statement_row)
+                conn.execute(DELETE_STATEMENT_TRANSACTIONS, (statement_id,))
+                for start in range(0, len(rows), batch_size):
+                    conn.executemany(
+                        INSERT_TRANSACTION,
+                        [tuple(row[col] for col in TRANSACTION_COLUMNS) for row in rows[start:start + batch_size]],
+                    )
+                    batches += 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        return {
+            "statement_id": statement_id,
+            "transactions_written": len(rows),
+            "batches": batches,
+        }
+
+    def list_statements(self, user_id: str, account: str = None, limit: int = None, cursor: str = None) -> dict:
+        limit = _page_size(limit)
+        sql = "SELECT * FROM statements WHERE user_id = ?"
+        params = [user_id]
+        if account:
+            sql += " AND account = ?"
+            params.append(account)
+        if cursor:
+            (last,) = decode_cursor(cursor, 1)
+            sql += " AND rowid < ?"
+            params.append(last)
+        sql += " ORDER BY rowid DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(page[-1]["rowid"])
+        items = []
+        for row in page:
+            item = dict(row)
+            del item["rowid"]
+            items.append(item)
+        return {"items": items, "next_cursor": next_cursor}
+
+    def query_transactions(
+        self,
+        user_id: str,
+        account: str = None,
+        search: str = None,
+        from_date: str = None,
+        to_date: str = None,
+        min_amount: float = None,
+        max_amount: float = None,
+        amount_type: str = None,
+        category: str = None,
+        order: str = "date",
+        limit: int = None,
+        cursor: str = None,
+    ) -> dict:
+        # Keyset pagination: newest (or largest) first, ties broken by id. The
+        # cursor carries the last row's sort value and id so each page is an
+        # index range scan instead of an OFFSET walk.
+        if order not in ("date", "amount"):
+            raise ValueError("order must be 'date' or 'amount'")
+        sort_col = "t.transaction_date" if order == "date" else "t.transaction_amount"
+        limit = _page_size(limit)
+
+        sql = "SELECT t.* FROM transactions t"
+        where = ["t.user_id = ?"]
+        params = [user_id]
+        if search:
+            match = fts_query(search)
+            if not match:
+                return {"items": [], "next_cursor": None}
+            sql += " JOIN transactions_fts f ON f.rowid = t.id"
+            where.append("transactions_fts MATCH ?")
+            params.append(match)
+        if account:
+            where.append("t.account = ?")
+            params.append(account)
+        if from_date:
+            where.append("t.transaction_date >= ?")
+            params.append(from_date)
+        if to_date:
+            where.append("t.transaction_date <= ?")
+            params.append(to_date)
+        if min_amount is not None:
+            where.append("t.transaction_amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            where.append("t.transaction_amount <= ?")
+            params.append(max_amount)
+        if amount_type:
+            where.append("t.amount_type = ?")
+            params.append(amount_type)
+        if category:
+            where.append("t.transaction_category = ?")
+            params.append(category)
+        if cursor:
+            last_value, last_id = decode_cursor(cursor, 2)
+            where.append(f"({sort_col}, t.id) < (?, ?)")
+            params.extend([last_value, last_id])
+
+        sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {sort_col} DESC, t.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            sort_value = last["transaction_date"] if order == "date" else last["transaction_amount"]
+            next_cursor = encode_cursor(sort_value, last["id"])
+        return {"items": [dict(row) for row in page], "next_cursor": next_cursor}
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _page_size(limit: int) -> int:
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    # The `size` values encode_cursor() was given. Anything else, including
+    # nested or boolean values that would reach SQLite as bind parameters,
+    # is a ValueError (a 400 for the API).
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    if any(isinstance(v, bool) or not isinstance(v, (str, int, float)) for v in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def fts_query(search: str) -> str:
+    # Free text -> FTS5 prefix terms ANDed together, so user input can never
+    # hit FTS query syntax ("SHOPEE QR" -> '"SHOPEE"* "QR"*')
+    terms = re.findall(r"\w+", search)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+_store: TransactionStore = None
+_store_lock = threading.Lock()
+
+
+def is_configured() -> bool:
+    return bool(STORE_PATH)
+
+
+def get_store() -> TransactionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TransactionStore(STORE_PATH)
+    return _store
@@ -0,0 +1,109 @@
+import os
+
+from api.cancellation import CancelToken, checkpoint, current_token, use_token
+from api.extract import extract_page_text, join_pages
+from api.parsers import detect_bank, parse_blu_summary, parse_bni_summary, parse_mandiri_summary
+from api.pipeline import CONVERT_BUDGET_SECONDS, convert_document
+from api.profiling import ConversionProfile
+
+# Pages scanned for the summary block before giving up on the fast path
+SUMMARY_MAX_PAGES = int(os.environ.get("SUMMARY_MAX_PAGES", "2"))
+
+SUMMARY_FIELDS = (
+    "initial_balance",
+    "closing_balance",
+    "incoming_transactions",
+    "outgoing_transactions",
+)
+
+
+def _lines(text: str) -> list:
+    return [l.strip() for l in text.split("\n") if l.strip()]
+
+
+# Banks whose statements print the totals in a header block. BCA only prints
+# the opening balance; its totals are derived from the rows.
+HEADER_SUMMARIES = {
+    "MANDIRI": lambda text: parse_mandiri_summary(_lines(text)),
+    "BNI": lambda text: parse_bni_summary(_lines(text)),
+    "BLU": lambda text: parse_blu_summary(text, _lines(text)),
+}
+
+
+def missing_fields(summary: dict) -> list:
+    return [field for field in SUMMARY_FIELDS if summary.get(field) is None]
+
+
+def summarize_document(
+    doc,
+    file_content: bytes,
+    password: str = None,
+    filename: str = "",
+    profile: ConversionProfile = None,
+    max_pages: int = None,
+    budget: float = None,
+) -> dict:
+    # Period and balances only. Header-summary banks extract pages one at a
+    # time until every field is found; everything else falls back to a full
+    # parse and reports which fields were derived from the rows.
+    budget = CONVERT_BUDGET_SECONDS if budget is None else budget
+    token = CancelToken(budget=budget or None, parent=current_token())
+    with use_token(token):
+        return _summarize(doc, file_content, password, filename, profile or ConversionProfile(), max_pages or SUMMARY_MAX_PAGES)
+
+
+def _summarize(doc, file_content, password, filename, profile, max_pages) -> dict:
+    pages = []
+    with profile.stage("extract"):
+        if doc.page_count:
+            pages.append(extract_page_text(doc[0]))
+    bank, branch = detect_bank(join_pages(pages), doc.metadata)
+    profile.info.update({"bank": bank, "detection_branch": branch, "page_count": doc.page_count, "mode": "summary"})
+
+    if bank not in HEADER_SUMMARIES:
+        # BCA (or nothing recognisable on the first page): full parse
+        result = convert_document(doc, file_content, password, filename, categorize=False, profile=profile)
+        transactions = result["transactions"]
+        summary = {field: result.get(field) for field in SUMMARY_FIELDS}
+        summary.update({
+            "bank": transactions[0]["transaction_bank"] if transactions else bank,
+            "period": result.get("period", ""),
+            "summary_source": "rows",
+            "derived_fields": ["closing_balance", "incoming_transactions", "outgoing_transactions"],
+            "pages_read": doc.page_count,
+            "page_count": doc.page_count,
+        })
+        return summary
+
+    summarize = HEADER_SUMMARIES[bank]
+    while True:
+        with profile.stage("summary"):
+            summary = summarize(join_pages(pages))
+        missing = missing_fields(summary)
+        if not missing or len(pages) >= doc.page_count:
+            break
+        if len(pages) >= max_pages:
+            # Summary block is not where it usually is: read the rest at once
+            with profile.stage("extract"):
+                for i in range(len(pages), doc.page_count):
+                    pages.append(extract_page_text(doc[i]))
+                    checkpoint("extract", pages_extracted=len(pages))
+            with profile.stage("summary"):
+                summary = summarize(join_pages(pages))
+            missing = missing_fields(summary)
+            break
+        with profile.stage("extract"):
+            pages.append(extract_page_text(doc[len(pages)]))
+        checkpoint("extract", page_count=doc.page_count, pages_extracted=len(pages))
+
+    for field in missing:
+        summary[field] = 0.0
+    summary.update({
+        "bank": bank,
+        "summary_source": "header",
+        "pages_read": len(pages),
+        "page_count": doc.page_count,
+    })
+    if missing:
+        summary["missing"] = missing
+    return summary
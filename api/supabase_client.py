@@ -0,0 +1,93 @@
+import asyncio
+import os
+
+import httpx
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+
+# Shared connection pool for every outbound Supabase call (auth + PostgREST).
+# Connections are kept alive between requests so only the first call per
+# connection pays TCP/TLS setup.
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.environ.get("SUPABASE_MAX_KEEPALIVE", "10")),
+    keepalive_expiry=float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", "30")),
+)
+TIMEOUT = httpx.Timeout(
+    float(os.environ.get("SUPABASE_TIMEOUT", "10")),
+    connect=float(os.environ.get("SUPABASE_CONNECT_TIMEOUT", "5")),
+)
+
+_client: AsyncClient = None
+_http: httpx.AsyncClient = None
+_lock = asyncio.Lock()
+
+
+def is_configured() -> bool:
+    return bool(os.environ.get("SUPABASE_URL") and os.environ.get("SUPABASE_KEY"))
+
+
+async def get_client() -> AsyncClient:
+    # Created lazily on first use: serverless runtimes may skip the lifespan
+    # startup hook, and a missing configuration should only fail the requests
+    # that need Supabase.
+    global _client, _http
+    if _client is not None:
+        return _client
+
+    async with _lock:
+        if _client is None:
+            _http = httpx.AsyncClient(limits=POOL_LIMITS, timeout=TIMEOUT, http2=_http2_available())
+            _client = await acreate_client(
+                os.environ["SUPABASE_URL"],
+                os.environ["SUPABASE_KEY"],
+                options=AsyncClientOptions(httpx_client=_http),
+            )
+    return _client
+
+
+async def close_client():
+    global _client, _http
+    async with _lock:
+        if _http is not None:
+            await _http.aclose()
+        _client = None
+        _http = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def pool_stats() -> dict:
+    stats = {
+        "initialized": _http is not None,
+        "max_connections": POOL_LIMITS.max_connections,
+        "max_keepalive_connections": POOL_LIMITS.max_keepalive_connections,
+        "connections": 0,
+        "active": 0,
+        "idle": 0,
+        "queued_requests": 0,
+    }
+    if _http is None:
+        return stats
+
+    # httpx does not expose pool metrics publicly; read them from the
+    # underlying httpcore pool when it is there.
+    pool = getattr(getattr(_http, "_transport", None), "_pool", None)
+    if pool is None:
+        return stats
+
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for conn in connections if conn.is_idle())
+    stats["connections"] = len(connections)
+    stats["idle"] = idle
+    stats["active"] = len(connections) - idle
+    requests = list(getattr(pool, "_requests", []))
+    stats["queued_requests"] = sum(1 for req in requests if getattr(req, "is_queued", lambda: False)())
+    if stats["max_connections"]:
+        stats["utilization"] = round(stats["active"] / stats["max_connections"], 3)
+    return stats
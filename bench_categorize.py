@@ -0,0 +1,77 @@
+import random
+import string
+import sys
+import time
+
+from api.categorize import Automaton, categorize_transactions
+
+RULES = 10_000
+ROWS = 10_000
+NAIVE_ROWS = 500  # the substring loop is O(rules) per row, so only sample it
+
+
+def random_word(rng, lo=4, hi=10):
+    return "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(lo, hi)))
+
+
+def make_rules(rng, count):
+    return [(random_word(rng), f"cat_{i % 200}") for i in range(count)]
+
+
+def make_descriptions(rng, rules, count):
+    prefixes = ["TRSF E-BANKING DB", "BI-FAST CR", "TRANSAKSI DEBIT QRC014", "Pembayaran QR ke"]
+    descs = []
+    for _ in range(count):
+        parts = [rng.choice(prefixes), f"{rng.randint(1000, 9999)}/FTFVA/WS{rng.randint(10000, 99999)}"]
+        if rng.random() < 0.7:
+            parts.append(rng.choice(rules)[0])
+        parts.append(random_word(rng))
+        descs.append(" ".join(parts))
+    return descs
+
+
+def naive_classify(rules, desc):
+    upper = desc.upper()
+    for keyword, category in rules:
+        if keyword in upper:
+            return category
+    return "uncategorized"
+
+
+def main():
+    rng = random.Random(42)
+    rules = make_rules(rng, RULES)
+    descs = make_descriptions(rng, rules, ROWS)
+
+    t0 = time.perf_counter()
+    automaton = Automaton()
+    for keyword, category in rules:
+        automaton.add(keyword, category)
+    automaton.build()
+    compile_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for desc in descs:
+        automaton.classify(desc)
+    scan_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for desc in descs[:NAIVE_ROWS]:
+        naive_classify(rules, desc)
+    naive_s = (time.perf_counter() - t0) * ROWS / NAIVE_ROWS
+
+    t0 = time.perf_counter()
+    categorize_transactions([{"transaction_description": d} for d in descs])
+    builtin_s = time.perf_counter() - t0
+
+    print(f"rules={RULES} rows={ROWS}")
+    print(f"automaton compile     : {compile_s * 1000:8.1f} ms")
+    print(f"automaton scan        : {scan_s * 1000:8.1f} ms ({scan_s / ROWS * 1e6:.1f} us/row)")
+    print(f"naive substring (est.): {naive_s * 1000:8.1f} ms ({naive_s / ROWS * 1e6:.1f} us/row)")
+    print(f"built-in rule set     : {builtin_s * 1000:8.1f} ms")
+    print(f"speedup vs naive      : {naive_s / scan_s:8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import json
+import random
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from api.models import statement_response
+
+SIZES = [100, 1_000, 10_000]
+REPEATS = 5
+
+
+def make_result(rows: int) -> dict:
+    rng = random.Random(rows)
+    balance = 1_045_271.93
+    transactions = []
+    for i in range(rows):
+        amount = round(rng.uniform(1_000, 500_000), 2)
+        debit = rng.random() < 0.7
+        balance += -amount if debit else amount
+        transactions.append({
+            "transaction_date": f"2025-10-{i % 28 + 1:02d}",
+            "transaction_description": f"TRSF E-BANKING DB {i:04d}/FTFVA/WS95271 12608/SHOPEE",
+            "transaction_amount": amount,
+            "amount_type": "debit" if debit else "credit",
+            "transaction_bank": "BCA",
+            "transaction_balance": round(balance, 2),
+            "transaction_category": "shopping",
+        })
+    return {
+        "period": "OKTOBER 2025",
+        "initial_balance": 1_045_271.93,
+        "closing_balance": round(balance, 2),
+        "incoming_transactions": 0.0,
+        "outgoing_transactions": 0.0,
+        "transactions": transactions,
+    }
+
+
+def generic_path(result: dict) -> bytes:
+    # What FastAPI does for a plain dict return value
+    return JSONResponse(content=jsonable_encoder(result)).body
+
+
+def fast_path(result: dict) -> bytes:
+    return statement_response(result).body
+
+
+def best_of(fn, result) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        fn(result)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(f"{'rows':>8} {'generic ms':>12} {'fast ms':>10} {'speedup':>8}")
+    for rows in SIZES:
+        result = make_result(rows)
+        assert json.loads(generic_path(result)) == json.loads(fast_path(result))
+        generic_s = best_of(generic_path, result)
+        fast_s = best_of(fast_path, result)
+        print(f"{rows:>8} {generic_s * 1000:>12.2f} {fast_s * 1000:>10.2f} {generic_s / fast_s:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import argparse
+import itertools
+import json
+import math
+import sys
+
+from parity import run_parser
+
+# Worst-case scaling check for the parsers: every parser runs on generated
+# pathological texts at two sizes, and the growth of the parse time between
+# them is fitted to an exponent (1 = linear, 2 = quadratic).
+#   python complexity.py                        # 25k and 100k characters
+#   python complexity.py --size 5000 --factor 8 --banks BCA,BNI
+# A case fails when its exponent is above --bound, unless the larger run is
+# still under --floor seconds (too fast to time reliably); a borderline
+# failure is measured once more at the next size up before it counts.
+# Exits 1 on any failure, so a backtracking or quadratic regex is caught
+# before it ships.
+
+# Starts of lines each parser treats specially: row dates, signed amounts,
+# summary labels and the Mandiri row index
+PREFIXES = {
+    "plain": "",
+    "bca-row": "07/10 TRSF ",
+    "dated": "01 Nov 2025 Transfer ",
+    "date-line": "01 Nov 2025\n",
+    "signed": "01 Nov 2025 Transfer +",
+    "debit": "01 Nov 2025 QRIS - ",
+    "saldo": "Saldo Awal Rp ",
+    "index": "1 +",
+}
+# Repeated units that look like the start of an amount but never finish one
+WALLS = {
+    "comma": "1,",
+    "dot": "1.",
+    "space": "1 ",
+    "mixed": "1.1,",
+    "thousands-comma": "12,345,",
+    "thousands-dot": "12.345.",
+}
+# What ends the wall: nothing, a letter, a one-digit decimal, a DB marker or
+# a cut-off time
+SUFFIXES = {"": "", "letter": "x", "short-decimal": ",5", "db": " DB", "time": " 12:3"}
+HEADER = "Periode: x\n"
+# Failing cases faster than this are confirmed at the next size up; slower
+# ones are clearly not timer noise
+CONFIRM_BELOW_SECONDS = 0.05
+
+
+def _repeat(unit: str, size: int) -> str:
+    return unit * max(1, size // len(unit))
+
+
+def cases() -> dict:
+    # name -> function(size) returning a text of about `size` characters
+    out = {}
+    for (p, prefix), (w, wall), (s, suffix) in itertools.product(PREFIXES.items(), WALLS.items(), SUFFIXES.items()):
+        name = f"wall:{p}/{w}" + (f"/{s}" if s else "")
+        out[name] = lambda size, prefix=prefix, wall=wall, suffix=suffix: HEADER + prefix + _repeat(wall, size) + suffix + "\n"
+    # One 100k-character description line on a dated row
+    for p in ("bca-row", "dated", "signed"):
+        out[f"long-line:{p}"] = lambda size, prefix=PREFIXES[p]: HEADER + prefix + _repeat("PEMBAYARAN QRIS TOKO ", size) + " 10,000.00 +10.000,00\n"
+    # Amount lines with no dates anywhere
+    out["amounts-no-dates"] = lambda size: HEADER + _repeat("1 +1.234.567,89 12,345.67 DB -50.000,00 1,000\n", size)
+    out["balances-no-dates"] = lambda size: HEADER + _repeat("188.144,38\n", size)
+    # A single row followed by a long run of description continuations
+    out["long-description:bca"] = lambda size: HEADER + "07/10 TRSF E-BANKING DB 10,000.00 DB 1,000,000.00\n" + _repeat("TRANSFER KE REKENING\n", size)
+    out["long-description:dated"] = lambda size: HEADER + "01 Nov 2025\nTransfer\n" + _repeat("Pembayaran merchant\n", size) + "-25.000,00 188.144,38\n"
+    # Many well-formed rows, so growth is measured with real output too
+    out["rows:bca"] = lambda size: HEADER + _repeat("07/10 TRSF E-BANKING DB 10,000.00 DB 1,000,000.00\nKE REKENING\n", size)
+    out["rows:dated"] = lambda size: HEADER + _repeat("01 Nov 2025 Transfer -10,000 1,000,000\n08:37:35 WIB\n", size)
+    out["rows:mandiri"] = lambda size: HEADER + _repeat("01 Nov 2025\nTransfer ke toko\n1 -50.000,00 166.000,00\n", size)
+    return out
+
+
+def exponent(small: float, large: float, factor: float) -> float:
+    return math.log(max(large, 1e-9) / max(small, 1e-9)) / math.log(factor)
+
+
+def check(parsers: dict, size: int, factor: int, bound: float, floor: float, repeat: int, only=None) -> dict:
+    results = []
+    for name, make in cases().items():
+        if only and not any(name.startswith(o) for o in only):
+            continue
+        small_text, large_text = make(size), make(size * factor)
+        for bank, fn in parsers.items():
+            _, small = run_parser(fn, small_text, repeat)
+            _, large = run_parser(fn, large_text, repeat)
+            k = exponent(small, large, factor)
+            failed = k > bound and large >= floor
+            if failed and large < CONFIRM_BELOW_SECONDS:
+                # Confirm on the next pair up: a few milliseconds at the small
+                # size are dominated by cache effects, a real blow-up only grows
+                larger_text = make(size * factor * factor)
+                _, larger = run_parser(fn, larger_text, repeat)
+                k = exponent(large, larger, factor)
+                failed = k > bound
+                small, large, large_text = large, larger, larger_text
+            results.append({
+                "case": name,
+                "parser": bank,
+                "chars": len(large_text),
+                "small_s": small,
+                "large_s": large,
+                "exponent": round(k, 2),
+                "failed": failed,
+            })
+    return {
+        "size": size,
+        "factor": factor,
+        "bound": bound,
+        "cases": len(results),
+        "failed": [r for r in results if r["failed"]],
+        "slowest": sorted(results, key=lambda r: r["large_s"], reverse=True),
+    }
+
+
+def print_report(report: dict, limit: int):
+    print(
+        f"{report['cases']} cases at {report['size']} and {report['size'] * report['factor']} chars, "
+        f"{len(report['failed'])} above exponent {report['bound']}"
+    )
+    rows = report["failed"] or report["slowest"][:limit]
+    print("failed:" if report["failed"] else "slowest:")
+    for r in rows:
+        print(
+            f"  {r['parser']:8s} {r['case']:40s} {r['small_s'] * 1000:9.2f} ms -> "
+            f"{r['large_s'] * 1000:9.2f} ms  exponent {r['exponent']:5.2f}"
+        )
+
+
+def main(argv=None) -> int:
+    from api.parsers import PARSERS
+
+    parser = argparse.ArgumentParser(description="Check that parse time grows linearly on pathological inputs.")
+    parser.add_argument("--size", type=int, default=25000, help="characters in the smaller text")
+    parser.add_argument("--factor", type=int, default=4, help="the larger text is this many times bigger")
+    parser.add_argument("--bound", type=float, default=1.4, help="highest accepted growth exponent")
+    parser.add_argument("--floor", type=float, default=0.005, help="seconds below which the larger run always passes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the fastest is used")
+    parser.add_argument("--banks", default=",".join(PARSERS), help="parsers to check")
+    parser.add_argument("--cases", help="comma-separated case name prefixes, e.g. wall:bca-row,rows:")
+    parser.add_argument("--limit", type=int, default=10, help="slowest cases to print when nothing fails")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    banks = [b.strip().upper() for b in args.banks.split(",") if b.strip()]
+    only = [c.strip() for c in args.cases.split(",") if c.strip()] if args.cases else None
+    report = check({b: PARSERS[b] for b in banks}, args.size, args.factor, args.bound, args.floor, args.repeat, only)
+    print_report(report, args.limit)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
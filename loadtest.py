@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+import httpx
+
+from sample_statements import BANKS, make_pdf
+
+# Load test for POST /api/v1/convert:
+#   python loadtest.py -n 200 -c 8                  # in-process via ASGITransport
+#   python loadtest.py -n 200 -c 8 --uvicorn        # real HTTP against a local uvicorn
+# Authentication and Supabase are replaced with local stand-ins, so no
+# network access or credentials are needed. Prints throughput and latency
+# percentiles; --json writes the same report for comparing releases.
+
+TOKEN = "Bearer loadtest"
+
+
+class StandInUser:
+    # Shape of supabase.auth.get_user(): a response wrapping the user record
+    class user:
+        id = "loadtest-user"
+
+
+async def stand_in_user():
+    return StandInUser
+
+
+async def stand_in_supabase():
+    return None
+
+
+def build_app():
+    from api.index import app, get_supabase, verify_token
+
+    app.dependency_overrides[verify_token] = stand_in_user
+    app.dependency_overrides[get_supabase] = stand_in_supabase
+    return app
+
+
+def build_corpus(banks: list, rows: int, variants: int, password_share: float, seed: int) -> list:
+    # (name, pdf bytes, password, expected rows); every bank gets `variants`
+    # documents and a share of them is encrypted
+    rng = random.Random(seed)
+    corpus = []
+    for bank in banks:
+        for v in range(variants):
+            password = f"pw-{bank.lower()}-{v}" if rng.random() < password_share else None
+            name = f"{bank.lower()}-{v}{'-locked' if password else ''}.pdf"
+            corpus.append((name, make_pdf(bank, rows, password=password, seed=seed + v), password, rows))
+    return corpus
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def one_request(client: httpx.AsyncClient, doc: tuple, form: dict) -> tuple:
+    name, data, password, expected_rows = doc
+    fields = dict(form)
+    if password:
+        fields["password"] = password
+    t0 = time.perf_counter()
+    try:
+        response = await client.post(
+            "/api/v1/convert",
+            files={"file": (name, data, "application/pdf")},
+            data=fields,
+            headers={"Authorization": TOKEN},
+        )
+    except httpx.HTTPError as e:
+        return time.perf_counter() - t0, type(e).__name__, 0
+    latency = time.perf_counter() - t0
+    if response.status_code != 200:
+        return latency, str(response.status_code), 0
+    rows = len(response.json().get("transactions", []))
+    # A 200 with the wrong number of rows is a failure too
+    return latency, "ok" if rows == expected_rows else "wrong_rows", rows
+
+
+async def drive(client: httpx.AsyncClient, corpus: list, total: int, concurrency: int, form: dict, seed: int) -> tuple:
+    rng = random.Random(seed)
+    plan = [rng.choice(corpus) for _ in range(total)]
+    results = []
+    queue = iter(plan)
+
+    async def worker():
+        for doc in queue:
+            results.append(await one_request(client, doc, form))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def report(results: list, elapsed: float, args) -> dict:
+    ok = sorted(lat for lat, status, _ in results if status == "ok")
+    every = sorted(lat for lat, _, _ in results)
+    statuses = {}
+    for _, status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    rows = sum(r for _, status, r in results if status == "ok")
+    return {
+        "transport": "uvicorn" if args.uvicorn else "asgi",
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "rows_per_statement": args.rows,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": round(percentile(every, 50) * 1000, 1),
+            "p95": round(percentile(every, 95) * 1000, 1),
+            "p99": round(percentile(every, 99) * 1000, 1),
+            "max": round(every[-1] * 1000, 1) if every else 0.0,
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(app):
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+async def run(args) -> dict:
+    banks = [b.strip().upper() for b in args.banks.split(",") if b.strip()]
+    corpus = build_corpus(banks, args.rows, args.variants, args.password_share, args.seed)
+    form = {"categorize": str(not args.no_categorize).lower()}
+    if args.analytics:
+        form["analytics"] = "true"
+
+    app = build_app()
+    server = None
+    if args.uvicorn:
+        server, thread, base_url = start_uvicorn(app)
+        transport = None
+    else:
+        base_url = "http://loadtest"
+        transport = httpx.ASGITransport(app=app)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            if args.warmup:
+                await drive(client, corpus, args.warmup, args.concurrency, form, args.seed + 1)
+            results, elapsed = await drive(client, corpus, args.requests, args.concurrency, form, args.seed)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+    return report(results, elapsed, args)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test /api/v1/convert with generated statements.")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="measured requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--rows", type=int, default=200, help="transactions per generated statement")
+    parser.add_argument("--banks", default=",".join(BANKS), help="comma-separated bank layouts to mix")
+    parser.add_argument("--variants", type=int, default=3, help="documents generated per bank")
+    parser.add_argument("--password-share", type=float, default=0.25, help="share of encrypted documents")
+    parser.add_argument("--warmup", type=int, default=4, help="unmeasured requests sent first")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request (s)")
+    parser.add_argument("--uvicorn", action="store_true", help="serve over real HTTP instead of ASGITransport")
+    parser.add_argument("--no-categorize", action="store_true")
+    parser.add_argument("--analytics", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    # The parsers print debug lines for every request
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            sys.stdout = stdout
+
+    lat = result["latency_ms"]
+    print(
+        f"{result['requests']} requests, concurrency {result['concurrency']}, {result['transport']}: "
+        f"{result['throughput_rps']} req/s, {result['rows_per_s']} rows/s, error rate {result['error_rate']:.2%}"
+    )
+    print(f"latency ms  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"statuses {result['statuses']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["error_rate"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
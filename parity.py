@@ -0,0 +1,220 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import types
+
+from sample_statements import BANKS, statement_pages
+
+# Differential check for parser changes: runs a reference engine and a
+# candidate engine over the same statement texts and diffs the results field
+# by field, alongside the time each engine took.
+#   python parity.py                            # HEAD vs the working tree
+#   python parity.py --reference git:origin/main --rows 50,2000
+#   python parity.py --candidate api.fast_parsers --corpus-dir ~/statements
+# An engine is "git:<ref>" (api/parsers.py at that revision), a module name,
+# or a .py path; it must expose PARSERS or parse_<bank> functions. Exits 1
+# when anything differs.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SUMMARY_FIELDS = ("period", "initial_balance", "closing_balance", "incoming_transactions", "outgoing_transactions")
+MONEY_FIELDS = {"initial_balance", "closing_balance", "incoming_transactions", "outgoing_transactions", "transaction_amount", "transaction_balance"}
+ROW_FIELDS = ("transaction_date", "transaction_amount", "amount_type", "transaction_balance", "transaction_bank", "transaction_description")
+
+
+def _engine_parsers(module) -> dict:
+    parsers = getattr(module, "PARSERS", None)
+    if parsers is None:
+        # Revisions before the PARSERS registry
+        parsers = {bank: getattr(module, f"parse_{bank.lower()}") for bank in BANKS if hasattr(module, f"parse_{bank.lower()}")}
+    return dict(parsers)
+
+
+def load_engine(spec: str) -> dict:
+    if spec.startswith("git:"):
+        ref = spec[4:]
+        source = subprocess.run(
+            ["git", "show", f"{ref}:api/parsers.py"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        module = types.ModuleType("parsers_at_" + re.sub(r"\W", "_", ref))
+        exec(compile(source, f"{ref}:api/parsers.py", "exec"), module.__dict__)
+    elif spec.endswith(".py"):
+        module = types.ModuleType(os.path.splitext(os.path.basename(spec))[0])
+        with open(spec, encoding="utf-8") as f:
+            exec(compile(f.read(), spec, "exec"), module.__dict__)
+    else:
+        module = importlib.import_module(spec)
+    return _engine_parsers(module)
+
+
+def generated_corpus(banks: list, sizes: list, seeds: int) -> list:
+    # Page texts as extraction returns them from the generated PDFs, joined
+    # the way the pipeline does it (repeated-line stripping included)
+    from api.boilerplate import strip_repeated_lines
+    from api.extract import join_pages
+
+    corpus = []
+    for bank in banks:
+        for rows in sizes:
+            for seed in range(seeds):
+                pages, _ = strip_repeated_lines(statement_pages(bank, rows, seed))
+                corpus.append((f"{bank.lower()}-{rows}-{seed}", bank, join_pages(pages)))
+    return corpus
+
+
+def manual_corpus() -> list:
+    # Anonymized statement excerpts from test_parser_manual.py; their bank is
+    # not recorded, so every parser runs on them
+    with open(os.path.join(ROOT, "test_parser_manual.py"), encoding="utf-8") as f:
+        texts = re.findall(r'"""(.*?)"""', f.read(), re.S)
+    return [(f"manual-{i}", None, text) for i, text in enumerate(texts)]
+
+
+def dir_corpus(path: str) -> list:
+    # <bank>-anything.txt pins the parser; other names run every parser
+    corpus = []
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(".txt"):
+            continue
+        with open(os.path.join(path, name), encoding="utf-8") as f:
+            text = f.read()
+        prefix = name.split("-", 1)[0].upper()
+        corpus.append((os.path.splitext(name)[0], prefix if prefix in BANKS else None, text))
+    return corpus
+
+
+def run_parser(fn, text: str, repeat: int) -> tuple:
+    # (result or "!ExceptionType: message", best seconds over `repeat` runs)
+    best = None
+    out = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            try:
+                out = fn(text)
+            except Exception as e:
+                out = f"!{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return out, best
+
+
+def _norm(field: str, value):
+    if field in MONEY_FIELDS and isinstance(value, (int, float)):
+        return round(value * 100)  # to the cent
+    if field == "transaction_description" and isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def diff_results(reference, candidate) -> list:
+    # [(path, reference value, candidate value)]; empty when equivalent
+    if isinstance(reference, str) or isinstance(candidate, str):
+        return [] if reference == candidate else [("result", reference, candidate)]
+    diffs = []
+    for field in SUMMARY_FIELDS:
+        a, b = _norm(field, reference.get(field)), _norm(field, candidate.get(field))
+        if a != b:
+            diffs.append((field, reference.get(field), candidate.get(field)))
+    ref_rows = reference.get("transactions", [])
+    cand_rows = candidate.get("transactions", [])
+    if len(ref_rows) != len(cand_rows):
+        diffs.append(("transactions.length", len(ref_rows), len(cand_rows)))
+    for i, (a, b) in enumerate(zip(ref_rows, cand_rows)):
+        for field in ROW_FIELDS:
+            if _norm(field, a.get(field)) != _norm(field, b.get(field)):
+                diffs.append((f"transactions[{i}].{field}", a.get(field), b.get(field)))
+    return diffs
+
+
+def compare(reference: dict, candidate: dict, corpus: list, repeat: int, all_parsers: bool) -> dict:
+    cases = []
+    for name, bank, text in corpus:
+        banks = list(reference) if all_parsers or bank is None else [bank]
+        for parser in banks:
+            if parser not in candidate:
+                cases.append({"text": name, "parser": parser, "diffs": [("engine", "present", "missing")], "ref_s": 0.0, "cand_s": 0.0})
+                continue
+            ref_out, ref_s = run_parser(reference[parser], text, repeat)
+            cand_out, cand_s = run_parser(candidate[parser], text, repeat)
+            cases.append({
+                "text": name,
+                "parser": parser,
+                "rows": len(ref_out.get("transactions", [])) if isinstance(ref_out, dict) else 0,
+                "diffs": diff_results(ref_out, cand_out),
+                "ref_s": ref_s,
+                "cand_s": cand_s,
+            })
+
+    per_parser = {}
+    for case in cases:
+        p = per_parser.setdefault(case["parser"], {"cases": 0, "mismatched": 0, "ref_s": 0.0, "cand_s": 0.0})
+        p["cases"] += 1
+        p["mismatched"] += bool(case["diffs"])
+        p["ref_s"] += case["ref_s"]
+        p["cand_s"] += case["cand_s"]
+    for p in per_parser.values():
+        p["speedup"] = round(p["ref_s"] / p["cand_s"], 3) if p["cand_s"] else None
+    ref_total = sum(c["ref_s"] for c in cases)
+    cand_total = sum(c["cand_s"] for c in cases)
+    return {
+        "cases": len(cases),
+        "mismatched": sum(1 for c in cases if c["diffs"]),
+        "speedup": round(ref_total / cand_total, 3) if cand_total else None,
+        "parsers": per_parser,
+        "mismatches": [c for c in cases if c["diffs"]],
+    }
+
+
+def print_report(report: dict, reference: str, candidate: str, limit: int):
+    print(f"{reference} -> {candidate}: {report['cases']} cases, {report['mismatched']} mismatched, speedup x{report['speedup']}")
+    for parser, p in sorted(report["parsers"].items()):
+        print(
+            f"  {parser:8s} {p['cases']:4d} cases {p['mismatched']:4d} mismatched "
+            f"{p['ref_s'] * 1000:9.1f} ms -> {p['cand_s'] * 1000:9.1f} ms  x{p['speedup']}"
+        )
+    for case in report["mismatches"][:limit]:
+        print(f"\n{case['text']} [{case['parser']}]: {len(case['diffs'])} differences")
+        for path, a, b in case["diffs"][:limit]:
+            print(f"  {path}: {a!r} != {b!r}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Diff parser output between two engines.")
+    parser.add_argument("--reference", default="git:HEAD", help="git:<ref>, module name or .py path")
+    parser.add_argument("--candidate", default="api.parsers", help="git:<ref>, module name or .py path")
+    parser.add_argument("--banks", default=",".join(BANKS), help="layouts to generate")
+    parser.add_argument("--rows", default="20,300", help="comma-separated generated statement sizes")
+    parser.add_argument("--seeds", type=int, default=3, help="generated statements per bank and size")
+    parser.add_argument("--corpus-dir", help="extra statement texts (*.txt, bank-prefixed names)")
+    parser.add_argument("--no-manual", action="store_true", help="skip the samples in test_parser_manual.py")
+    parser.add_argument("--all-parsers", action="store_true", help="run every parser on every text")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is reported")
+    parser.add_argument("--limit", type=int, default=10, help="mismatches (and diffs per mismatch) to print")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    banks = [b.strip().upper() for b in args.banks.split(",") if b.strip()]
+    sizes = [int(n) for n in args.rows.split(",") if n.strip()]
+    corpus = generated_corpus(banks, sizes, args.seeds)
+    if not args.no_manual:
+        corpus += manual_corpus()
+    if args.corpus_dir:
+        corpus += dir_corpus(args.corpus_dir)
+
+    report = compare(load_engine(args.reference), load_engine(args.candidate), corpus, args.repeat, args.all_parsers)
+    print_report(report, args.reference, args.candidate, args.limit)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 1 if report["mismatched"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import random
+
+import fitz  # PyMuPDF
+
+# Synthetic statements in the layouts the parsers expect, for load tests and
+# benchmarks. Every line is drawn on its own baseline so get_text(sort=True)
+# gives the lines back in order.
+
+BANKS = ["BCA", "MANDIRI", "BNI", "BLU"]
+LINES_PER_PAGE = 70
+
+CREATORS = {
+    "BCA": "E-statement Batch Generator (PT. Bank Central Asia, Tbk)",
+    "MANDIRI": "PT. Bank Mandiri (Persero) Tbk",
+    "BNI": "BNI e-Statement",
+    "BLU": "",
+}
+
+MERCHANTS = ["SHOPEE", "TOKOPEDIA", "GOJEK", "GRAB", "INDOMARET", "ALFAMART", "PLN", "TELKOMSEL"]
+NAMES = ["MADE PUTRA", "AYU LESTARI", "BUDI SANTOSO", "SITI RAHMA"]
+
+
+def _us(value: float) -> str:
+    # 1,234,567.89 (BCA)
+    return f"{value:,.2f}"
+
+
+def _id(value: float) -> str:
+    # 1.234.567,89 (Mandiri, blu)
+    return f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _movements(rows: int, rng: random.Random, whole: bool = False) -> tuple:
+    # (opening balance, [(day, credit, amount, balance, merchant)])
+    balance = round(rng.uniform(5_000_000, 20_000_000), 0 if whole else 2)
+    opening = balance
+    out = []
+    for i in range(rows):
+        day = 1 + i * 28 // max(rows, 1)
+        credit = rng.random() < 0.3
+        amount = round(rng.uniform(10_000, 500_000), 0 if whole else 2)
+        if not credit and amount > balance:
+            credit = True
+        balance = round(balance + (amount if credit else -amount), 2)
+        out.append((day, credit, amount, balance, rng.choice(MERCHANTS)))
+    return opening, out
+
+
+def _bca(rows: int, rng: random.Random) -> list:
+    opening, moves = _movements(rows, rng)
+    lines = [
+        "REKENING TAHAPAN", "KCU JAKARTA", rng.choice(NAMES), "NO. REKENING : 8270826602",
+        "PERIODE : OKTOBER 2025", "MATA UANG : IDR",
+        "TANGGAL KETERANGAN CBG MUTASI SALDO",
+        f"01/10 SALDO AWAL {_us(opening)}",
+    ]
+    for day, credit, amount, balance, merchant in moves:
+        kind = "CR" if credit else "DB"
+        lines.append(f"{day:02d}/10 TRSF E-BANKING {kind} {_us(amount)}{'' if credit else ' DB'} {_us(balance)}")
+        lines.append(f"{day:02d}10/FTFVA/WS{rng.randint(10000, 99999)}")
+        lines.append(f"{rng.randint(10000, 99999)}/{merchant}")
+    lines.append("SALDO AKHIR")
+    return lines
+
+
+def _mandiri(rows: int, rng: random.Random) -> list:
+    opening, moves = _movements(rows, rng)
+    incoming = sum(m[2] for m in moves if m[1])
+    outgoing = sum(m[2] for m in moves if not m[1])
+    closing = moves[-1][3] if moves else opening
+    lines = [
+        "e-Statement", "Mandiri Call 14000", "Nama/Name : " + rng.choice(NAMES),
+        f"Saldo Awal/Initial Balance : {_id(opening)}",
+        f"Dana Masuk/Incoming Transactions : {_id(incoming)}",
+        f"Dana Keluar/Outgoing Transactions : {_id(outgoing)}",
+        f"Saldo Akhir/Closing Balance : {_id(closing)}",
+        # The period's dates also stop the first row's backward description scan
+        "Periode/Period : 01 Nov 2025 - 30 Nov 2025",
+        "No Tanggal Keterangan Nominal Saldo",
+    ]
+    for i, (day, credit, amount, balance, merchant) in enumerate(moves, 1):
+        lines.append(f"{day:02d} Nov 2025")
+        lines.append("Transfer BI Fast" if credit else "Pembayaran QR")
+        lines.append(f"ke {merchant} QRIS LIVIN")
+        lines.append(f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} WIB")
+        lines.append(f"{i} {'+' if credit else '-'}{_id(amount)} {_id(balance)}")
+    return lines
+
+
+def _bni(rows: int, rng: random.Random) -> list:
+    opening, moves = _movements(rows, rng, whole=True)
+    incoming = sum(m[2] for m in moves if m[1])
+    outgoing = sum(m[2] for m in moves if not m[1])
+    closing = moves[-1][3] if moves else opening
+    lines = [
+        "Laporan Mutasi Rekening", "Periode: 1 - 30 November 2025",
+        "Saldo Awal Total Pemasukan Total Pengeluaran Saldo Akhir",
+        f"{opening:,.0f} +{incoming:,.0f} -{outgoing:,.0f} {closing:,.0f}",
+        "Rincian Transaksi",
+    ]
+    for day, credit, amount, balance, merchant in moves:
+        lines.append(f"{day:02d} Nov 2025 Transfer {'+' if credit else '-'}{amount:,.0f} {balance:,.0f}")
+        lines.append(f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} WIB {merchant}")
+    lines.append("Informasi Lainnya")
+    return lines
+
+
+def _blu(rows: int, rng: random.Random) -> list:
+    opening, moves = _movements(rows, rng)
+    incoming = sum(m[2] for m in moves if m[1])
+    outgoing = sum(m[2] for m in moves if not m[1])
+    closing = moves[-1][3] if moves else opening
+    lines = [
+        "bluAccount",
+        "Nama Periode / Period Total Pemasukan / Total Income Saldo Awal / Initial Balance",
+        f"{rng.choice(NAMES).title()} November 2025 Rp {_id(incoming)} Rp {_id(opening)}",
+        "No. Rekening Mata Uang Total Pengeluaran / Total Expense Saldo Akhir / Ending Balance",
+        f"IDR (Rp) Rp {_id(outgoing)} Rp {_id(closing)}",
+        "Detail Transaksi",
+    ]
+    for day, credit, amount, balance, merchant in moves:
+        lines.append(f"{day:02d} Nov 2025 {'Transfer Masuk' if credit else 'QRIS'} {merchant}")
+        lines.append(f"{'' if credit else '- '}{_id(amount)} {_id(balance)} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}")
+    return lines
+
+
+LAYOUTS = {"BCA": _bca, "MANDIRI": _mandiri, "BNI": _bni, "BLU": _blu}
+
+
+def statement_lines(bank: str, rows: int, seed: int = 0) -> list:
+    return LAYOUTS[bank](rows, random.Random(f"{bank}:{rows}:{seed}"))
+
+
+def statement_pages(bank: str, rows: int, seed: int = 0) -> list:
+    # Per-page text exactly as extract_page_text returns it from make_pdf's
+    # output, without the cost of rendering and extracting a PDF
+    lines = statement_lines(bank, rows, seed)
+    return ["\n".join(lines[start:start + LINES_PER_PAGE]) for start in range(0, len(lines), LINES_PER_PAGE)]
+
+
+def make_pdf(bank: str, rows: int, password: str = None, seed: int = 0) -> bytes:
+    doc = fitz.open()
+    for text in statement_pages(bank, rows, seed):
+        page = doc.new_page()
+        y = 40
+        for line in text.split("\n"):
+            page.insert_text((36, y), line, fontsize=8)
+            y += 11
+    doc.set_metadata({"creator": CREATORS[bank], "producer": "sample_statements"})
+    if password:
+        data = doc.tobytes(encryption=fitz.PDF_ENCRYPT_AES_256, user_pw=password, owner_pw=password + "-owner")
+    else:
+        data = doc.tobytes()
+    doc.close()
+    return data
@@ -0,0 +1,104 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+
+from parity import ROOT, manual_corpus
+
+# Where each parser's skip branches still fire once repeated-line stripping
+# runs first: on page 1 (never stripped), on later pages after stripping, on
+# later pages without it, and in the anonymized excerpts of
+# test_parser_manual.py. A branch is only safe to delete when it fires on
+# later pages without stripping and nowhere else.
+#   python skip_coverage.py
+#   python skip_coverage.py --rows 20,300 --seeds 2 --json skips.json
+COLUMNS = ("page1", "later-stripped", "later-raw", "manual")
+# Non-regex branches only show up in the stats once they fire, so they are
+# listed from the parser source as well
+HIT_CALL = re.compile(r'hit\("(\w+)", "([\w:-]*skip[\w:-]*)"\)')
+
+
+def skip_branches() -> set:
+    from api.rules import rule_stats
+
+    names = {(bank, name) for bank, rules in rule_stats()["banks"].items() for name in rules if "skip" in name}
+    with open(os.path.join(ROOT, "api", "parsers.py"), encoding="utf-8") as f:
+        names.update(HIT_CALL.findall(f.read()))
+    return names
+
+
+def coverage(banks: list, sizes: list, seeds: int) -> dict:
+    from api.boilerplate import strip_repeated_lines
+    from api.extract import join_pages
+    from api.parsers import PARSERS
+    from api.rules import collect_rule_hits
+    from sample_statements import statement_pages
+
+    table = {key: dict.fromkeys(COLUMNS, 0) for key in skip_branches() if key[0] in banks}
+
+    def run(bank, text, column):
+        # Parser debug prints are dropped; a parser failing on a foreign
+        # excerpt still counts what it skipped before failing
+        with collect_rule_hits() as hits, contextlib.redirect_stdout(io.StringIO()):
+            try:
+                PARSERS[bank](text)
+            except Exception:
+                pass
+        for key, count in hits.items():
+            if key in table:
+                table[key][column] += count
+
+    manual = manual_corpus()
+    for bank in banks:
+        for rows in sizes:
+            for seed in range(seeds):
+                pages = statement_pages(bank, rows, seed)
+                stripped, _ = strip_repeated_lines(pages)
+                run(bank, pages[0], "page1")
+                if len(pages) > 1:
+                    run(bank, join_pages(stripped[1:]), "later-stripped")
+                    run(bank, join_pages(pages[1:]), "later-raw")
+        for _, _, text in manual:
+            run(bank, text, "manual")
+    removable = [
+        f"{bank} {name}" for (bank, name), counts in sorted(table.items())
+        if counts["later-raw"] and not (counts["page1"] or counts["later-stripped"] or counts["manual"])
+    ]
+    return {
+        "branches": {f"{bank} {name}": counts for (bank, name), counts in sorted(table.items())},
+        "removable": removable,
+    }
+
+
+def print_report(report: dict):
+    print(f"{'branch':40s}" + "".join(f"{c:>16s}" for c in COLUMNS))
+    for name, counts in report["branches"].items():
+        print(f"{name:40s}" + "".join(f"{counts[c]:16d}" for c in COLUMNS))
+    print(f"removable (stripped on later pages, needed nowhere else): {', '.join(report['removable']) or 'none'}")
+
+
+def main(argv=None) -> int:
+    from api.parsers import PARSERS
+
+    parser = argparse.ArgumentParser(description="Show which parser skip branches repeated-line stripping makes redundant.")
+    parser.add_argument("--banks", default=",".join(PARSERS), help="parsers to check")
+    parser.add_argument("--rows", default="20,300,2000", help="comma-separated statement sizes")
+    parser.add_argument("--seeds", type=int, default=3, help="generated statements per size")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    banks = [b.strip().upper() for b in args.banks.split(",") if b.strip()]
+    sizes = [int(n) for n in args.rows.split(",") if n.strip()]
+    report = coverage(banks, sizes, args.seeds)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())